@@ -4,13 +4,33 @@ Modelo correcto: Variantes Base -> Productos Producidos -> Inventario
 Compatible con PythonAnywhere y Render (PostgreSQL)
 """
 
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
+from flask import (
+    Flask, Response, render_template, request, jsonify, redirect, url_for, flash, send_file, stream_with_context
+)
 from datetime import datetime
+from io import BytesIO
 import os
 
 # Importar configuracion y modulo de base de datos
 from config import get_config
-from database import get_db, init_database, insert_initial_data, is_postgres
+from database import (
+    get_db, esquema_al_dia, aplicar_migraciones, is_postgres, liberar_conexiones, siguiente_secuencia,
+    sumar_inventario
+)
+from metricas import resumen_dashboard, sumar_metricas_diarias, sumar_metrica_global
+from movimientos import (
+    registrar_movimientos, descontar_stock, trasladar_stock, trasladar_lote, stock_a_fecha, estadisticas_traslados,
+    TrasladoRechazado, ConflictoTraslado, INGRESO, PREPARACION, LLEGADA_PREPARACION, VENTA_DIRECTA
+)
+from cache import cachear_vista, invalida, estadisticas_cache
+from exportacion import generar_csv, generar_xlsx
+from importacion import EXTENSIONES, COLUMNAS_VARIANTES, REQUERIDAS_PRODUCCION, validar_archivo
+from listados import (
+    FiltroInvalido, leer_filtros, tamano_pagina, proyectar, stock_por_ubicacion,
+    listar_ventas, listar_produccion, listar_inventario, listar_preparaciones, listar_clientes
+)
+from plantillas import MIMETYPE_XLSX, obtener_plantilla
+import trabajos
 
 app = Flask(__name__)
 
@@ -19,108 +39,140 @@ config = get_config()
 app.secret_key = config.SECRET_KEY
 app.debug = config.DEBUG
 
-# Inicializar base de datos al arrancar (crea tablas si no existen)
+# Al arrancar cada worker solo se verifica la version del esquema (una consulta).
+# Las migraciones se aplican con `python migrar.py`; si MIGRAR_AL_INICIAR esta
+# activo y el esquema esta atrasado, el primer worker las aplica bajo lock.
 with app.app_context():
     try:
-        init_database()
-        insert_initial_data()
+        if not esquema_al_dia():
+            if config.MIGRAR_AL_INICIAR:
+                aplicar_migraciones()
+            else:
+                print("Advertencia: esquema de BD desactualizado, ejecuta 'python migrar.py'")
     except Exception as e:
         print(f"Advertencia al inicializar BD: {e}")
 
+
+@app.teardown_appcontext
+def liberar_conexiones_request(exception=None):
+    """Devuelve al pool las conexiones que una vista no cerro (returns tempranos, errores)"""
+    liberar_conexiones()
+
+
+def leer_listado(cursor, listar):
+    """
+    Pagina de un listado segun la URL: filtros (listados.leer_filtros), ?cursor=
+    de la pagina anterior y ?limite=. Devuelve (filtros, filas, cursor siguiente).
+    """
+    filtros = leer_filtros(request.args)
+    filas, siguiente = listar(cursor, filtros, request.args.get('cursor'),
+                              tamano_pagina(request.args.get('limite')))
+    return filtros, filas, siguiente
+
+
+def responder_filas(plantilla_filas, siguiente, **contexto):
+    """Respuesta de "Cargar más" (?parcial=1): solo las filas nuevas y el cursor siguiente"""
+    return jsonify({
+        'success': True,
+        'html': render_template(plantilla_filas, **contexto),
+        'siguiente': siguiente
+    })
+
+
+def listado_invalido(error, vista):
+    """Filtro o cursor invalido: 400 para "Cargar más"; en la pagina, aviso y listado sin filtros"""
+    if request.args.get('parcial'):
+        return jsonify({'success': False, 'error': str(error)}), 400
+    flash(str(error), 'danger')
+    return redirect(url_for(vista))
+
+
+def responder_trabajo(id_trabajo):
+    """202 con el id del trabajo encolado y la URL para seguir su avance"""
+    return jsonify({
+        'success': True,
+        'id_trabajo': id_trabajo,
+        'url': url_for('api_trabajo', id_trabajo=id_trabajo)
+    }), 202
+
+
+def enviar_plantilla(nombre):
+    """
+    Plantilla Excel de una carga masiva, ya generada (ver plantillas.py).
+    Con ETag y Cache-Control: no-cache, el navegador vuelve a preguntar y
+    recibe 304 sin el archivo si no cambio.
+    """
+    contenido, etag = obtener_plantilla(nombre)
+    return send_file(BytesIO(contenido), mimetype=MIMETYPE_XLSX, as_attachment=True,
+                     download_name=f'plantilla_{nombre}.xlsx', etag=etag, conditional=True)
+
+
+def encolar_carga(tipo, requeridas, **parametros):
+    """
+    Carga masiva del archivo subido en el campo `archivo`: valida extension y
+    encabezados, lo guarda en TRABAJOS_DIR y responde 202 con el trabajo que
+    lo carga (ver trabajos.py). Un archivo que no sirve se rechaza con 400.
+    """
+    if 'archivo' not in request.files:
+        return jsonify({'success': False, 'error': 'No se envio ningun archivo'}), 400
+
+    archivo = request.files['archivo']
+
+    if archivo.filename == '':
+        return jsonify({'success': False, 'error': 'No se selecciono ningun archivo'}), 400
+
+    if not archivo.filename.lower().endswith(EXTENSIONES):
+        return jsonify({'success': False, 'error': 'El archivo debe ser Excel (.xlsx o .xls) o CSV'}), 400
+
+    ruta = trabajos.ruta_archivo(os.path.splitext(archivo.filename)[1].lower())
+    archivo.save(ruta)
+    try:
+        with open(ruta, 'rb') as guardado:
+            validar_archivo(guardado, archivo.filename, requeridas)
+        id_trabajo = trabajos.encolar(tipo, {'nombre_archivo': archivo.filename, **parametros}, ruta)
+    except Exception as e:
+        # ArchivoInvalido (ilegible, columnas faltantes) o error de BD al encolar
+        os.remove(ruta)
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    return responder_trabajo(id_trabajo)
+
+
+def responder_listado(listar, nombre):
+    """
+    API JSON de un listado: los mismos filtros, ?cursor= y ?limite= que la
+    pagina, ?orden=campo (o -campo) y ?campos=a,b para traer solo esas columnas
+    """
+    conn = get_db()
+    try:
+        _, filas, siguiente = leer_listado(conn.cursor(), listar)
+        return jsonify({
+            'success': True,
+            nombre: proyectar(filas, request.args.get('campos')),
+            'siguiente': siguiente
+        })
+    except FiltroInvalido as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    finally:
+        conn.close()
+
 # ============================================================================
 # DASHBOARD
 # ============================================================================
 
 @app.route('/')
+@cachear_vista('variantes_base', 'productos_producidos', 'metricas_diarias', 'metricas_globales',
+               'cuentas_por_cobrar', 'preparaciones')
 def index():
     """Dashboard principal con métricas de negocio"""
     conn = get_db()
     cursor = conn.cursor()
 
-    # ===== MÉTRICAS BÁSICAS =====
-    cursor.execute('SELECT COUNT(*) as total FROM variantes_base WHERE activo = 1')
-    total_variantes = cursor.fetchone()['total']
-
-    cursor.execute('SELECT COUNT(*) as total FROM productos_producidos WHERE activo = 1')
-    total_productos = cursor.fetchone()['total']
-
-    cursor.execute('SELECT COALESCE(SUM(cantidad_pares), 0) as total FROM inventario')
-    total_stock = cursor.fetchone()['total']
-
-    # ===== VENTAS HOY =====
-    cursor.execute('''
-        SELECT
-            COUNT(*) as cantidad,
-            COALESCE(SUM(total_final), 0) as monto_total
-        FROM ventas_v2
-        WHERE DATE(fecha_venta) = DATE("now")
-    ''')
-    ventas_hoy = cursor.fetchone()
-
-    # ===== VENTAS DEL MES =====
-    cursor.execute('''
-        SELECT
-            COUNT(*) as cantidad,
-            COALESCE(SUM(total_final), 0) as monto_total
-        FROM ventas_v2
-        WHERE strftime('%Y-%m', fecha_venta) = strftime('%Y-%m', 'now')
-    ''')
-    ventas_mes = cursor.fetchone()
-
-    # ===== CUENTAS POR COBRAR =====
-    cursor.execute('''
-        SELECT
-            COUNT(*) as cantidad,
-            COALESCE(SUM(saldo_pendiente), 0) as monto_total
-        FROM cuentas_por_cobrar
-        WHERE estado = 'pendiente' AND saldo_pendiente > 0
-    ''')
-    cuentas_pendientes = cursor.fetchone()
-
-    # ===== PRODUCTOS PENDIENTES DE INGRESAR =====
-    cursor.execute('''
-        SELECT
-            COUNT(*) as cantidad,
-            COALESCE(SUM(cantidad_total_pares - COALESCE(cantidad_ingresada, 0)), 0) as pares_pendientes
-        FROM productos_producidos
-        WHERE cantidad_total_pares > COALESCE(cantidad_ingresada, 0)
-        AND activo = 1
-    ''')
-    pendientes_ingreso = cursor.fetchone()
-
-    # ===== PREPARACIONES ACTIVAS =====
-    cursor.execute('''
-        SELECT COUNT(*) as total
-        FROM preparaciones
-        WHERE estado = 'pendiente'
-    ''')
-    preparaciones_activas = cursor.fetchone()['total']
+    # Todas las metricas en una sola consulta (un viaje a la BD)
+    stats = resumen_dashboard(cursor)
 
     conn.close()
 
-    stats = {
-        'variantes': total_variantes,
-        'productos': total_productos,
-        'stock': total_stock,
-        'ventas_hoy': {
-            'cantidad': ventas_hoy['cantidad'],
-            'monto': ventas_hoy['monto_total']
-        },
-        'ventas_mes': {
-            'cantidad': ventas_mes['cantidad'],
-            'monto': ventas_mes['monto_total']
-        },
-        'cuentas_por_cobrar': {
-            'cantidad': cuentas_pendientes['cantidad'],
-            'monto': cuentas_pendientes['monto_total']
-        },
-        'pendientes_ingreso': {
-            'cantidad': pendientes_ingreso['cantidad'],
-            'pares': pendientes_ingreso['pares_pendientes']
-        },
-        'preparaciones_activas': preparaciones_activas
-    }
-
     return render_template('index_v2.html', stats=stats)
 
 # ============================================================================
@@ -128,6 +180,7 @@ def index():
 # ============================================================================
 
 @app.route('/catalogo-variantes')
+@cachear_vista('variantes_base')
 def catalogo_variantes():
     """Vista de catálogo de variantes base"""
     conn = get_db()
@@ -144,6 +197,7 @@ def catalogo_variantes():
     return render_template('catalogo_variantes.html', variantes=variantes)
 
 @app.route('/api/variantes-base/crear', methods=['POST'])
+@invalida('variantes_base')
 def crear_variante_base():
     """API para crear nueva variante base"""
     try:
@@ -201,6 +255,7 @@ def obtener_variante_base(id_variante_base):
         return jsonify({'success': False, 'error': str(e)}), 400
 
 @app.route('/api/variantes-base/<int:id_variante_base>/editar', methods=['PUT'])
+@invalida('variantes_base')
 def editar_variante_base(id_variante_base):
     """API para editar variante base"""
     try:
@@ -235,112 +290,17 @@ def editar_variante_base(id_variante_base):
 
 @app.route('/api/variantes-base/carga-masiva', methods=['POST'])
 def carga_masiva_variantes():
-    """API para cargar variantes base desde archivo Excel"""
-    try:
-        if 'archivo' not in request.files:
-            return jsonify({'success': False, 'error': 'No se envio ningun archivo'}), 400
-
-        archivo = request.files['archivo']
-
-        if archivo.filename == '':
-            return jsonify({'success': False, 'error': 'No se selecciono ningun archivo'}), 400
-
-        if not archivo.filename.endswith(('.xlsx', '.xls')):
-            return jsonify({'success': False, 'error': 'El archivo debe ser Excel (.xlsx o .xls)'}), 400
-
-        # Leer Excel con pandas
-        import pandas as pd
-        df = pd.read_excel(archivo)
-
-        # Validar columnas requeridas
-        columnas_requeridas = ['codigo_interno', 'tipo_calzado']
-        columnas_faltantes = [col for col in columnas_requeridas if col not in df.columns]
-
-        if columnas_faltantes:
-            return jsonify({
-                'success': False,
-                'error': f'Columnas faltantes: {", ".join(columnas_faltantes)}. Columnas encontradas: {", ".join(df.columns.tolist())}'
-            }), 400
-
-        conn = get_db()
-        cursor = conn.cursor()
-
-        insertados = 0
-        errores = []
-
-        for index, row in df.iterrows():
-            try:
-                codigo = str(row['codigo_interno']).strip()
-                tipo = str(row['tipo_calzado']).strip()
-
-                if not codigo or not tipo or codigo == 'nan' or tipo == 'nan':
-                    errores.append(f"Fila {index + 2}: codigo_interno y tipo_calzado son requeridos")
-                    continue
-
-                cursor.execute('''
-                    INSERT INTO variantes_base
-                    (codigo_interno, tipo_calzado, tipo_horma, segmento, descripcion)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (
-                    codigo,
-                    tipo,
-                    str(row.get('tipo_horma', '')).strip() if pd.notna(row.get('tipo_horma')) else '',
-                    str(row.get('segmento', '')).strip() if pd.notna(row.get('segmento')) else '',
-                    str(row.get('descripcion', '')).strip() if pd.notna(row.get('descripcion')) else ''
-                ))
-                insertados += 1
-
-            except Exception as e:
-                error_msg = str(e)
-                if 'UNIQUE' in error_msg or 'unique' in error_msg:
-                    errores.append(f"Fila {index + 2}: El codigo '{codigo}' ya existe")
-                else:
-                    errores.append(f"Fila {index + 2}: {error_msg}")
-
-        conn.commit()
-        conn.close()
-
-        return jsonify({
-            'success': True,
-            'message': f'Carga completada: {insertados} variantes creadas',
-            'insertados': insertados,
-            'errores': errores
-        })
-
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 400
+    """
+    API para cargar variantes base desde archivo Excel o CSV, en segundo plano
+    (ver encolar_carga e importacion.py); el avance esta en /api/jobs/<id>
+    """
+    return encolar_carga('importar_variantes', COLUMNAS_VARIANTES[:2])
 
 
 @app.route('/api/variantes-base/plantilla-excel')
 def descargar_plantilla_variantes():
     """Descarga plantilla Excel para carga masiva de variantes"""
-    import pandas as pd
-    from io import BytesIO
-    from flask import send_file
-
-    # Crear DataFrame con ejemplo
-    data = {
-        'codigo_interno': ['BOT-001', 'ZAP-002', 'SAN-003'],
-        'tipo_calzado': ['Botin', 'Zapato', 'Sandalia'],
-        'tipo_horma': ['Clasica', 'Sport', 'Casual'],
-        'segmento': ['Dama', 'Caballero', 'Dama'],
-        'descripcion': ['Botin de cuero para dama', 'Zapato deportivo', 'Sandalia casual']
-    }
-    df = pd.DataFrame(data)
-
-    # Crear archivo Excel en memoria
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Variantes')
-
-    output.seek(0)
-
-    return send_file(
-        output,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        as_attachment=True,
-        download_name='plantilla_variantes.xlsx'
-    )
+    return enviar_plantilla('variantes')
 
 
 # ============================================================================
@@ -349,53 +309,36 @@ def descargar_plantilla_variantes():
 
 @app.route('/produccion')
 def produccion():
-    """Vista de productos producidos"""
+    """Vista de productos producidos, paginada (filtros: fechas, ubicacion y estado)"""
     conn = get_db()
     cursor = conn.cursor()
 
-    cursor.execute('''
-        SELECT
-            p.id_producto,
-            p.id_variante_base,
-            p.cuero,
-            p.color_cuero,
-            p.suela,
-            p.forro,
-            p.material_plantilla,
-            p.serie_tallas,
-            p.pares_por_docena,
-            p.costo_unitario,
-            p.precio_sugerido,
-            p.cantidad_total_pares,
-            p.cantidad_ingresada,
-            p.fecha_produccion,
-            p.observaciones,
-            p.activo,
-            p.fecha_creacion,
-            v.codigo_interno,
-            v.tipo_calzado,
-            v.tipo_horma,
-            v.segmento,
-            COALESCE(SUM(i.cantidad_pares), 0) as stock_actual,
-            COALESCE(SUM(CASE WHEN i.tipo_stock = 'general' THEN i.cantidad_pares ELSE 0 END), 0) as stock_general,
-            COALESCE(SUM(CASE WHEN i.tipo_stock = 'pedido' THEN i.cantidad_pares ELSE 0 END), 0) as stock_pedido,
-            COUNT(i.id_inventario) as tiene_registros_inventario,
-            (p.cantidad_total_pares - COALESCE(p.cantidad_ingresada, 0)) as pendiente_ingresar
-        FROM productos_producidos p
-        JOIN variantes_base v ON p.id_variante_base = v.id_variante_base
-        LEFT JOIN inventario i ON p.id_producto = i.id_producto
-        GROUP BY p.id_producto, p.id_variante_base, p.cuero, p.color_cuero, p.suela, p.forro,
-                 p.material_plantilla, p.serie_tallas, p.pares_por_docena, p.costo_unitario,
-                 p.precio_sugerido, p.cantidad_total_pares, p.cantidad_ingresada, p.fecha_produccion,
-                 p.observaciones, p.activo, p.fecha_creacion,
-                 v.codigo_interno, v.tipo_calzado, v.tipo_horma, v.segmento
-        ORDER BY p.fecha_produccion DESC, p.id_producto DESC
-    ''')
-    productos = cursor.fetchall()
+    try:
+        filtros, productos, siguiente = leer_listado(cursor, listar_produccion)
+    except FiltroInvalido as e:
+        return listado_invalido(e, 'produccion')
+    finally:
+        conn.close()
 
-    conn.close()
+    if request.args.get('parcial'):
+        return responder_filas('produccion_filas.html', siguiente, productos=productos)
 
-    return render_template('produccion.html', productos=productos)
+    # Ubicaciones para el ingreso opcional de la carga masiva
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT id_ubicacion, nombre FROM ubicaciones WHERE activo = 1 ORDER BY nombre')
+        ubicaciones = cursor.fetchall()
+    finally:
+        conn.close()
+
+    return render_template('produccion.html', productos=productos, filtros=filtros, siguiente=siguiente,
+                           ubicaciones=ubicaciones)
+
+@app.route('/api/produccion')
+def api_produccion():
+    """API de productos producidos, paginada (mismos filtros que /produccion)"""
+    return responder_listado(listar_produccion, 'productos')
 
 @app.route('/produccion/nueva/<int:id_variante_base>')
 def produccion_nueva(id_variante_base):
@@ -420,6 +363,7 @@ def produccion_nueva(id_variante_base):
     return render_template('produccion_nueva.html', variante=variante, fecha_hoy=fecha_hoy)
 
 @app.route('/api/productos/crear', methods=['POST'])
+@invalida('productos_producidos')
 def crear_producto():
     """API para crear nuevo producto"""
     try:
@@ -465,6 +409,39 @@ def crear_producto():
         return jsonify({'success': False, 'error': str(e)}), 400
 
 
+@app.route('/api/productos/carga-masiva', methods=['POST'])
+def carga_masiva_productos():
+    """
+    API para cargar lotes de produccion desde Excel o CSV, en segundo plano
+    (ver encolar_carga e importacion.importar_produccion). Con el campo
+    id_ubicacion los pares de cada lote ingresan tambien a esa ubicacion.
+    """
+    id_ubicacion = request.form.get('id_ubicacion')
+    if not id_ubicacion:
+        return encolar_carga('importar_produccion', REQUERIDAS_PRODUCCION)
+    try:
+        id_ubicacion = int(id_ubicacion)
+    except ValueError:
+        return jsonify({'success': False, 'error': f'id_ubicacion inválido: {id_ubicacion}'}), 400
+
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT id_ubicacion FROM ubicaciones WHERE id_ubicacion = ?', (id_ubicacion,))
+        existe = cursor.fetchone() is not None
+    finally:
+        conn.close()
+    if not existe:
+        return jsonify({'success': False, 'error': 'Ubicación no encontrada'}), 404
+    return encolar_carga('importar_produccion', REQUERIDAS_PRODUCCION, id_ubicacion=id_ubicacion)
+
+
+@app.route('/api/productos/plantilla-excel')
+def descargar_plantilla_productos():
+    """Descarga plantilla Excel para carga masiva de produccion"""
+    return enviar_plantilla('produccion')
+
+
 @app.route('/api/productos/<int:id_producto>', methods=['GET'])
 def obtener_producto(id_producto):
     """API para obtener detalles de un producto producido"""
@@ -490,6 +467,7 @@ def obtener_producto(id_producto):
 
 
 @app.route('/api/productos/<int:id_producto>/editar', methods=['PUT'])
+@invalida('productos_producidos')
 def editar_producto(id_producto):
     """API para editar un producto producido"""
     try:
@@ -556,6 +534,7 @@ def editar_producto(id_producto):
 
 
 @app.route('/api/productos/<int:id_producto>/eliminar', methods=['DELETE'])
+@invalida('productos_producidos')
 def eliminar_producto(id_producto):
     """API para eliminar un producto producido (solo si no tiene movimientos)"""
     try:
@@ -610,41 +589,37 @@ def eliminar_producto(id_producto):
 
 @app.route('/inventario')
 def inventario():
-    """Vista de inventario de productos"""
+    """Vista de inventario de productos, paginada (filtros: ubicacion y estado de stock)"""
     conn = get_db()
     cursor = conn.cursor()
 
-    cursor.execute('''
-        SELECT
-            i.*,
-            p.cuero,
-            p.color_cuero,
-            p.suela,
-            p.forro,
-            p.serie_tallas,
-            p.precio_sugerido,
-            vb.codigo_interno,
-            vb.tipo_calzado,
-            vb.tipo_horma,
-            vb.segmento,
-            u.nombre as ubicacion_nombre
-        FROM inventario i
-        JOIN productos_producidos p ON i.id_producto = p.id_producto
-        JOIN variantes_base vb ON p.id_variante_base = vb.id_variante_base
-        JOIN ubicaciones u ON i.id_ubicacion = u.id_ubicacion
-        ORDER BY u.nombre, vb.codigo_interno, p.cuero, p.color_cuero
-    ''')
-    items_inventario = cursor.fetchall()
-
-    # Obtener ubicaciones
-    cursor.execute('SELECT * FROM ubicaciones WHERE activo = 1 ORDER BY nombre')
-    ubicaciones = cursor.fetchall()
-
-    conn.close()
+    try:
+        filtros, items_inventario, siguiente = leer_listado(cursor, listar_inventario)
+        if request.args.get('parcial'):
+            return responder_filas('inventario_filas.html', siguiente, items=items_inventario)
+
+        # Resumen por ubicación: totales de toda la tabla, no solo de la página
+        totales_ubicacion = stock_por_ubicacion(cursor)
+
+        # Obtener ubicaciones
+        cursor.execute('SELECT * FROM ubicaciones WHERE activo = 1 ORDER BY nombre')
+        ubicaciones = cursor.fetchall()
+    except FiltroInvalido as e:
+        return listado_invalido(e, 'inventario')
+    finally:
+        conn.close()
 
     return render_template('inventario_v2.html',
                          items=items_inventario,
-                         ubicaciones=ubicaciones)
+                         ubicaciones=ubicaciones,
+                         totales_ubicacion=totales_ubicacion,
+                         filtros=filtros,
+                         siguiente=siguiente)
+
+@app.route('/api/inventario')
+def api_inventario():
+    """API de inventario, paginada (mismos filtros que /inventario)"""
+    return responder_listado(listar_inventario, 'inventario')
 
 @app.route('/inventario/ingresar/<int:id_producto>')
 def inventario_ingresar_form(id_producto):
@@ -681,6 +656,7 @@ def inventario_ingresar_form(id_producto):
                          ubicaciones=ubicaciones)
 
 @app.route('/api/inventario/ingresar', methods=['POST'])
+@invalida('inventario', 'productos_producidos', 'metricas_diarias', 'metricas_globales')
 def ingresar_inventario():
     """API para ingresar producto al inventario (soporta ingresos parciales)"""
     try:
@@ -714,34 +690,10 @@ def ingresar_inventario():
                 'error': f'No puedes ingresar {cantidad_a_ingresar} pares. Solo quedan {cantidad_pendiente} pares pendientes de ingresar.'
             }), 400
 
-        # Verificar si ya existe inventario para este producto en esta ubicación
-        cursor.execute('''
-            SELECT id_inventario, cantidad_pares
-            FROM inventario
-            WHERE id_producto = ? AND id_ubicacion = ? AND tipo_stock = ?
-        ''', (data['id_producto'], data['id_ubicacion'], data.get('tipo_stock', 'general')))
-
-        inventario_existente = cursor.fetchone()
-
-        if inventario_existente:
-            # Actualizar inventario existente
-            cursor.execute('''
-                UPDATE inventario
-                SET cantidad_pares = cantidad_pares + ?
-                WHERE id_inventario = ?
-            ''', (cantidad_a_ingresar, inventario_existente['id_inventario']))
-        else:
-            # Crear nuevo registro de inventario
-            cursor.execute('''
-                INSERT INTO inventario
-                (id_producto, id_ubicacion, tipo_stock, cantidad_pares)
-                VALUES (?, ?, ?, ?)
-            ''', (
-                data['id_producto'],
-                data['id_ubicacion'],
-                data.get('tipo_stock', 'general'),
-                cantidad_a_ingresar
-            ))
+        # Sumar al inventario de la ubicación (crea el registro si no existe)
+        sumar_inventario(cursor, [
+            (data['id_producto'], data['id_ubicacion'], data.get('tipo_stock', 'general'), cantidad_a_ingresar)
+        ])
 
         # Actualizar cantidad_ingresada en productos_producidos
         cursor.execute('''
@@ -750,6 +702,16 @@ def ingresar_inventario():
             WHERE id_producto = ?
         ''', (cantidad_a_ingresar, data['id_producto']))
 
+        # Historial de movimientos (en la misma transaccion)
+        registrar_movimientos(cursor, [
+            (data['id_producto'], data['id_ubicacion'], data.get('tipo_stock', 'general'),
+             cantidad_a_ingresar, INGRESO, None)
+        ])
+
+        # Contadores del dashboard (en la misma transaccion)
+        sumar_metricas_diarias(cursor, pares_ingresados=cantidad_a_ingresar)
+        sumar_metrica_global(cursor, 'stock_total', cantidad_a_ingresar)
+
         conn.commit()
 
         # Verificar si el producto está completamente ingresado
@@ -773,116 +735,235 @@ def ingresar_inventario():
         return jsonify({'success': False, 'error': str(e)}), 400
 
 @app.route('/api/inventario/trasladar', methods=['POST'])
+@invalida('inventario')
 def trasladar_inventario():
-    """API para trasladar inventario entre ubicaciones"""
+    """
+    API para trasladar inventario entre ubicaciones.
+    Concurrencia optimista: no bloquea la BD mientras valida; si otra
+    operación cambia el origen en el medio se reintenta (TRASLADO_REINTENTOS).
+    """
+    conn = None
     try:
         data = request.json
+        id_producto = int(data['id_producto'])
+        origen = int(data['id_ubicacion_origen'])
+        destino = int(data['id_ubicacion_destino'])
+        cantidad = int(data['cantidad_pares'])
+
+        if origen == destino:
+            return jsonify({'success': False, 'error': 'El origen y el destino deben ser distintos'}), 400
+        if cantidad <= 0:
+            return jsonify({'success': False, 'error': f'Cantidad inválida: {cantidad}'}), 400
 
         conn = get_db()
-        cursor = conn.cursor()
+        trasladar_stock(conn, id_producto, origen, destino, data.get('tipo_stock', 'general'), cantidad)
 
-        # Iniciar transacción
-        cursor.execute('BEGIN IMMEDIATE')
+        return jsonify({
+            'success': True,
+            'message': f'{cantidad} pares trasladados exitosamente'
+        })
 
-        # Validar que la ubicación origen tiene suficiente stock
-        cursor.execute('''
-            SELECT cantidad_pares
-            FROM inventario
-            WHERE id_producto = ? AND id_ubicacion = ? AND tipo_stock = ?
-        ''', (data['id_producto'], data['id_ubicacion_origen'], data.get('tipo_stock', 'general')))
+    except TrasladoRechazado as e:
+        return jsonify({'success': False, 'error': str(e)}), e.codigo
 
-        inventario_origen = cursor.fetchone()
+    except ConflictoTraslado as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
 
-        if not inventario_origen:
-            return jsonify({
-                'success': False,
-                'error': 'No existe inventario de este producto en la ubicación origen'
-            }), 404
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    finally:
+        if conn:
+            conn.close()
 
-        if inventario_origen['cantidad_pares'] < data['cantidad_pares']:
+# Líneas por lote: los parámetros de cada sentencia crecen con el lote
+MAX_LINEAS_TRASLADO_LOTE = 500
+
+@app.route('/api/inventario/trasladar-lote', methods=['POST'])
+@invalida('inventario')
+def trasladar_inventario_lote():
+    """
+    API para trasladar muchos productos entre el mismo origen y destino en
+    una sola transacción.
+    Body: id_ubicacion_origen, id_ubicacion_destino y lineas
+    [{id_producto, tipo_stock (opcional), cantidad_pares}].
+    Cada línea se resuelve por separado: las que no tienen stock suficiente
+    en el origen no se mueven y se informan en resultados.
+    """
+    conn = None
+    try:
+        data = request.json
+        origen = int(data['id_ubicacion_origen'])
+        destino = int(data['id_ubicacion_destino'])
+        lineas = data.get('lineas', [])
+
+        if origen == destino:
+            return jsonify({'success': False, 'error': 'El origen y el destino deben ser distintos'}), 400
+        if not lineas:
+            return jsonify({'success': False, 'error': 'Debe agregar al menos una línea'}), 400
+        if len(lineas) > MAX_LINEAS_TRASLADO_LOTE:
             return jsonify({
                 'success': False,
-                'error': f'Stock insuficiente en origen. Disponible: {inventario_origen["cantidad_pares"]} pares'
+                'error': f'Máximo {MAX_LINEAS_TRASLADO_LOTE} líneas por traslado'
             }), 400
 
-        # Descontar de ubicación origen
-        cursor.execute('''
-            UPDATE inventario
-            SET cantidad_pares = cantidad_pares - ?
-            WHERE id_producto = ? AND id_ubicacion = ? AND tipo_stock = ?
-        ''', (data['cantidad_pares'], data['id_producto'], data['id_ubicacion_origen'], data.get('tipo_stock', 'general')))
+        # Acumular por producto/tipo (una línea repetida se traslada junta)
+        a_trasladar = {}
+        for linea in lineas:
+            clave = (int(linea['id_producto']), linea.get('tipo_stock', 'general'))
+            cantidad = int(linea['cantidad_pares'])
+            if cantidad <= 0:
+                return jsonify({
+                    'success': False,
+                    'error': f'Cantidad inválida para el producto {clave[0]}: {cantidad}'
+                }), 400
+            a_trasladar[clave] = a_trasladar.get(clave, 0) + cantidad
 
-        # Verificar si existe inventario en ubicación destino
-        cursor.execute('''
-            SELECT id_inventario, cantidad_pares
-            FROM inventario
-            WHERE id_producto = ? AND id_ubicacion = ? AND tipo_stock = ?
-        ''', (data['id_producto'], data['id_ubicacion_destino'], data.get('tipo_stock', 'general')))
+        conn = get_db()
+        disponibles = trasladar_lote(conn, origen, destino, a_trasladar)
+
+        resultados = []
+        for linea in lineas:
+            clave = (int(linea['id_producto']), linea.get('tipo_stock', 'general'))
+            cantidad = int(linea['cantidad_pares'])
+            resultado = {
+                'id_producto': clave[0],
+                'tipo_stock': clave[1],
+                'cantidad_pares': cantidad,
+                'trasladado': disponibles[clave] is None
+            }
+            if disponibles[clave] is not None:
+                if a_trasladar[clave] != cantidad:
+                    # Las líneas repetidas se mueven juntas: informar el total pedido
+                    resultado['error'] = (f'Stock insuficiente en origen. Pedido total de este producto: '
+                                          f'{a_trasladar[clave]} pares, disponible: {disponibles[clave]} pares')
+                else:
+                    resultado['error'] = f'Stock insuficiente en origen. Disponible: {disponibles[clave]} pares'
+            resultados.append(resultado)
 
-        inventario_destino = cursor.fetchone()
+        trasladadas = sum(1 for r in resultados if r['trasladado'])
+        return jsonify({
+            'success': True,
+            'message': f'{trasladadas} de {len(resultados)} línea(s) trasladadas',
+            'pares_trasladados': sum(r['cantidad_pares'] for r in resultados if r['trasladado']),
+            'resultados': resultados
+        })
 
-        if inventario_destino:
-            # Actualizar inventario existente
-            cursor.execute('''
-                UPDATE inventario
-                SET cantidad_pares = cantidad_pares + ?
-                WHERE id_inventario = ?
-            ''', (data['cantidad_pares'], inventario_destino['id_inventario']))
-        else:
-            # Crear nuevo registro en destino
-            cursor.execute('''
-                INSERT INTO inventario
-                (id_producto, id_ubicacion, tipo_stock, cantidad_pares)
-                VALUES (?, ?, ?, ?)
-            ''', (data['id_producto'], data['id_ubicacion_destino'], data.get('tipo_stock', 'general'), data['cantidad_pares']))
+    except ConflictoTraslado as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
 
-        conn.commit()
-        conn.close()
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    finally:
+        if conn:
+            conn.close()
+
+@app.route('/api/inventario/historico')
+def inventario_historico():
+    """
+    API de stock a una fecha pasada (conciliaciones de almacen).
+    Parametros: fecha (YYYY-MM-DD = al cierre de ese dia, o YYYY-MM-DD HH:MM),
+    id_ubicacion e id_producto opcionales.
+    Se responde con el corte diario mas los movimientos de ese dia, asi que el
+    tiempo no depende del largo del historial.
+    """
+    texto_fecha = (request.args.get('fecha') or '').strip()
+    fecha = None
+    for formato in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M'):
+        try:
+            fecha = datetime.strptime(texto_fecha, formato)
+            break
+        except ValueError:
+            pass
+    if fecha is None:
+        try:
+            fecha = datetime.strptime(texto_fecha, '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Parametro fecha invalido (formato YYYY-MM-DD)'}), 400
+
+    conn = None
+    try:
+        conn = get_db()
+        saldos = stock_a_fecha(conn, fecha,
+                               id_ubicacion=request.args.get('id_ubicacion', type=int),
+                               id_producto=request.args.get('id_producto', type=int))
+
+        # Datos descriptivos de los productos del resultado en una sola consulta
+        cursor = conn.cursor()
+        productos = {}
+        ids_producto = list({fila['id_producto'] for fila in saldos})
+        if ids_producto:
+            cursor.execute(f'''
+                SELECT p.id_producto, vb.codigo_interno, p.cuero, p.color_cuero, p.serie_tallas
+                FROM productos_producidos p
+                JOIN variantes_base vb ON p.id_variante_base = vb.id_variante_base
+                WHERE p.id_producto IN ({', '.join('?' for _ in ids_producto)})
+            ''', ids_producto)
+            productos = {fila['id_producto']: fila for fila in cursor.fetchall()}
+        cursor.execute('SELECT id_ubicacion, nombre FROM ubicaciones')
+        ubicaciones = {fila['id_ubicacion']: fila['nombre'] for fila in cursor.fetchall()}
+
+        items = []
+        for fila in saldos:
+            producto = productos.get(fila['id_producto'])
+            items.append({
+                'id_producto': fila['id_producto'],
+                'codigo_interno': producto['codigo_interno'] if producto else None,
+                'cuero': producto['cuero'] if producto else None,
+                'color_cuero': producto['color_cuero'] if producto else None,
+                'serie_tallas': producto['serie_tallas'] if producto else None,
+                'id_ubicacion': fila['id_ubicacion'],
+                'ubicacion_nombre': ubicaciones.get(fila['id_ubicacion']),
+                'tipo_stock': fila['tipo_stock'],
+                'cantidad_pares': fila['cantidad_pares']
+            })
 
         return jsonify({
             'success': True,
-            'message': f'{data["cantidad_pares"]} pares trasladados exitosamente'
+            'fecha': texto_fecha,
+            'inventario': items,
+            'total_pares': sum(item['cantidad_pares'] for item in items)
         })
 
     except Exception as e:
-        if conn:
-            conn.rollback()
         return jsonify({'success': False, 'error': str(e)}), 400
 
+    finally:
+        if conn:
+            conn.close()
+
 # ============================================================================
 # MÓDULO: PREPARACIONES
 # ============================================================================
 
 @app.route('/preparaciones')
 def preparaciones():
-    """Vista de preparaciones de mercaderia"""
+    """Vista de preparaciones de mercaderia, paginada (filtros: fechas o periodo, ubicacion y estado)"""
     conn = get_db()
     cursor = conn.cursor()
 
-    # Obtener todas las preparaciones
-    cursor.execute('''
-        SELECT
-            p.id_preparacion,
-            p.fecha_preparacion,
-            p.estado,
-            p.id_ubicacion_destino,
-            p.observaciones,
-            p.fecha_creacion,
-            u_destino.nombre as ubicacion_destino,
-            COUNT(pd.id_detalle_prep) as total_items,
-            COALESCE(SUM(pd.cantidad_pares), 0) as total_pares
-        FROM preparaciones p
-        LEFT JOIN ubicaciones u_destino ON p.id_ubicacion_destino = u_destino.id_ubicacion
-        LEFT JOIN preparaciones_detalle pd ON p.id_preparacion = pd.id_preparacion
-        GROUP BY p.id_preparacion, p.fecha_preparacion, p.estado, p.id_ubicacion_destino,
-                 p.observaciones, p.fecha_creacion, u_destino.nombre
-        ORDER BY p.fecha_preparacion DESC, p.id_preparacion DESC
-    ''')
-    preparaciones = cursor.fetchall()
+    try:
+        filtros, preparaciones, siguiente = leer_listado(cursor, listar_preparaciones)
+    except FiltroInvalido as e:
+        return listado_invalido(e, 'preparaciones')
+    finally:
+        conn.close()
 
-    conn.close()
+    if request.args.get('parcial'):
+        return responder_filas('preparaciones_filas.html', siguiente, preparaciones=preparaciones)
 
-    return render_template('preparaciones_v2.html', preparaciones=preparaciones)
+    return render_template('preparaciones_v2.html', preparaciones=preparaciones, filtros=filtros,
+                           siguiente=siguiente)
+
+@app.route('/api/preparaciones')
+def api_preparaciones():
+    """API de preparaciones, paginada (mismos filtros que /preparaciones)"""
+    return responder_listado(listar_preparaciones, 'preparaciones')
 
 @app.route('/preparaciones/nueva')
 def preparacion_nueva():
@@ -933,6 +1014,7 @@ def preparacion_nueva():
                          dias_venta=dias_venta)
 
 @app.route('/api/preparaciones/crear', methods=['POST'])
+@invalida('preparaciones', 'inventario', 'metricas_diarias', 'metricas_globales')
 def crear_preparacion():
     """API para crear nueva preparación"""
     try:
@@ -944,35 +1026,33 @@ def crear_preparacion():
         # Iniciar transacción INMEDIATA
         cursor.execute('BEGIN IMMEDIATE')
 
-        # VALIDAR stock disponible ANTES de crear la preparación
-        for item in data.get('productos', []):
-            cursor.execute('''
-                SELECT cantidad_pares
-                FROM inventario
-                WHERE id_inventario = ?
-            ''', (item['id_inventario'],))
+        # Generar código de preparación (contador por día)
+        fecha_hoy = datetime.now().strftime('%Y%m%d')
+        num_preps_hoy = siguiente_secuencia(cursor, f"P{fecha_hoy}")
+        codigo_preparacion = f"P{fecha_hoy}-{num_preps_hoy:03d}"
+        fecha_preparacion = data.get('fecha_preparacion', datetime.now().strftime('%Y-%m-%d'))
 
-            inventario = cursor.fetchone()
+        # Reservar el stock ANTES de crear la preparación: un solo UPDATE
+        # condicionado para todos los items (nunca deja stock negativo)
+        a_descontar = {}
+        for item in data.get('productos', []):
+            id_inventario = int(item['id_inventario'])
+            a_descontar[id_inventario] = a_descontar.get(id_inventario, 0) + item['cantidad_pares']
 
-            if not inventario:
-                conn.rollback()
+        faltantes = descontar_stock(cursor, a_descontar, PREPARACION, codigo_preparacion)
+        if faltantes:
+            conn.rollback()
+            item = next(item for item in data['productos'] if int(item['id_inventario']) in faltantes)
+            disponible = faltantes[int(item['id_inventario'])]
+            if disponible is None:
                 return jsonify({
                     'success': False,
                     'error': f'Inventario no encontrado para producto ID {item["id_producto"]}'
                 }), 404
-
-            if inventario['cantidad_pares'] < item['cantidad_pares']:
-                conn.rollback()
-                return jsonify({
-                    'success': False,
-                    'error': f'Stock insuficiente. Solicitado: {item["cantidad_pares"]} pares, Disponible: {inventario["cantidad_pares"]} pares'
-                }), 400
-
-        # Generar código de preparación
-        fecha_hoy = datetime.now().strftime('%Y%m%d')
-        cursor.execute('SELECT COUNT(*) as total FROM preparaciones WHERE DATE(fecha_preparacion) = DATE(?)', (datetime.now(),))
-        num_preps_hoy = cursor.fetchone()['total'] + 1
-        codigo_preparacion = f"P{fecha_hoy}-{num_preps_hoy:03d}"
+            return jsonify({
+                'success': False,
+                'error': f'Stock insuficiente. Solicitado: {a_descontar[int(item["id_inventario"])]} pares, Disponible: {disponible} pares'
+            }), 400
 
         # Crear preparación
         cursor.execute('''
@@ -984,31 +1064,28 @@ def crear_preparacion():
             data['id_ubicacion_origen'],
             data.get('id_ubicacion_destino'),  # Nuevo campo
             data['dia_venta'],
-            data.get('fecha_preparacion', datetime.now().strftime('%Y-%m-%d')),
+            fecha_preparacion,
             data.get('observaciones', '')
         ))
 
         id_preparacion = cursor.lastrowid
 
-        # Agregar productos a la preparación y reducir inventario
-        for item in data.get('productos', []):
-            cursor.execute('''
-                INSERT INTO preparaciones_detalle
-                (id_preparacion, id_producto, tipo_stock, cantidad_pares)
-                VALUES (?, ?, ?, ?)
-            ''', (
-                id_preparacion,
-                item['id_producto'],
-                item.get('tipo_stock', 'general'),
-                item['cantidad_pares']
-            ))
-
-            # Reducir del inventario (ahora ya validado)
-            cursor.execute('''
-                UPDATE inventario
-                SET cantidad_pares = cantidad_pares - ?
-                WHERE id_inventario = ?
-            ''', (item['cantidad_pares'], item['id_inventario']))
+        # Agregar productos a la preparación (el inventario ya se redujo)
+        cursor.executemany('''
+            INSERT INTO preparaciones_detalle
+            (id_preparacion, id_producto, tipo_stock, cantidad_pares)
+            VALUES (?, ?, ?, ?)
+        ''', [(
+            id_preparacion,
+            item['id_producto'],
+            item.get('tipo_stock', 'general'),
+            item['cantidad_pares']
+        ) for item in data.get('productos', [])])
+
+        # Contadores del dashboard (en la misma transaccion)
+        sumar_metricas_diarias(cursor, fecha_preparacion, preparaciones_creadas=1)
+        sumar_metrica_global(cursor, 'stock_total',
+                             -sum(item['cantidad_pares'] for item in data.get('productos', [])))
 
         conn.commit()
         conn.close()
@@ -1024,6 +1101,7 @@ def crear_preparacion():
         return jsonify({'success': False, 'error': str(e)}), 400
 
 @app.route('/api/preparaciones/confirmar-llegada/<int:id_preparacion>', methods=['POST'])
+@invalida('preparaciones', 'inventario')
 def confirmar_llegada_preparacion(id_preparacion):
     """
     Confirmar que la mercadería preparada llegó al destino.
@@ -1079,80 +1157,60 @@ def confirmar_llegada_preparacion(id_preparacion):
         if not productos:
             return jsonify({'success': False, 'error': 'La preparación no tiene productos'}), 400
 
-        productos_movidos = 0
-        errores = []
-
-        # Mover cada producto del origen al destino
-        for producto in productos:
-            cantidad_a_mover = producto['cantidad_pares']
-
-            try:
-                # 1. Descontar del inventario origen
-                cursor.execute('''
-                    UPDATE inventario
-                    SET cantidad_pares = cantidad_pares - ?
-                    WHERE id_ubicacion = ?
-                      AND id_producto = ?
-                      AND tipo_stock = 'general'
-                ''', (
-                    cantidad_a_mover,
-                    preparacion['id_ubicacion_origen'],
-                    producto['id_producto']
-                ))
-
-                if cursor.rowcount == 0:
-                    # No había registro en el origen, crear uno negativo o error
-                    errores.append(f"Producto {producto['codigo_interno']}: no se encontró en inventario origen")
-                    continue
-
-                # 2. Agregar al inventario destino (o crear si no existe)
-                # Primero verificar si existe
-                cursor.execute('''
-                    SELECT id_inventario, cantidad_pares
-                    FROM inventario
-                    WHERE id_ubicacion = ?
-                      AND id_producto = ?
-                      AND tipo_stock = 'general'
-                ''', (
-                    preparacion['id_ubicacion_destino'],
-                    producto['id_producto']
-                ))
-
-                inventario_destino = cursor.fetchone()
+        origen = preparacion['id_ubicacion_origen']
+        destino = preparacion['id_ubicacion_destino']
+        codigos = {producto['id_producto']: producto['codigo_interno'] for producto in productos}
 
-                if inventario_destino:
-                    # Ya existe, incrementar
-                    cursor.execute('''
-                        UPDATE inventario
-                        SET cantidad_pares = cantidad_pares + ?
-                        WHERE id_inventario = ?
-                    ''', (cantidad_a_mover, inventario_destino['id_inventario']))
-                else:
-                    # No existe, crear nuevo registro
-                    cursor.execute('''
-                        INSERT INTO inventario
-                        (id_ubicacion, id_producto, cantidad_pares, tipo_stock)
-                        VALUES (?, ?, ?, 'general')
-                    ''', (
-                        preparacion['id_ubicacion_destino'],
-                        producto['id_producto'],
-                        cantidad_a_mover
-                    ))
-
-                productos_movidos += 1
-
-            except Exception as e:
-                errores.append(f"Producto {producto['codigo_interno']}: {str(e)}")
-
-        # Si hubo errores, revertir todo
-        if errores:
+        # 1. Descontar del inventario origen todos los productos en una sentencia
+        #    (si un producto aparece en varias líneas se descuenta la suma)
+        cursor.execute('''
+            UPDATE inventario
+            SET cantidad_pares = cantidad_pares - (
+                    SELECT SUM(pd.cantidad_pares)
+                    FROM preparaciones_detalle pd
+                    WHERE pd.id_preparacion = ?
+                      AND pd.id_producto = inventario.id_producto
+                ),
+                version = version + 1
+            WHERE id_ubicacion = ?
+              AND tipo_stock = 'general'
+              AND id_producto IN (
+                  SELECT id_producto FROM preparaciones_detalle WHERE id_preparacion = ?
+              )
+        ''', (id_preparacion, origen, id_preparacion))
+
+        if cursor.rowcount < len(codigos):
+            # Algún producto no tiene registro en el origen: revertir todo
+            cursor.execute(f'''
+                SELECT id_producto FROM inventario
+                WHERE id_ubicacion = ?
+                  AND tipo_stock = 'general'
+                  AND id_producto IN ({', '.join('?' for _ in codigos)})
+            ''', [origen] + list(codigos))
+            encontrados = {fila['id_producto'] for fila in cursor.fetchall()}
             conn.rollback()
             return jsonify({
                 'success': False,
                 'error': 'Errores al mover inventario',
-                'detalles': errores
+                'detalles': [f"Producto {codigo}: no se encontró en inventario origen"
+                             for id_producto, codigo in codigos.items() if id_producto not in encontrados]
             }), 400
 
+        # 2. Sumar en el inventario destino, creando los registros que falten
+        sumar_inventario(cursor, [(producto['id_producto'], destino, 'general', producto['cantidad_pares'])
+                                  for producto in productos])
+
+        movimientos = []
+        for producto in productos:
+            movimientos.append((producto['id_producto'], origen, 'general', -producto['cantidad_pares'],
+                                LLEGADA_PREPARACION, preparacion['codigo_preparacion']))
+            movimientos.append((producto['id_producto'], destino, 'general', producto['cantidad_pares'],
+                                LLEGADA_PREPARACION, preparacion['codigo_preparacion']))
+        productos_movidos = len(productos)
+
+        # Historial de movimientos (en la misma transaccion)
+        registrar_movimientos(cursor, movimientos)
+
         # Marcar preparación como completada
         cursor.execute('''
             UPDATE preparaciones
@@ -1186,41 +1244,23 @@ def confirmar_llegada_preparacion(id_preparacion):
 
 @app.route('/ventas')
 def ventas():
-    """Vista de todas las ventas v2 con multiples productos"""
+    """Vista de ventas v2 con multiples productos, paginada (filtros: fechas, ubicacion, cliente y estado)"""
     conn = get_db()
     cursor = conn.cursor()
 
-    # Obtener ventas maestro con resumen de productos
-    cursor.execute('''
-        SELECT
-            v.id_venta,
-            v.codigo_venta,
-            v.id_cliente,
-            v.id_preparacion,
-            v.id_ubicacion,
-            v.fecha_venta,
-            v.estado_pago,
-            v.total_final,
-            v.descuento_total,
-            v.modalidad_pago,
-            v.observaciones,
-            v.fecha_creacion,
-            c.nombre as cliente_nombre,
-            c.apellido as cliente_apellido,
-            u.nombre as ubicacion_nombre,
-            COUNT(vd.id_detalle_venta) as total_productos,
-            COALESCE(SUM(vd.cantidad_pares), 0) as total_pares
-        FROM ventas_v2 v
-        LEFT JOIN ventas_detalle vd ON v.id_venta = vd.id_venta
-        LEFT JOIN clientes c ON v.id_cliente = c.id_cliente
-        LEFT JOIN ubicaciones u ON v.id_ubicacion = u.id_ubicacion
-        GROUP BY v.id_venta, v.codigo_venta, v.id_cliente, v.id_preparacion, v.id_ubicacion,
-                 v.fecha_venta, v.estado_pago, v.total_final, v.descuento_total, v.modalidad_pago,
-                 v.observaciones, v.fecha_creacion, c.nombre, c.apellido, u.nombre
-        ORDER BY v.fecha_venta DESC, v.id_venta DESC
-        LIMIT 100
-    ''')
-    ventas = cursor.fetchall()
+    # Ventas maestro con resumen de productos, una pagina a la vez
+    try:
+        filtros, ventas, siguiente = leer_listado(cursor, listar_ventas)
+    except FiltroInvalido as e:
+        conn.close()
+        return listado_invalido(e, 'ventas')
+
+    if request.args.get('parcial'):
+        conn.close()
+        return responder_filas('ventas_filas.html', siguiente, ventas=ventas)
+
+    cursor.execute('SELECT id_ubicacion, nombre FROM ubicaciones WHERE activo = 1 ORDER BY nombre')
+    ubicaciones = cursor.fetchall()
 
     # Obtener preparaciones pendientes
     cursor.execute('''
@@ -1245,7 +1285,52 @@ def ventas():
 
     conn.close()
 
-    return render_template('ventas_v2.html', ventas=ventas, preparaciones_disponibles=preparaciones_disponibles)
+    return render_template('ventas_v2.html', ventas=ventas, preparaciones_disponibles=preparaciones_disponibles,
+                           ubicaciones=ubicaciones, filtros=filtros, siguiente=siguiente)
+
+@app.route('/api/ventas')
+def api_ventas():
+    """API de ventas, paginada (mismos filtros que /ventas)"""
+    return responder_listado(listar_ventas, 'ventas')
+
+@app.route('/api/export/ventas')
+def exportar_ventas():
+    """
+    Exporta ventas con sus lineas de detalle para contabilidad.
+    Parametros: formato (csv o xlsx) y los filtros de /ventas (desde, hasta,
+    id_ubicacion, id_cliente, estado). El CSV se envia mientras se lee de la
+    BD; el XLSX se arma en disco y luego se envia. Memoria constante en ambos.
+    Con segundo_plano=1 responde 202 con un trabajo (ver trabajos.py) y el
+    archivo se descarga de /api/jobs/<id>/archivo al terminar.
+    """
+    formato = request.args.get('formato', 'csv')
+    if formato not in ('csv', 'xlsx'):
+        return jsonify({'success': False, 'error': 'Formato inválido: usa csv o xlsx'}), 400
+    try:
+        filtros = leer_filtros(request.args)
+    except FiltroInvalido as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    nombre = 'ventas'
+    if 'desde' in filtros or 'hasta' in filtros:
+        nombre += f"_{filtros.get('desde', 'inicio')}_{filtros.get('hasta', 'hoy')}"
+
+    if request.args.get('segundo_plano'):
+        id_trabajo = trabajos.encolar('exportar_ventas', {
+            'formato': formato,
+            'filtros': request.args.to_dict(),
+            'descarga': f'{nombre}.{formato}'
+        })
+        return responder_trabajo(id_trabajo)
+
+    if formato == 'xlsx':
+        return send_file(generar_xlsx(filtros),
+                         mimetype=MIMETYPE_XLSX,
+                         as_attachment=True, download_name=f'{nombre}.xlsx')
+
+    # stream_with_context: generar_csv corre dentro del contexto del request hasta la ultima fila
+    return Response(stream_with_context(generar_csv(filtros)), mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment; filename={nombre}.csv'})
 
 @app.route('/ventas/detalle/<int:id_venta>')
 def venta_detalle(id_venta):
@@ -1308,7 +1393,52 @@ def venta_nueva(id_preparacion):
           'Usa el módulo de Ventas para registrar ventas con múltiples productos.', 'info')
     return redirect(url_for('venta_directa_nueva'))
 
+def insertar_detalle_venta(cursor, id_venta, productos):
+    """
+    Inserta las líneas del carrito en ventas_detalle.
+    La información de todos los productos se lee en una sola consulta IN (...)
+    y las líneas se insertan con executemany, en lugar de dos viajes por línea.
+    """
+    ids_producto = list(dict.fromkeys(int(prod['id_producto']) for prod in productos))
+    cursor.execute(f'''
+        SELECT
+            p.id_producto,
+            vb.codigo_interno,
+            p.cuero,
+            p.color_cuero,
+            p.serie_tallas
+        FROM productos_producidos p
+        JOIN variantes_base vb ON p.id_variante_base = vb.id_variante_base
+        WHERE p.id_producto IN ({', '.join('?' for _ in ids_producto)})
+    ''', ids_producto)
+    info_productos = {fila['id_producto']: fila for fila in cursor.fetchall()}
+
+    lineas = []
+    for prod in productos:
+        producto_info = info_productos.get(int(prod['id_producto']))
+        lineas.append((
+            id_venta,
+            prod['id_producto'],
+            producto_info['codigo_interno'] if producto_info else None,
+            producto_info['cuero'] if producto_info else None,
+            producto_info['color_cuero'] if producto_info else None,
+            producto_info['serie_tallas'] if producto_info else None,
+            prod['cantidad_pares'],
+            prod['cantidad_pares'] / prod.get('pares_por_docena', 12),
+            prod['precio_unitario'],
+            prod.get('descuento_linea', 0),
+            prod['cantidad_pares'] * prod['precio_unitario']
+        ))
+
+    cursor.executemany('''
+        INSERT INTO ventas_detalle
+        (id_venta, id_producto, codigo_interno, cuero, color_cuero, serie_tallas,
+         cantidad_pares, cantidad_docenas, precio_unitario, descuento_linea, subtotal)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', lineas)
+
 @app.route('/api/ventas/registrar', methods=['POST'])
+@invalida('ventas_v2', 'cuentas_por_cobrar', 'pagos', 'metricas_diarias')
 def registrar_venta():
     """API para registrar nueva venta con MÚLTIPLES productos (shopping cart)"""
     conn = None
@@ -1326,16 +1456,9 @@ def registrar_venta():
         # Iniciar transacción INMEDIATA para evitar race conditions
         cursor.execute('BEGIN IMMEDIATE')
 
-        # Generar código de venta único
+        # Generar código de venta único (contador por día)
         fecha_hoy = datetime.now().strftime('%Y%m%d')
-        cursor.execute('''
-            SELECT COALESCE(MAX(CAST(SUBSTR(codigo_venta, 11) AS INTEGER)), 0) as ultimo
-            FROM ventas_v2
-            WHERE codigo_venta LIKE ?
-        ''', (f"V{fecha_hoy}-%",))
-
-        ultimo_numero = cursor.fetchone()['ultimo']
-        nuevo_numero = ultimo_numero + 1
+        nuevo_numero = siguiente_secuencia(cursor, f"V{fecha_hoy}")
         codigo_venta = f"V{fecha_hoy}-{nuevo_numero:03d}"
 
         # Calcular total de la venta
@@ -1369,50 +1492,21 @@ def registrar_venta():
 
         id_venta = cursor.lastrowid
 
-        # Crear DETALLE de venta (uno por cada producto)
-        for prod in productos:
-            cantidad_docenas = prod['cantidad_pares'] / prod.get('pares_por_docena', 12)
-            subtotal_linea = prod['cantidad_pares'] * prod['precio_unitario']
+        # Crear DETALLE de venta (todas las líneas en un solo lote)
+        insertar_detalle_venta(cursor, id_venta, productos)
 
-            # Obtener info del producto (con JOIN a variantes_base para codigo_interno)
-            cursor.execute('''
-                SELECT
-                    vb.codigo_interno,
-                    p.cuero,
-                    p.color_cuero,
-                    p.serie_tallas
-                FROM productos_producidos p
-                JOIN variantes_base vb ON p.id_variante_base = vb.id_variante_base
-                WHERE p.id_producto = ?
-            ''', (prod['id_producto'],))
-            producto_info = cursor.fetchone()
+        # Actualizar preparaciones_detalle si viene de preparación
+        if data.get('id_preparacion'):
+            cursor.executemany('''
+                UPDATE preparaciones_detalle
+                SET cantidad_vendida = cantidad_vendida + ?
+                WHERE id_preparacion = ? AND id_producto = ?
+            ''', [(prod['cantidad_pares'], data['id_preparacion'], prod['id_producto']) for prod in productos])
 
-            cursor.execute('''
-                INSERT INTO ventas_detalle
-                (id_venta, id_producto, codigo_interno, cuero, color_cuero, serie_tallas,
-                 cantidad_pares, cantidad_docenas, precio_unitario, descuento_linea, subtotal)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                id_venta,
-                prod['id_producto'],
-                producto_info['codigo_interno'] if producto_info else None,
-                producto_info['cuero'] if producto_info else None,
-                producto_info['color_cuero'] if producto_info else None,
-                producto_info['serie_tallas'] if producto_info else None,
-                prod['cantidad_pares'],
-                cantidad_docenas,
-                prod['precio_unitario'],
-                prod.get('descuento_linea', 0),
-                subtotal_linea
-            ))
-
-            # Actualizar preparaciones_detalle si viene de preparación
-            if data.get('id_preparacion'):
-                cursor.execute('''
-                    UPDATE preparaciones_detalle
-                    SET cantidad_vendida = cantidad_vendida + ?
-                    WHERE id_preparacion = ? AND id_producto = ?
-                ''', (prod['cantidad_pares'], data['id_preparacion'], prod['id_producto']))
+        # Contadores del dashboard (en la misma transaccion). El stock ya se
+        # desconto al crear la preparacion.
+        sumar_metricas_diarias(cursor, ventas_cantidad=1, ventas_monto=total_final,
+                               pares_vendidos=sum(prod['cantidad_pares'] for prod in productos))
 
         # Si es venta a crédito, crear cuenta por cobrar (incluso para clientes desconocidos)
         pago_inicial = data.get('pago_inicial', 0) or 0
@@ -1427,9 +1521,7 @@ def registrar_venta():
                 dias_credito = cliente_data['dias_credito'] if cliente_data else 30
 
             # Generar código de cuenta
-            cursor.execute('SELECT MAX(id_cuenta) FROM cuentas_por_cobrar')
-            max_id = cursor.fetchone()[0] or 0
-            codigo_cuenta = f"CC-{max_id + 1:06d}"
+            codigo_cuenta = f"CC-{siguiente_secuencia(cursor, 'CC'):06d}"
 
             # Crear cuenta por cobrar
             observacion = f"Cuenta generada automáticamente desde venta {codigo_venta}"
@@ -1466,6 +1558,7 @@ def registrar_venta():
                     data.get('metodo_pago', 'efectivo'),
                     f'Pago inicial al momento de la venta {codigo_venta}'
                 ))
+                sumar_metricas_diarias(cursor, pagos_cantidad=1, pagos_monto=pago_inicial)
 
                 # Actualizar estado de la venta a 'parcial' si hubo pago inicial pero queda saldo
                 if saldo_pendiente_cuenta > 0:
@@ -1574,6 +1667,7 @@ def inventario_por_ubicacion(id_ubicacion):
         return jsonify({'success': False, 'error': str(e)}), 400
 
 @app.route('/api/ventas/registrar-directa', methods=['POST'])
+@invalida('ventas_v2', 'inventario', 'cuentas_por_cobrar', 'pagos', 'metricas_diarias', 'metricas_globales')
 def registrar_venta_directa():
     """API para registrar venta directa con MÚLTIPLES productos (sin preparación)"""
     conn = None
@@ -1591,43 +1685,38 @@ def registrar_venta_directa():
         # Iniciar transacción INMEDIATA
         cursor.execute('BEGIN IMMEDIATE')
 
-        # Generar código de venta único
+        # Generar código de venta único (contador por día)
+        # Formato: VD20251226-001 (VD = Venta Directa)
         fecha_hoy = datetime.now().strftime('%Y%m%d')
-        # Formato: VD20251226-001 (VD = 2 chars, fecha = 8 chars, guion = 1 char = total 11, número empieza en posición 12)
-        cursor.execute('''
-            SELECT COALESCE(MAX(CAST(SUBSTR(codigo_venta, 12) AS INTEGER)), 0) as ultimo
-            FROM ventas_v2
-            WHERE codigo_venta LIKE ?
-        ''', (f"VD{fecha_hoy}-%",))
-
-        ultimo_numero = cursor.fetchone()['ultimo']
-        nuevo_numero = ultimo_numero + 1
-        codigo_venta = f"VD{fecha_hoy}-{nuevo_numero:03d}"  # VD = Venta Directa
+        nuevo_numero = siguiente_secuencia(cursor, f"VD{fecha_hoy}")
+        codigo_venta = f"VD{fecha_hoy}-{nuevo_numero:03d}"
 
-        # Calcular total de la venta y validar stock
-        total_venta = 0
+        # Validar que todas las líneas tengan id_inventario
         for prod in productos:
-            # Validar que tenga id_inventario
             if 'id_inventario' not in prod:
                 raise Exception(f'Producto sin id_inventario: {prod.get("codigo_interno", "")}')
 
-            # Validar stock disponible en inventario (tanto general como pedido)
-            cursor.execute('''
-                SELECT cantidad_pares, tipo_stock FROM inventario
-                WHERE id_inventario = ?
-            ''', (prod['id_inventario'],))
-
-            inventario = cursor.fetchone()
-            if not inventario:
-                raise Exception(f'Inventario no encontrado para producto {prod.get("codigo_interno", "")}')
-
-            if inventario['cantidad_pares'] < prod['cantidad_pares']:
-                raise Exception(f'Stock insuficiente para {prod.get("codigo_interno", "")}. Disponible: {inventario["cantidad_pares"]} pares')
+        # Calcular total de la venta (acumulando los pares si un inventario se repite en el carrito)
+        total_venta = 0
+        a_descontar = {}
+        for prod in productos:
+            id_inventario = int(prod['id_inventario'])
+            a_descontar[id_inventario] = a_descontar.get(id_inventario, 0) + prod['cantidad_pares']
 
             subtotal_linea = prod['cantidad_pares'] * prod['precio_unitario']
             subtotal_linea -= prod.get('descuento_linea', 0)
             total_venta += subtotal_linea
 
+        # Descontar el stock de todas las líneas en un solo UPDATE condicionado
+        # (tanto general como pedido); si alguna no alcanza no se vende nada
+        faltantes = descontar_stock(cursor, a_descontar, VENTA_DIRECTA, codigo_venta)
+        if faltantes:
+            prod = next(prod for prod in productos if int(prod['id_inventario']) in faltantes)
+            disponible = faltantes[int(prod['id_inventario'])]
+            if disponible is None:
+                raise Exception(f'Inventario no encontrado para producto {prod.get("codigo_interno", "")}')
+            raise Exception(f'Stock insuficiente para {prod.get("codigo_interno", "")}. Disponible: {disponible} pares')
+
         # Aplicar descuento global
         descuento_global = data.get('descuento_global', 0)
         total_final = total_venta - descuento_global
@@ -1656,49 +1745,14 @@ def registrar_venta_directa():
 
         id_venta = cursor.lastrowid
 
-        # Crear DETALLE de venta y descontar inventario
-        for prod in productos:
-            cantidad_docenas = prod['cantidad_pares'] / prod.get('pares_por_docena', 12)
-            subtotal_linea = prod['cantidad_pares'] * prod['precio_unitario']
-
-            # Obtener info del producto (con JOIN a variantes_base para codigo_interno)
-            cursor.execute('''
-                SELECT
-                    vb.codigo_interno,
-                    p.cuero,
-                    p.color_cuero,
-                    p.serie_tallas
-                FROM productos_producidos p
-                JOIN variantes_base vb ON p.id_variante_base = vb.id_variante_base
-                WHERE p.id_producto = ?
-            ''', (prod['id_producto'],))
-            producto_info = cursor.fetchone()
-
-            cursor.execute('''
-                INSERT INTO ventas_detalle
-                (id_venta, id_producto, codigo_interno, cuero, color_cuero, serie_tallas,
-                 cantidad_pares, cantidad_docenas, precio_unitario, descuento_linea, subtotal)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                id_venta,
-                prod['id_producto'],
-                producto_info['codigo_interno'] if producto_info else None,
-                producto_info['cuero'] if producto_info else None,
-                producto_info['color_cuero'] if producto_info else None,
-                producto_info['serie_tallas'] if producto_info else None,
-                prod['cantidad_pares'],
-                cantidad_docenas,
-                prod['precio_unitario'],
-                prod.get('descuento_linea', 0),
-                subtotal_linea
-            ))
+        # Crear DETALLE de venta (todas las líneas en un solo lote)
+        insertar_detalle_venta(cursor, id_venta, productos)
 
-            # Descontar del inventario
-            cursor.execute('''
-                UPDATE inventario
-                SET cantidad_pares = cantidad_pares - ?
-                WHERE id_inventario = ?
-            ''', (prod['cantidad_pares'], prod['id_inventario']))
+        # Contadores del dashboard (en la misma transaccion)
+        pares_vendidos = sum(prod['cantidad_pares'] for prod in productos)
+        sumar_metricas_diarias(cursor, ventas_cantidad=1, ventas_monto=total_final,
+                               pares_vendidos=pares_vendidos)
+        sumar_metrica_global(cursor, 'stock_total', -pares_vendidos)
 
         # Si es venta a crédito, crear cuenta por cobrar (incluso para clientes desconocidos)
         pago_inicial = data.get('pago_inicial', 0) or 0
@@ -1713,9 +1767,7 @@ def registrar_venta_directa():
                 dias_credito = cliente_data['dias_credito'] if cliente_data else 30
 
             # Generar código de cuenta
-            cursor.execute('SELECT MAX(id_cuenta) FROM cuentas_por_cobrar')
-            max_id = cursor.fetchone()[0] or 0
-            codigo_cuenta = f"CC-{max_id + 1:06d}"
+            codigo_cuenta = f"CC-{siguiente_secuencia(cursor, 'CC'):06d}"
 
             # Crear cuenta por cobrar
             observacion = f"Cuenta generada automáticamente desde venta {codigo_venta}"
@@ -1752,6 +1804,7 @@ def registrar_venta_directa():
                     data.get('metodo_pago', 'efectivo'),
                     f'Pago inicial al momento de la venta {codigo_venta}'
                 ))
+                sumar_metricas_diarias(cursor, pagos_cantidad=1, pagos_monto=pago_inicial)
 
                 # Actualizar estado de la venta a 'parcial' si hubo pago inicial pero queda saldo
                 if saldo_pendiente_cuenta > 0:
@@ -1791,6 +1844,7 @@ def registrar_venta_directa():
 # ============================================================================
 
 @app.route('/ubicaciones')
+@cachear_vista('ubicaciones', 'inventario')
 def ubicaciones():
     """Vista de ubicaciones con stock calculado"""
     conn = get_db()
@@ -1821,6 +1875,7 @@ def ubicaciones():
     return render_template('ubicaciones.html', ubicaciones=ubicaciones_list)
 
 @app.route('/api/ubicaciones/crear', methods=['POST'])
+@invalida('ubicaciones')
 def crear_ubicacion():
     """API para crear nueva ubicación"""
     try:
@@ -1859,6 +1914,7 @@ def crear_ubicacion():
 # ============================================================================
 
 @app.route('/cuentas-por-cobrar')
+@cachear_vista('cuentas_por_cobrar', 'ventas_v2', 'clientes')
 def cuentas_por_cobrar():
     """Dashboard de cuentas por cobrar y ventas pendientes"""
     conn = get_db()
@@ -1984,41 +2040,26 @@ def cuentas_por_cobrar():
 
 @app.route('/clientes')
 def clientes():
-    """Lista de clientes"""
+    """Lista de clientes, paginada (filtro: estado activo/inactivo/con-deuda)"""
     conn = get_db()
     cursor = conn.cursor()
 
-    cursor.execute('''
-        SELECT
-            cl.id_cliente,
-            cl.codigo_cliente,
-            cl.nombre,
-            cl.apellido,
-            cl.nombre_comercial,
-            cl.tipo_documento,
-            cl.numero_documento,
-            cl.email,
-            cl.telefono,
-            cl.direccion,
-            cl.limite_credito,
-            cl.dias_credito,
-            cl.activo,
-            cl.observaciones,
-            cl.fecha_creacion,
-            COALESCE(SUM(c.saldo_pendiente), 0) as deuda_total,
-            COUNT(c.id_cuenta) as num_cuentas_pendientes
-        FROM clientes cl
-        LEFT JOIN cuentas_por_cobrar c ON cl.id_cliente = c.id_cliente AND c.saldo_pendiente > 0
-        GROUP BY cl.id_cliente, cl.codigo_cliente, cl.nombre, cl.apellido, cl.nombre_comercial,
-                 cl.tipo_documento, cl.numero_documento, cl.email, cl.telefono, cl.direccion,
-                 cl.limite_credito, cl.dias_credito, cl.activo, cl.observaciones, cl.fecha_creacion
-        ORDER BY cl.fecha_creacion DESC
-    ''')
-    clientes_list = cursor.fetchall()
+    try:
+        filtros, clientes_list, siguiente = leer_listado(cursor, listar_clientes)
+    except FiltroInvalido as e:
+        return listado_invalido(e, 'clientes')
+    finally:
+        conn.close()
 
-    conn.close()
+    if request.args.get('parcial'):
+        return responder_filas('clientes_filas.html', siguiente, clientes=clientes_list)
 
-    return render_template('clientes.html', clientes=clientes_list)
+    return render_template('clientes.html', clientes=clientes_list, filtros=filtros, siguiente=siguiente)
+
+@app.route('/api/clientes')
+def api_clientes():
+    """API de clientes, paginada (mismo filtro que /clientes)"""
+    return responder_listado(listar_clientes, 'clientes')
 
 @app.route('/clientes/<int:id_cliente>')
 def cliente_detalle(id_cliente):
@@ -2124,6 +2165,7 @@ def cliente_detalle(id_cliente):
                          stats=stats)
 
 @app.route('/api/clientes/crear', methods=['POST'])
+@invalida('clientes')
 def crear_cliente():
     """API para crear nuevo cliente"""
     try:
@@ -2202,6 +2244,7 @@ def obtener_cliente(id_cliente):
         return jsonify({'success': False, 'error': str(e)}), 400
 
 @app.route('/api/clientes/actualizar/<int:id_cliente>', methods=['PUT'])
+@invalida('clientes')
 def actualizar_cliente(id_cliente):
     """API para actualizar datos de un cliente"""
     try:
@@ -2272,6 +2315,7 @@ def actualizar_cliente(id_cliente):
         return jsonify({'success': False, 'error': str(e)}), 400
 
 @app.route('/api/cuentas/crear', methods=['POST'])
+@invalida('cuentas_por_cobrar')
 def crear_cuenta():
     """API para crear nueva cuenta por cobrar"""
     try:
@@ -2281,9 +2325,7 @@ def crear_cuenta():
         cursor = conn.cursor()
 
         # Generar código de cuenta
-        cursor.execute('SELECT MAX(id_cuenta) FROM cuentas_por_cobrar')
-        max_id = cursor.fetchone()[0] or 0
-        codigo_cuenta = f"CC-{max_id + 1:06d}"
+        codigo_cuenta = f"CC-{siguiente_secuencia(cursor, 'CC'):06d}"
 
         saldo_pendiente = data['monto_total']
 
@@ -2319,6 +2361,7 @@ def crear_cuenta():
         return jsonify({'success': False, 'error': str(e)}), 400
 
 @app.route('/api/pagos/registrar', methods=['POST'])
+@invalida('pagos', 'cuentas_por_cobrar', 'ventas_v2', 'metricas_diarias')
 def registrar_pago():
     """API para registrar pago"""
     try:
@@ -2328,9 +2371,7 @@ def registrar_pago():
         cursor = conn.cursor()
 
         # Generar código de pago
-        cursor.execute('SELECT MAX(id_pago) FROM pagos')
-        max_id = cursor.fetchone()[0] or 0
-        codigo_pago = f"PAG-{max_id + 1:06d}"
+        codigo_pago = f"PAG-{siguiente_secuencia(cursor, 'PAG'):06d}"
 
         # Insertar pago
         cursor.execute('''
@@ -2361,6 +2402,10 @@ def registrar_pago():
             WHERE id_cuenta = ?
         ''', (data['monto_pago'], data['monto_pago'], data['monto_pago'], data['id_cuenta']))
 
+        # Contadores del dashboard (en la misma transaccion)
+        sumar_metricas_diarias(cursor, data['fecha_pago'] or None,
+                               pagos_cantidad=1, pagos_monto=data['monto_pago'])
+
         # Obtener datos de la cuenta para actualizar la venta vinculada
         cursor.execute('''
             SELECT id_venta, saldo_pendiente, monto_total
@@ -2401,6 +2446,45 @@ def registrar_pago():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
+# ============================================================================
+# MÓDULO: TRABAJOS EN SEGUNDO PLANO
+# ============================================================================
+
+@app.route('/api/jobs/<int:id_trabajo>')
+def api_trabajo(id_trabajo):
+    """API para consultar el estado y avance de un trabajo en segundo plano"""
+    # Si este worker aun no arranco sus hilos (o se reinicio), retoma los pendientes
+    trabajos.iniciar()
+    trabajo = trabajos.obtener(id_trabajo)
+    if trabajo is None:
+        return jsonify({'success': False, 'error': 'Trabajo no encontrado'}), 404
+
+    archivo = trabajo.pop('archivo')
+    trabajo['url_archivo'] = url_for('api_trabajo_archivo', id_trabajo=id_trabajo) if archivo else None
+    return jsonify({'success': True, 'trabajo': trabajo})
+
+@app.route('/api/jobs/<int:id_trabajo>/archivo')
+def api_trabajo_archivo(id_trabajo):
+    """Descarga el archivo generado por un trabajo terminado (exportaciones)"""
+    trabajo = trabajos.obtener(id_trabajo)
+    if trabajo is None or not trabajo['archivo'] or not os.path.exists(trabajo['archivo']):
+        return jsonify({'success': False, 'error': 'El trabajo no tiene archivo para descargar'}), 404
+    return send_file(trabajo['archivo'], as_attachment=True, download_name=trabajo['resultado']['descarga'])
+
+# ============================================================================
+# MÓDULO: DIAGNÓSTICO
+# ============================================================================
+
+@app.route('/api/cache/estadisticas')
+def api_estadisticas_cache():
+    """API para consultar aciertos/fallos del cache de páginas"""
+    return jsonify({'success': True, 'cache': estadisticas_cache()})
+
+@app.route('/api/inventario/traslados/estadisticas')
+def api_estadisticas_traslados():
+    """API para consultar conflictos y reintentos de los traslados optimistas"""
+    return jsonify({'success': True, 'traslados': estadisticas_traslados()})
+
 # ============================================================================
 # SERVIDOR
 # ============================================================================
@@ -0,0 +1,128 @@
+"""
+Benchmark: arranque en frio de un worker (import app_v2) y memoria por proceso
+Cada medicion corre en un proceso nuevo, como un worker de gunicorn sin
+--preload: tiempo de `import app_v2`, memoria residente (RSS) al terminar de
+importar y que modulos pesados quedaron cargados, antes y despues de atender
+requests de lectura y la descarga de una plantilla (lo que hace un worker que
+nunca recibe una carga masiva: no deberia cargar pandas).
+
+Ademas corre una vez con `python -X importtime` y muestra en que paquetes se
+va el tiempo de importacion hasta terminar `import app_v2` (suma del tiempo
+propio de cada modulo).
+
+Sin DATABASE_URL usa un archivo SQLite temporal. Con DATABASE_URL usa esa base
+de datos PostgreSQL (las migraciones ya aplicadas no se repiten).
+
+Uso:
+    python benchmarks/bench_arranque.py [repeticiones] [directorio del proyecto]
+
+El directorio permite medir otra copia del proyecto (por ejemplo un
+`git worktree` de la version anterior) con el mismo benchmark.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import Counter
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PESADOS = ('pandas', 'numpy', 'openpyxl', 'lxml', 'psycopg2', 'redis')
+
+# Lo que atiende un worker que nunca recibe una carga masiva
+RUTAS = ('/', '/catalogo-variantes', '/produccion', '/inventario', '/ventas',
+         '/api/variantes-base/plantilla-excel')
+
+PAQUETES_MOSTRADOS = 12
+
+
+# Lo que corre cada proceso hijo: solo importa lo que el worker importaria
+PROCESO = f'''
+import json, os, sys, time
+
+def rss_mb():
+    """Memoria residente actual del proceso (Linux)"""
+    with open('/proc/self/status') as status:
+        for linea in status:
+            if linea.startswith('VmRSS:'):
+                return int(linea.split()[1]) / 1024
+    return 0.0
+
+def cargados():
+    return [nombre for nombre in {PESADOS!r} if nombre in sys.modules]
+
+raiz = sys.argv[1]
+sys.path.insert(0, raiz)
+os.chdir(raiz)
+inicio = time.perf_counter()
+import app_v2
+segundos = time.perf_counter() - inicio
+resultado = {{'segundos': segundos, 'rss': rss_mb(), 'cargados': cargados()}}
+print('-- fin del arranque --', file=sys.stderr, flush=True)
+
+cliente = app_v2.app.test_client()
+for url in {RUTAS!r}:
+    respuesta = cliente.get(url)
+    if respuesta.status_code != 200:
+        raise SystemExit(f'GET {{url}}: {{respuesta.status_code}}')
+resultado.update(rss_requests=rss_mb(), cargados_requests=cargados())
+print(json.dumps(resultado))
+'''
+
+
+def correr(raiz, entorno, importtime=False):
+    comando = [sys.executable] + (['-X', 'importtime'] if importtime else []) + \
+              ['-c', PROCESO, raiz]
+    salida = subprocess.run(comando, env=entorno, capture_output=True, text=True)
+    if salida.returncode != 0:
+        raise SystemExit(salida.stderr[-2000:])
+    return json.loads(salida.stdout.strip().splitlines()[-1]), salida.stderr
+
+
+def por_paquete(reporte):
+    """Microsegundos de tiempo propio por paquete de primer nivel, de la salida de -X importtime"""
+    tiempos = Counter()
+    for linea in reporte.splitlines():
+        if linea == '-- fin del arranque --':
+            break
+        if not linea.startswith('import time:') or 'self [us]' in linea:
+            continue
+        propio, _, nombre = linea[len('import time:'):].split('|')
+        tiempos[nombre.strip().split('.')[0]] += int(propio)
+    return tiempos
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 7
+    raiz = os.path.abspath(sys.argv[2]) if len(sys.argv) > 2 else BASE_DIR
+
+    entorno = dict(os.environ)
+    if not entorno.get('DATABASE_URL'):
+        entorno['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(), 'arranque.db')
+    motor = 'PostgreSQL' if entorno.get('DATABASE_URL') else 'SQLite'
+
+    # La primera vez crea el esquema: no cuenta como arranque
+    correr(raiz, entorno)
+    mediciones = [correr(raiz, entorno)[0] for _ in range(repeticiones)]
+    _, reporte = correr(raiz, entorno, importtime=True)
+
+    tiempos = por_paquete(reporte)
+    total = sum(tiempos.values())
+    print(f'Motor: {motor}, {raiz}\n')
+    print(f'python -X importtime: {total / 1000:.1f} ms importando, por paquete (tiempo propio)')
+    for paquete, microsegundos in tiempos.most_common(PAQUETES_MOSTRADOS):
+        print(f'{paquete:>24} | {microsegundos / 1000:8.1f} ms {100 * microsegundos / total:5.1f} %')
+
+    ultima = mediciones[-1]
+    print(f'\nimport app_v2 (mediana de {repeticiones} procesos): '
+          f"{statistics.median(m['segundos'] for m in mediciones) * 1000:.1f} ms")
+    print(f"RSS al arrancar: {statistics.median(m['rss'] for m in mediciones):.1f} MB, "
+          f"modulos pesados: {', '.join(ultima['cargados']) or 'ninguno'}")
+    print(f"RSS despues de {len(RUTAS)} requests: {statistics.median(m['rss_requests'] for m in mediciones):.1f} MB, "
+          f"modulos pesados: {', '.join(ultima['cargados_requests']) or 'ninguno'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Benchmark: registro de una venta directa segun el tamano del carrito
+Compara el camino anterior (por cada linea: SELECT de inventario, SELECT del
+producto, INSERT del detalle y UPDATE del stock) contra el camino en lote
+(un UPDATE condicionado para todo el stock, una consulta IN (...) para los
+productos y executemany para el detalle y el historial de movimientos),
+midiendo tiempo y viajes a la BD. Cada venta se deshace con rollback, asi
+todas las corridas parten del mismo estado.
+
+Sin DATABASE_URL usa un archivo SQLite temporal. Con DATABASE_URL usa esa base
+de datos PostgreSQL: debe ser una base de datos VACIA de pruebas.
+
+Uso:
+    python benchmarks/bench_carrito.py [repeticiones]
+"""
+import math
+import os
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+if not os.environ.get('DATABASE_URL'):
+    os.environ['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(), 'carrito.db')
+
+import app_v2  # aplica las migraciones sobre la BD de pruebas
+from config import get_config
+from database import get_db, is_postgres
+from movimientos import VENTA_DIRECTA, descontar_stock
+
+TAMANOS = (1, 10, 40, 100)
+
+
+class CursorContador:
+    """Cuenta los viajes a la BD de un cursor (executemany agrupa por paginas en PostgreSQL)"""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.viajes = 0
+
+    def execute(self, sql, params=None):
+        self.viajes += 1
+        return self.cursor.execute(sql, params) if params is not None else self.cursor.execute(sql)
+
+    def executemany(self, sql, params_list):
+        self.viajes += math.ceil(len(params_list) / get_config().DB_BATCH_PAGE_SIZE) if is_postgres() else 1
+        return self.cursor.executemany(sql, params_list)
+
+    def __getattr__(self, nombre):
+        return getattr(self.cursor, nombre)
+
+
+def preparar_datos(cursor, n_productos):
+    cursor.execute("INSERT INTO variantes_base (codigo_interno, tipo_calzado) VALUES ('BENCH-1', 'Botin')")
+    cursor.executemany('INSERT INTO productos_producidos (id_variante_base, cuero, color_cuero, serie_tallas, '
+                       'cantidad_total_pares) VALUES (1, ?, ?, ?, 100000)',
+                       [('Cuero', 'Negro', '35-40') for _ in range(n_productos)])
+    cursor.executemany('INSERT INTO inventario (id_producto, id_ubicacion, tipo_stock, cantidad_pares) '
+                       "VALUES (?, 1, 'general', 100000)",
+                       [(i,) for i in range(1, n_productos + 1)])
+    cursor.execute("INSERT INTO ventas_v2 (codigo_venta, cliente, total_final) VALUES ('BENCH', 'Bench', 0)")
+
+
+def carrito(tamano):
+    return [{'id_producto': i, 'id_inventario': i, 'cantidad_pares': 12, 'precio_unitario': 20}
+            for i in range(1, tamano + 1)]
+
+
+def venta_por_linea(cursor, productos):
+    """Camino anterior: cuatro sentencias por linea"""
+    for prod in productos:
+        cursor.execute('SELECT cantidad_pares, tipo_stock FROM inventario WHERE id_inventario = ?',
+                       (prod['id_inventario'],))
+        if cursor.fetchone()['cantidad_pares'] < prod['cantidad_pares']:
+            raise Exception('Stock insuficiente')
+    for prod in productos:
+        cursor.execute('''
+            SELECT vb.codigo_interno, p.cuero, p.color_cuero, p.serie_tallas
+            FROM productos_producidos p
+            JOIN variantes_base vb ON p.id_variante_base = vb.id_variante_base
+            WHERE p.id_producto = ?
+        ''', (prod['id_producto'],))
+        info = cursor.fetchone()
+        cursor.execute('''
+            INSERT INTO ventas_detalle
+            (id_venta, id_producto, codigo_interno, cuero, color_cuero, serie_tallas,
+             cantidad_pares, cantidad_docenas, precio_unitario, descuento_linea, subtotal)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (1, prod['id_producto'], info['codigo_interno'], info['cuero'], info['color_cuero'],
+              info['serie_tallas'], prod['cantidad_pares'], prod['cantidad_pares'] / 12,
+              prod['precio_unitario'], 0, prod['cantidad_pares'] * prod['precio_unitario']))
+        cursor.execute('UPDATE inventario SET cantidad_pares = cantidad_pares - ? WHERE id_inventario = ?',
+                       (prod['cantidad_pares'], prod['id_inventario']))
+
+
+def venta_en_lote(cursor, productos):
+    """Camino actual de registrar_venta_directa (incluye el historial de movimientos)"""
+    a_descontar = {}
+    for prod in productos:
+        a_descontar[prod['id_inventario']] = a_descontar.get(prod['id_inventario'], 0) + prod['cantidad_pares']
+    if descontar_stock(cursor, a_descontar, VENTA_DIRECTA, 'BENCH'):
+        raise Exception('Stock insuficiente')
+    app_v2.insertar_detalle_venta(cursor, 1, productos)
+
+
+def medir(funcion, productos, repeticiones):
+    conn = get_db()
+    viajes = 0
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        cursor = CursorContador(conn.cursor())
+        funcion(cursor, productos)
+        conn.rollback()
+        viajes = cursor.viajes
+    ms = (time.perf_counter() - inicio) / repeticiones * 1000
+    conn.close()
+    return ms, viajes
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    conn = get_db()
+    preparar_datos(conn.cursor(), max(TAMANOS))
+    conn.commit()
+    conn.close()
+
+    motor = 'PostgreSQL' if is_postgres() else 'SQLite'
+    print(f'Motor: {motor}, {repeticiones} repeticiones por tamano\n')
+    print(f"{'lineas':>6}  {'por linea':>18}  {'en lote':>18}  {'mejora':>6}")
+    for tamano in TAMANOS:
+        productos = carrito(tamano)
+        ms_linea, viajes_linea = medir(venta_por_linea, productos, repeticiones)
+        ms_lote, viajes_lote = medir(venta_en_lote, productos, repeticiones)
+        print(f'{tamano:>6}  {ms_linea:8.2f} ms {viajes_linea:4d} v  {ms_lote:8.2f} ms {viajes_lote:4d} v  '
+              f'{ms_linea / ms_lote:5.1f}x')
+
+
+if __name__ == '__main__':
+    main()
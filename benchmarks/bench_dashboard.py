@@ -0,0 +1,135 @@
+"""
+Benchmark: dashboard con consultas separadas contra una sola consulta agregada
+Compara las consultas que hacia index() una por una (un viaje a la BD cada
+una) contra metricas.resumen_dashboard(), que trae todo en una sentencia
+leyendo los contadores de metricas_diarias/metricas_globales.
+Verifica ademas que ambas versiones devuelvan los mismos valores.
+
+Sin DATABASE_URL usa un archivo SQLite temporal. Con DATABASE_URL usa esa base
+de datos PostgreSQL: debe ser una base de datos VACIA de pruebas.
+
+Uso:
+    python benchmarks/bench_dashboard.py [escala] [repeticiones]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import database
+from database import get_db, is_postgres, aplicar_migraciones
+from metricas import reconstruir_metricas, resumen_dashboard
+
+# Consultas que ejecutaba index() antes de unificarlas
+CONSULTAS_ANTERIORES = [
+    'SELECT COUNT(*) as total FROM variantes_base WHERE activo = 1',
+    'SELECT COUNT(*) as total FROM productos_producidos WHERE activo = 1',
+    'SELECT COALESCE(SUM(cantidad_pares), 0) as total FROM inventario',
+    '''SELECT COUNT(*) as cantidad, COALESCE(SUM(total_final), 0) as monto_total
+       FROM ventas_v2 WHERE DATE(fecha_venta) = DATE("now")''',
+    '''SELECT COUNT(*) as cantidad, COALESCE(SUM(total_final), 0) as monto_total
+       FROM ventas_v2 WHERE strftime('%Y-%m', fecha_venta) = strftime('%Y-%m', 'now')''',
+    '''SELECT COUNT(*) as cantidad, COALESCE(SUM(saldo_pendiente), 0) as monto_total
+       FROM cuentas_por_cobrar WHERE estado = 'pendiente' AND saldo_pendiente > 0''',
+    '''SELECT COUNT(*) as cantidad,
+              COALESCE(SUM(cantidad_total_pares - COALESCE(cantidad_ingresada, 0)), 0) as pares_pendientes
+       FROM productos_producidos
+       WHERE cantidad_total_pares > COALESCE(cantidad_ingresada, 0) AND activo = 1''',
+    "SELECT COUNT(*) as total FROM preparaciones WHERE estado = 'pendiente'",
+]
+
+
+def cargar_datos(cursor, escala):
+    """Datos sinteticos con ventas repartidas en el ultimo anio (incluye hoy)"""
+    random.seed(7)
+    hoy = date.today()
+    n_variantes, n_productos, n_clientes, n_ventas = 50 * escala, 400 * escala, 100 * escala, 4000 * escala
+
+    cursor.executemany('INSERT INTO variantes_base (codigo_interno, tipo_calzado) VALUES (?, ?)',
+                       [(f'MOD-{i:05d}', 'Botin') for i in range(n_variantes)])
+    cursor.executemany('INSERT INTO productos_producidos (id_variante_base, cuero, cantidad_total_pares, '
+                       'cantidad_ingresada) VALUES (?, ?, ?, ?)',
+                       [(random.randint(1, n_variantes), 'Cuero', 120, random.choice((0, 60, 120, 120)))
+                        for _ in range(n_productos)])
+    cursor.executemany('INSERT INTO inventario (id_producto, id_ubicacion, tipo_stock, cantidad_pares) VALUES (?, ?, ?, ?)',
+                       [(p, 1, 'general', random.randint(0, 60)) for p in range(1, n_productos + 1)])
+    cursor.executemany('INSERT INTO clientes (nombre) VALUES (?)', [(f'Cliente {i}',) for i in range(n_clientes)])
+    cursor.executemany('INSERT INTO ventas_v2 (codigo_venta, id_cliente, fecha_venta, total_final) VALUES (?, ?, ?, ?)',
+                       [(f'B{i:07d}', random.randint(1, n_clientes),
+                         (hoy - timedelta(days=i % 365)).isoformat(), random.randint(50, 900))
+                        for i in range(n_ventas)])
+    cursor.executemany('INSERT INTO cuentas_por_cobrar (codigo_cuenta, id_cliente, id_venta, monto_total, '
+                       'saldo_pendiente, estado) VALUES (?, ?, ?, ?, ?, ?)',
+                       [(f'CC-{i:06d}', random.randint(1, n_clientes), i * 3, 100, random.choice((0, 50)),
+                         random.choice(('pendiente', 'pagado'))) for i in range(1, n_ventas // 3)])
+    cursor.executemany('INSERT INTO preparaciones (estado) VALUES (?)',
+                       [('completada' if i % 20 else 'pendiente',) for i in range(n_ventas // 10)])
+
+
+def dashboard_anterior(cursor):
+    """Un viaje a la BD por metrica, como lo hacia index()"""
+    filas = []
+    for sql in CONSULTAS_ANTERIORES:
+        cursor.execute(sql)
+        filas.append(cursor.fetchone())
+    variantes, productos, stock, hoy, mes, cuentas, pendientes, preparaciones = filas
+    return {
+        'variantes': variantes['total'],
+        'productos': productos['total'],
+        'stock': stock['total'],
+        'ventas_hoy': {'cantidad': hoy['cantidad'], 'monto': hoy['monto_total']},
+        'ventas_mes': {'cantidad': mes['cantidad'], 'monto': mes['monto_total']},
+        'cuentas_por_cobrar': {'cantidad': cuentas['cantidad'], 'monto': cuentas['monto_total']},
+        'pendientes_ingreso': {'cantidad': pendientes['cantidad'], 'pares': pendientes['pares_pendientes']},
+        'preparaciones_activas': preparaciones['total'],
+    }
+
+
+def medir(funcion, repeticiones):
+    conn = get_db()
+    cursor = conn.cursor()
+    funcion(cursor)  # precalentar cache de traduccion y de paginas
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        resultado = funcion(cursor)
+    segundos = time.perf_counter() - inicio
+    conn.close()
+    return resultado, segundos / repeticiones * 1000
+
+
+def main():
+    escala = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    repeticiones = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    if not is_postgres():
+        database.config.SQLITE_PATH = os.path.join(tempfile.mkdtemp(), 'dashboard.db')
+    aplicar_migraciones()
+
+    conn = get_db()
+    cursor = conn.cursor()
+    cargar_datos(cursor, escala)
+    # La carga masiva no pasa por las rutas: se recalculan los contadores
+    reconstruir_metricas(cursor)
+    conn.commit()
+    cursor.execute('ANALYZE')
+    conn.commit()
+    conn.close()
+
+    anterior, ms_anterior = medir(dashboard_anterior, repeticiones)
+    nuevo, ms_nuevo = medir(resumen_dashboard, repeticiones)
+    assert anterior == nuevo, f'Resultados distintos:\n{anterior}\n{nuevo}'
+
+    motor = 'PostgreSQL' if is_postgres() else 'SQLite'
+    print(f'Motor: {motor}, escala {escala} ({4000 * escala} ventas), {repeticiones} repeticiones')
+    print(f'Por separado    : {ms_anterior:8.2f} ms/dashboard ({len(CONSULTAS_ANTERIORES)} viajes)')
+    print(f'Una consulta    : {ms_nuevo:8.2f} ms/dashboard (1 viaje)')
+    print(f'Mejora          : {ms_anterior / ms_nuevo:8.2f}x')
+    print(f'Metricas        : {nuevo}')
+
+
+if __name__ == '__main__':
+    main()
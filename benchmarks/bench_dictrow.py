@@ -0,0 +1,122 @@
+"""
+Benchmark: memoria y tiempo de materializar un resultado grande como DictRow
+Compara el esquema anterior (RealDictRow por fila + copia de la lista de claves)
+contra DictRow con __slots__ sobre la tupla de psycopg2 y un mapa de columnas
+compartido por todo el resultado.
+
+Sin DATABASE_URL simula las filas que entregaria psycopg2. Con DATABASE_URL
+ademas mide un fetchall() real de PostgreSQL.
+
+Uso:
+    python benchmarks/bench_dictrow.py [filas]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from database import DictRow
+
+COLUMNAS = ['id_inventario', 'id_producto', 'id_ubicacion', 'cantidad_pares', 'tipo_stock',
+            'cuero', 'color_cuero', 'serie_tallas', 'codigo_interno', 'ubicacion_nombre']
+
+
+class DictRowAnterior:
+    """Implementacion previa: referencia al RealDictRow + lista de claves por fila"""
+
+    def __init__(self, data):
+        self._data = data
+        self._keys = list(data.keys())
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self._data[self._keys[key]]
+        return self._data[key]
+
+
+def filas_simuladas(n):
+    return [
+        (i, i % 500, i % 7, i % 120, 'general', 'Cuero', 'Negro', '35-40', f'BOT-{i % 500:03d}', 'Almacen Central')
+        for i in range(n)
+    ]
+
+
+def medir(construir):
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    filas = construir()
+    segundos = time.perf_counter() - inicio
+    memoria, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return filas, segundos, memoria
+
+
+def reportar(nombre, segundos, memoria, n):
+    print(f"{nombre:<34} {segundos * 1000:9.1f} ms  {memoria / 1024 / 1024:8.2f} MiB  "
+          f"{memoria / n:6.0f} B/fila")
+
+
+def simulado(n):
+    tuplas = filas_simuladas(n)
+
+    def anterior():
+        # RealDictCursor crea un dict por fila; DictRow anterior agrega la lista de claves
+        return [DictRowAnterior(dict(zip(COLUMNAS, t))) for t in tuplas]
+
+    def nuevo():
+        columnas = {c: i for i, c in enumerate(COLUMNAS)}
+        return [DictRow(columnas, t) for t in tuplas]
+
+    print(f"Simulado: {n} filas x {len(COLUMNAS)} columnas (sin contar las tuplas de psycopg2)")
+    filas, seg, mem = medir(anterior)
+    reportar('RealDictRow + DictRow anterior', seg, mem, n)
+    assert filas[10]['codigo_interno'] == filas[10][8]
+    del filas
+    filas, seg, mem = medir(nuevo)
+    reportar('tupla + DictRow con __slots__', seg, mem, n)
+    assert filas[10]['codigo_interno'] == filas[10][8] and dict(filas[10])['tipo_stock'] == 'general'
+
+
+def postgres(n):
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+    from database import PostgresCursorWrapper, _postgres_dsn
+
+    sql = '''
+        SELECT g AS id_inventario, MOD(g, 500) AS id_producto, MOD(g, 7) AS id_ubicacion, MOD(g, 120) AS cantidad_pares,
+               'general' AS tipo_stock, 'Cuero' AS cuero, 'Negro' AS color_cuero, '35-40' AS serie_tallas,
+               'BOT-' || MOD(g, 500) AS codigo_interno, 'Almacen Central' AS ubicacion_nombre
+        FROM generate_series(1, %s) g
+    '''
+    conn = psycopg2.connect(_postgres_dsn())
+
+    def anterior():
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute(sql, (n,))
+        return [DictRowAnterior(row) for row in cursor.fetchall()]
+
+    def nuevo():
+        cursor = PostgresCursorWrapper(conn.cursor())
+        cursor.execute(sql.replace('%s', '?'), (n,))
+        return cursor.fetchall()
+
+    print(f"\nPostgreSQL: fetchall() de {n} filas")
+    for nombre, funcion in (('RealDictCursor + DictRow anterior', anterior), ('cursor + DictRow con __slots__', nuevo)):
+        filas, seg, mem = medir(funcion)
+        reportar(nombre, seg, mem, n)
+        del filas
+    conn.close()
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    simulado(n)
+    if os.environ.get('DATABASE_URL'):
+        postgres(n)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark: memoria y tiempo de /api/export/ventas segun la cantidad de lineas
+Compara leer todo con fetchall y armar el CSV en memoria (lo que haria una
+exportacion ingenua) contra exportacion.generar_csv y generar_xlsx, que leen
+de a EXPORTACION_LOTE filas. Cada modo corre en un proceso aparte para medir
+su pico de memoria (RSS, incluye lo que reserva libpq en PostgreSQL).
+
+Sin DATABASE_URL usa un archivo SQLite temporal. Con DATABASE_URL usa esa base
+de datos PostgreSQL: debe ser una base de datos VACIA de pruebas.
+
+Uso:
+    python benchmarks/bench_exportacion.py [ventas]
+"""
+import csv
+import importlib
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+LINEAS_POR_VENTA = 3
+MODOS = ('fetchall', 'csv', 'xlsx')
+
+
+def pico_mb():
+    """Pico de memoria residente del proceso (ru_maxrss esta en KB en Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def cargar(ventas):
+    from database import get_db
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO variantes_base (codigo_interno, tipo_calzado) VALUES ('EXP-1', 'Botin')")
+    cursor.execute("INSERT INTO productos_producidos (id_variante_base, cuero, color_cuero, serie_tallas, "
+                   "cantidad_total_pares) VALUES (1, 'Cuero', 'Negro', '35-40', 10)")
+    for desde in range(1, ventas + 1, 10000):
+        hasta = min(desde + 10000, ventas + 1)
+        cursor.executemany("INSERT INTO ventas_v2 (id_venta, codigo_venta, cliente, id_ubicacion, fecha_venta, "
+                           "estado_pago, total_final) VALUES (?, ?, 'Cliente mostrador', 1, ?, 'pagado', 60)",
+                           [(i, f'B{i}', f'2025-{1 + i % 12:02d}-{1 + i % 28:02d}') for i in range(desde, hasta)])
+        cursor.executemany("INSERT INTO ventas_detalle (id_venta, id_producto, codigo_interno, cuero, color_cuero, "
+                           "serie_tallas, cantidad_pares, precio_unitario, subtotal) "
+                           "VALUES (?, 1, 'EXP-1', 'Cuero', 'Negro', '35-40', 4, 5, 20)",
+                           [(i,) for i in range(desde, hasta) for _ in range(LINEAS_POR_VENTA)])
+        conn.commit()
+    conn.close()
+
+
+def medir(modo):
+    """Corre un modo en este proceso e imprime: segundos, primer bloque, MB pico, MB base, bytes"""
+    import exportacion
+    from database import get_db
+
+    if modo == 'xlsx':
+        # openpyxl se carga antes de medir: lo que ocupa el modulo no es memoria de la exportacion
+        importlib.import_module('openpyxl')
+    base = pico_mb()
+    inicio = time.perf_counter()
+    primer_bloque = None
+    tamano = 0
+    if modo == 'fetchall':
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute(exportacion.EXPORTACION_SQL.format(
+            columnas=', '.join(expresion for expresion, _ in exportacion.COLUMNAS), where='1 = 1'))
+        filas = cursor.fetchall()
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(filas)
+        tamano = len(buffer.getvalue())
+        conn.close()
+    elif modo == 'csv':
+        for bloque in exportacion.generar_csv({}):
+            if primer_bloque is None:
+                primer_bloque = time.perf_counter() - inicio
+            tamano += len(bloque)
+    else:
+        archivo = exportacion.generar_xlsx({})
+        tamano = len(archivo.read())
+        archivo.close()
+    total = time.perf_counter() - inicio
+    print(total, primer_bloque if primer_bloque is not None else total, pico_mb(), base, tamano)
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == '--modo':
+        medir(sys.argv[2])
+        return
+
+    ventas = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    entorno = dict(os.environ)
+    if not entorno.get('DATABASE_URL'):
+        entorno['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(), 'exportacion.db')
+    os.environ.update(entorno)
+
+    from database import aplicar_migraciones, is_postgres
+    aplicar_migraciones()
+    cargar(ventas)
+
+    print(f"Motor: {'PostgreSQL' if is_postgres() else 'SQLite'}, {ventas} ventas x {LINEAS_POR_VENTA} lineas\n")
+    print(f"{'modo':>9} | {'total s':>8} {'1er bloque s':>12} {'memoria MB':>11} {'archivo MB':>11}")
+    for modo in MODOS:
+        salida = subprocess.run([sys.executable, os.path.abspath(__file__), '--modo', modo],
+                                env=entorno, capture_output=True, text=True, check=True).stdout.split()
+        total, primero, pico, base, tamano = map(float, salida[-5:])
+        print(f'{modo:>9} | {total:>8.2f} {primero:>12.3f} {pico - base:>11.1f} {tamano / 2 ** 20:>11.1f}')
+
+
+if __name__ == '__main__':
+    main()
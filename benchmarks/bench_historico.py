@@ -0,0 +1,113 @@
+"""
+Benchmark: stock a una fecha segun el largo del historial
+Compara recorrer todo el libro (SUM de movimientos_inventario anteriores a la
+fecha) contra movimientos.stock_a_fecha(), que lee el corte de ese dia y suma
+solo los movimientos del dia. Verifica ademas que ambos den el mismo saldo.
+
+Carga un historial sintetico creciente (mismos movimientos por dia) y mide la
+consulta de una ubicacion completa a las 18:00 del ultimo dia cargado.
+
+Sin DATABASE_URL usa un archivo SQLite temporal. Con DATABASE_URL usa esa base
+de datos PostgreSQL: debe ser una base de datos VACIA de pruebas.
+
+Uso:
+    python benchmarks/bench_historico.py [movimientos_por_dia] [repeticiones]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+if not os.environ.get('DATABASE_URL'):
+    os.environ['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(), 'historico.db')
+
+import database
+from database import get_db, is_postgres
+from movimientos import FORMATO_FECHA, stock_a_fecha
+
+DIAS = (30, 180, 365, 730)
+PRODUCTOS = 300
+UBICACIONES = 4
+INICIO = date(2020, 1, 1)
+
+
+def cargar_dias(cursor, desde, hasta, por_dia):
+    """Movimientos entre los dias [desde, hasta) con hora al azar"""
+    filas = []
+    for dia in range(desde, hasta):
+        base = datetime.combine(INICIO + timedelta(days=dia), datetime.min.time())
+        for _ in range(por_dia):
+            fecha = base + timedelta(seconds=random.randint(0, 86399))
+            filas.append((fecha.strftime(FORMATO_FECHA), random.randint(1, PRODUCTOS),
+                          random.randint(1, UBICACIONES), 'general', random.randint(-12, 24), 'ingreso'))
+    cursor.executemany('''
+        INSERT INTO movimientos_inventario
+        (fecha, id_producto, id_ubicacion, tipo_stock, cantidad, tipo_movimiento)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', filas)
+
+
+def recorrido_completo(conn, hasta, id_ubicacion):
+    """Sin cortes: suma todo el libro anterior a la fecha"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT id_producto, id_ubicacion, tipo_stock, SUM(cantidad) as cantidad_pares
+        FROM movimientos_inventario
+        WHERE fecha < ? AND id_ubicacion = ?
+        GROUP BY id_producto, id_ubicacion, tipo_stock
+        HAVING SUM(cantidad) <> 0
+        ORDER BY id_ubicacion, id_producto, tipo_stock
+    ''', (hasta.strftime(FORMATO_FECHA), id_ubicacion))
+    return cursor.fetchall()
+
+
+def medir(funcion, repeticiones, *args):
+    conn = get_db()
+    resultado = [tuple(fila) for fila in funcion(conn, *args)]  # precalentar (crea el corte)
+    conn.rollback()
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion(conn, *args)
+        conn.rollback()
+    ms = (time.perf_counter() - inicio) / repeticiones * 1000
+    conn.close()
+    return resultado, ms
+
+
+def main():
+    por_dia = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    repeticiones = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    random.seed(11)
+    database.aplicar_migraciones()
+
+    motor = 'PostgreSQL' if is_postgres() else 'SQLite'
+    print(f'Motor: {motor}, {por_dia} movimientos por dia, {repeticiones} repeticiones\n')
+    print(f"{'dias':>5}  {'movimientos':>11}  {'libro completo':>14}  {'corte + dia':>11}  {'mejora':>6}")
+
+    cargados = 0
+    for dias in DIAS:
+        conn = get_db()
+        cursor = conn.cursor()
+        cargar_dias(cursor, cargados, dias, por_dia)
+        conn.commit()
+        cursor.execute('ANALYZE')
+        conn.commit()
+        conn.close()
+        cargados = dias
+
+        ultimo_dia = INICIO + timedelta(days=dias - 1)
+        hasta = datetime.combine(ultimo_dia, datetime.min.time()) + timedelta(hours=18)
+        completo, ms_completo = medir(recorrido_completo, repeticiones, hasta, 1)
+        cortes, ms_cortes = medir(stock_a_fecha, repeticiones, hasta, 1)
+        assert completo == cortes, 'Saldos distintos entre el libro completo y el corte'
+        print(f'{dias:>5}  {dias * por_dia:>11}  {ms_completo:11.2f} ms  {ms_cortes:8.2f} ms  '
+              f'{ms_completo / ms_cortes:5.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark: carga masiva de variantes base desde Excel (filas por segundo)
+Compara el metodo anterior (pd.read_excel del archivo entero, df.iterrows y
+un INSERT por fila) contra importacion.importar_variantes (openpyxl
+read_only, validacion e INSERT ... ON CONFLICT DO NOTHING por lote). Cada
+metodo carga su propio archivo con codigos distintos; al final se verifica
+que ambos hayan insertado todas las filas.
+
+Sin DATABASE_URL usa un archivo SQLite temporal. Con DATABASE_URL usa esa base
+de datos PostgreSQL: debe ser una base de datos VACIA de pruebas.
+
+Uso:
+    python benchmarks/bench_importacion.py [filas]
+"""
+import os
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+if not os.environ.get('DATABASE_URL'):
+    os.environ['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(), 'importacion.db')
+
+from database import aplicar_migraciones, get_db, is_postgres
+from importacion import importar_variantes
+
+
+def crear_excel(prefijo, filas):
+    from openpyxl import Workbook
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet('Variantes')
+    hoja.append(['codigo_interno', 'tipo_calzado', 'tipo_horma', 'segmento', 'descripcion'])
+    for i in range(filas):
+        hoja.append([f'{prefijo}-{i:06d}', 'Botin', 'Clasica', 'Dama', f'Botin de cuero modelo {i}'])
+    ruta = os.path.join(tempfile.mkdtemp(), f'{prefijo}.xlsx')
+    libro.save(ruta)
+    return ruta
+
+
+def importar_anterior(conn, ruta):
+    """Copia del bucle de carga_masiva_variantes antes de importacion.py"""
+    import pandas as pd
+    df = pd.read_excel(ruta)
+    cursor = conn.cursor()
+    insertados = 0
+    for index, row in df.iterrows():
+        codigo = str(row['codigo_interno']).strip()
+        tipo = str(row['tipo_calzado']).strip()
+        if not codigo or not tipo or codigo == 'nan' or tipo == 'nan':
+            continue
+        cursor.execute('''
+            INSERT INTO variantes_base
+            (codigo_interno, tipo_calzado, tipo_horma, segmento, descripcion)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (
+            codigo,
+            tipo,
+            str(row.get('tipo_horma', '')).strip() if pd.notna(row.get('tipo_horma')) else '',
+            str(row.get('segmento', '')).strip() if pd.notna(row.get('segmento')) else '',
+            str(row.get('descripcion', '')).strip() if pd.notna(row.get('descripcion')) else ''
+        ))
+        insertados += 1
+    conn.commit()
+    return insertados
+
+
+def importar_nuevo(conn, ruta):
+    with open(ruta, 'rb') as archivo:
+        return importar_variantes(conn, archivo, ruta)['insertados']
+
+
+def main():
+    filas = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    aplicar_migraciones()
+    print(f"Motor: {'PostgreSQL' if is_postgres() else 'SQLite'}, {filas} filas por archivo\n")
+    print(f"{'metodo':>10} | {'segundos':>9} {'filas/s':>9}")
+
+    errores = []
+    for nombre, importar in (('anterior', importar_anterior), ('por lotes', importar_nuevo)):
+        ruta = crear_excel(nombre[:3].upper(), filas)
+        conn = get_db()
+        inicio = time.perf_counter()
+        insertados = importar(conn, ruta)
+        segundos = time.perf_counter() - inicio
+        conn.close()
+        print(f'{nombre:>10} | {segundos:>9.2f} {filas / segundos:>9.0f}')
+        if insertados != filas:
+            errores.append(f'{nombre}: {insertados} insertadas de {filas}')
+
+    if errores:
+        print('\nERRORES:\n- ' + '\n- '.join(errores))
+        sys.exit(1)
+    print('\nAmbos metodos insertaron todas las filas')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""
+Benchmark: listados de /ventas y /clientes segun el tamano de la tabla
+Compara las consultas anteriores (GROUP BY de toda la tabla con los detalles
+o cuentas unidos; /ventas con LIMIT 100 y /clientes sin limite) contra la
+paginacion por clave de listados.py: primera pagina y una pagina en la mitad
+de la tabla (la que se pide tras muchos "Cargar más"). Verifica ademas que
+recorrer todas las paginas devuelva las mismas filas, en el mismo orden, que
+la consulta completa.
+
+Sin DATABASE_URL usa un archivo SQLite temporal. Con DATABASE_URL usa esa base
+de datos PostgreSQL: debe ser una base de datos VACIA de pruebas.
+
+Uso:
+    python benchmarks/bench_listados.py [repeticiones]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+if not os.environ.get('DATABASE_URL'):
+    os.environ['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(), 'listados.db')
+
+from database import aplicar_migraciones, get_db, is_postgres
+from listados import codificar_cursor, listar_clientes, listar_ventas
+
+TAMANOS = (1000, 10000, 50000)
+LINEAS_POR_VENTA = 3
+PAGINA = 50
+
+VENTAS_ANTERIOR_SQL = '''
+    SELECT
+        v.id_venta, v.codigo_venta, v.id_cliente, v.id_preparacion, v.id_ubicacion, v.fecha_venta,
+        v.estado_pago, v.total_final, v.descuento_total, v.modalidad_pago, v.observaciones,
+        v.fecha_creacion, c.nombre as cliente_nombre, c.apellido as cliente_apellido,
+        u.nombre as ubicacion_nombre,
+        COUNT(vd.id_detalle_venta) as total_productos,
+        COALESCE(SUM(vd.cantidad_pares), 0) as total_pares
+    FROM ventas_v2 v
+    LEFT JOIN ventas_detalle vd ON v.id_venta = vd.id_venta
+    LEFT JOIN clientes c ON v.id_cliente = c.id_cliente
+    LEFT JOIN ubicaciones u ON v.id_ubicacion = u.id_ubicacion
+    GROUP BY v.id_venta, v.codigo_venta, v.id_cliente, v.id_preparacion, v.id_ubicacion,
+             v.fecha_venta, v.estado_pago, v.total_final, v.descuento_total, v.modalidad_pago,
+             v.observaciones, v.fecha_creacion, c.nombre, c.apellido, u.nombre
+    ORDER BY v.fecha_venta DESC, v.id_venta DESC
+    LIMIT 100
+'''
+
+CLIENTES_ANTERIOR_SQL = '''
+    SELECT
+        cl.id_cliente, cl.codigo_cliente, cl.nombre, cl.apellido, cl.nombre_comercial,
+        cl.tipo_documento, cl.numero_documento, cl.email, cl.telefono, cl.direccion,
+        cl.limite_credito, cl.dias_credito, cl.activo, cl.observaciones, cl.fecha_creacion,
+        COALESCE(SUM(c.saldo_pendiente), 0) as deuda_total,
+        COUNT(c.id_cuenta) as num_cuentas_pendientes
+    FROM clientes cl
+    LEFT JOIN cuentas_por_cobrar c ON cl.id_cliente = c.id_cliente AND c.saldo_pendiente > 0
+    GROUP BY cl.id_cliente, cl.codigo_cliente, cl.nombre, cl.apellido, cl.nombre_comercial,
+             cl.tipo_documento, cl.numero_documento, cl.email, cl.telefono, cl.direccion,
+             cl.limite_credito, cl.dias_credito, cl.activo, cl.observaciones, cl.fecha_creacion
+    ORDER BY cl.fecha_creacion DESC
+'''
+
+
+def cargar(cursor, desde, hasta):
+    """Ventas, detalles, clientes y cuentas con ids [desde, hasta)"""
+    cursor.executemany("INSERT INTO clientes (id_cliente, nombre, numero_documento, fecha_creacion) "
+                       "VALUES (?, ?, ?, ?)",
+                       [(i, f'Cliente {i}', f'DOC-{i}', f'2024-01-01 00:00:{i % 60:02d}')
+                        for i in range(desde, hasta)])
+    cursor.executemany("INSERT INTO cuentas_por_cobrar (id_cliente, monto_total, saldo_pendiente) VALUES (?, 100, ?)",
+                       [(i, random.choice((0, 40))) for i in range(desde, hasta)])
+    cursor.executemany("INSERT INTO ventas_v2 (id_venta, codigo_venta, id_cliente, cliente, id_ubicacion, "
+                       "fecha_venta, estado_pago, total_final) VALUES (?, ?, ?, 'Bench', 1, ?, 'pagado', 60)",
+                       [(i, f'B{i}', random.randint(1, hasta - 1),
+                         (date(2020, 1, 1) + timedelta(days=i // 40)).isoformat())
+                        for i in range(desde, hasta)])
+    cursor.executemany("INSERT INTO ventas_detalle (id_venta, id_producto, cantidad_pares, precio_unitario, subtotal) "
+                       "VALUES (?, 1, 4, 5, 20)",
+                       [(i,) for i in range(desde, hasta) for _ in range(LINEAS_POR_VENTA)])
+
+
+def medir(funcion, repeticiones):
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor * 1000
+
+
+def recorrer(cursor, listar, campo):
+    ids, despues = [], None
+    while True:
+        filas, despues = listar(cursor, {}, despues, 500)
+        ids.extend(fila[campo] for fila in filas)
+        if despues is None:
+            return ids
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    random.seed(7)
+    aplicar_migraciones()
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO variantes_base (codigo_interno, tipo_calzado) VALUES ('LIST-1', 'Botin')")
+    cursor.execute("INSERT INTO productos_producidos (id_variante_base, cuero, color_cuero, serie_tallas, "
+                   "cantidad_total_pares) VALUES (1, 'Cuero', 'Negro', '35-40', 10)")
+
+    print(f"Motor: {'PostgreSQL' if is_postgres() else 'SQLite'}, pagina de {PAGINA} filas, "
+          f'{LINEAS_POR_VENTA} lineas por venta (mejor de {repeticiones}, ms)\n')
+    print(f"{'filas':>7} | {'/ventas anterior':>16} {'pag. 1':>8} {'pag. media':>10} | "
+          f"{'/clientes anterior':>18} {'pag. 1':>8} {'pag. media':>10}")
+
+    errores = []
+    cargadas = 1
+    for tamano in TAMANOS:
+        cargar(cursor, cargadas, tamano + 1)
+        cargadas = tamano + 1
+        if is_postgres():
+            cursor.execute('ANALYZE')
+        conn.commit()
+
+        # Cursores de una pagina en la mitad de cada tabla
+        cursor.execute('SELECT fecha_venta, id_venta FROM ventas_v2 ORDER BY fecha_venta DESC, id_venta DESC '
+                       'LIMIT 1 OFFSET ?', (tamano // 2,))
+        fila = cursor.fetchone()
+        medio_ventas = codificar_cursor(['-fecha_venta', fila['fecha_venta'], fila['id_venta']])
+        cursor.execute('SELECT fecha_creacion, id_cliente FROM clientes ORDER BY fecha_creacion DESC, id_cliente DESC '
+                       'LIMIT 1 OFFSET ?', (tamano // 2,))
+        fila = cursor.fetchone()
+        medio_clientes = codificar_cursor(['-fecha_creacion', fila['fecha_creacion'], fila['id_cliente']])
+
+        def consulta(sql):
+            cursor.execute(sql)
+            cursor.fetchall()
+
+        tiempos = [
+            medir(lambda: consulta(VENTAS_ANTERIOR_SQL), repeticiones),
+            medir(lambda: listar_ventas(cursor, {}, None, PAGINA), repeticiones),
+            medir(lambda: listar_ventas(cursor, {}, medio_ventas, PAGINA), repeticiones),
+            medir(lambda: consulta(CLIENTES_ANTERIOR_SQL), repeticiones),
+            medir(lambda: listar_clientes(cursor, {}, None, PAGINA), repeticiones),
+            medir(lambda: listar_clientes(cursor, {}, medio_clientes, PAGINA), repeticiones),
+        ]
+        print(f'{tamano:>7} | {tiempos[0]:>16.2f} {tiempos[1]:>8.2f} {tiempos[2]:>10.2f} | '
+              f'{tiempos[3]:>18.2f} {tiempos[4]:>8.2f} {tiempos[5]:>10.2f}')
+
+        cursor.execute('SELECT id_venta FROM ventas_v2 ORDER BY fecha_venta DESC, id_venta DESC')
+        esperado = [f['id_venta'] for f in cursor.fetchall()]
+        if recorrer(cursor, listar_ventas, 'id_venta') != esperado:
+            errores.append(f'{tamano}: las paginas de ventas no coinciden con la consulta completa')
+        cursor.execute('SELECT id_cliente FROM clientes ORDER BY fecha_creacion DESC, id_cliente DESC')
+        esperado = [f['id_cliente'] for f in cursor.fetchall()]
+        if recorrer(cursor, listar_clientes, 'id_cliente') != esperado:
+            errores.append(f'{tamano}: las paginas de clientes no coinciden con la consulta completa')
+
+    conn.close()
+    if errores:
+        print('\nERRORES:\n- ' + '\n- '.join(errores))
+        sys.exit(1)
+    print('\nRecorrer todas las paginas devuelve las mismas filas y en el mismo orden')
+
+
+if __name__ == '__main__':
+    main()
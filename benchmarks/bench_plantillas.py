@@ -0,0 +1,99 @@
+"""
+Benchmark: descarga de la plantilla Excel de la carga masiva de variantes
+Compara armarla en cada request con pandas (DataFrame + ExcelWriter, como
+antes de plantillas.py) contra GET /api/variantes-base/plantilla-excel: la
+primera descarga del proceso (la genera con openpyxl), las siguientes (desde
+memoria) y la revalidacion con If-None-Match (304 sin cuerpo). Cada modo
+corre en un proceso aparte para medir tambien cuanta memoria suma (RSS).
+
+Uso:
+    python benchmarks/bench_plantillas.py [repeticiones]
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+MODOS = ('pandas', 'cache')
+
+
+def pico_mb():
+    """Pico de memoria residente del proceso (ru_maxrss esta en KB en Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def plantilla_anterior():
+    """Copia de descargar_plantilla_variantes antes de plantillas.py (sin el send_file)"""
+    import pandas as pd
+    from io import BytesIO
+
+    data = {
+        'codigo_interno': ['BOT-001', 'ZAP-002', 'SAN-003'],
+        'tipo_calzado': ['Botin', 'Zapato', 'Sandalia'],
+        'tipo_horma': ['Clasica', 'Sport', 'Casual'],
+        'segmento': ['Dama', 'Caballero', 'Dama'],
+        'descripcion': ['Botin de cuero para dama', 'Zapato deportivo', 'Sandalia casual']
+    }
+    df = pd.DataFrame(data)
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        df.to_excel(writer, index=False, sheet_name='Variantes')
+    return output.getvalue()
+
+
+def medir(modo, repeticiones):
+    """Corre un modo en este proceso e imprime: ms primera, ms siguientes, ms 304, MB sumados"""
+    import app_v2
+    cliente = app_v2.app.test_client()
+    base = pico_mb()
+
+    def tiempo(funcion):
+        inicio = time.perf_counter()
+        funcion()
+        return (time.perf_counter() - inicio) * 1000
+
+    if modo == 'pandas':
+        primera = tiempo(plantilla_anterior)
+        siguientes = min(tiempo(plantilla_anterior) for _ in range(repeticiones))
+        revalidacion = siguientes
+    else:
+        url = '/api/variantes-base/plantilla-excel'
+        etag = []
+        primera = tiempo(lambda: etag.append(cliente.get(url).headers['ETag']))
+        siguientes = min(tiempo(lambda: cliente.get(url).data) for _ in range(repeticiones))
+        respuesta = cliente.get(url, headers={'If-None-Match': etag[0]})
+        if respuesta.status_code != 304:
+            raise SystemExit(f'Se esperaba 304 y llego {respuesta.status_code}')
+        revalidacion = min(tiempo(lambda: cliente.get(url, headers={'If-None-Match': etag[0]}))
+                           for _ in range(repeticiones))
+    print(primera, siguientes, revalidacion, pico_mb() - base)
+
+
+def main():
+    if len(sys.argv) > 3 and sys.argv[1] == '--modo':
+        medir(sys.argv[2], int(sys.argv[3]))
+        return
+
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    entorno = dict(os.environ)
+    if not entorno.get('DATABASE_URL'):
+        entorno['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(), 'plantillas.db')
+
+    print(f'Plantilla de variantes (ms, mejor de {repeticiones} para las siguientes)\n')
+    print(f"{'modo':>8} | {'primera':>9} {'siguientes':>11} {'304':>7} {'memoria MB':>11}")
+    for modo in MODOS:
+        salida = subprocess.run([sys.executable, os.path.abspath(__file__), '--modo', modo, str(repeticiones)],
+                                env=entorno, capture_output=True, text=True, check=True).stdout.split()
+        primera, siguientes, revalidacion, memoria = map(float, salida[-4:])
+        columna_304 = '-' if modo == 'pandas' else f'{revalidacion:.2f}'
+        print(f'{modo:>8} | {primera:>9.2f} {siguientes:>11.2f} {columna_304:>7} {memoria:>11.1f}')
+
+
+if __name__ == '__main__':
+    main()
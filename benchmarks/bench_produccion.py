@@ -0,0 +1,139 @@
+"""
+Benchmark: carga de lotes de produccion con ingreso a una ubicacion (lotes por segundo)
+Compara cargar un lote a la vez, como lo hacen /api/productos/crear y
+/api/inventario/ingresar (buscar la variante, INSERT, ingreso y commit por
+lote), contra importacion.importar_produccion (mapa de variantes, validacion
+e INSERT por bloque y una sola transaccion). Al final verifica que ambos
+metodos dejen los mismos lotes, stock y movimientos.
+
+Sin DATABASE_URL usa un archivo SQLite temporal. Con DATABASE_URL usa esa base
+de datos PostgreSQL: debe ser una base de datos VACIA de pruebas.
+
+Uso:
+    python benchmarks/bench_produccion.py [lotes]
+"""
+import os
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+if not os.environ.get('DATABASE_URL'):
+    os.environ['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(), 'produccion.db')
+
+from database import aplicar_migraciones, get_db, is_postgres, sumar_inventario
+from importacion import COLUMNAS_PRODUCCION, importar_produccion
+from metricas import sumar_metricas_diarias, sumar_metrica_global
+from movimientos import registrar_movimientos, INGRESO
+
+VARIANTES = 200
+
+
+def crear_variantes(conn):
+    cursor = conn.cursor()
+    cursor.executemany('INSERT INTO variantes_base (codigo_interno, tipo_calzado) VALUES (?, ?)',
+                       [(f'PRD-{i:04d}', 'Botin') for i in range(VARIANTES)])
+    cursor.execute("INSERT INTO ubicaciones (nombre, tipo) VALUES ('Anterior', 'tienda')")
+    cursor.execute("INSERT INTO ubicaciones (nombre, tipo) VALUES ('Por lotes', 'tienda')")
+    conn.commit()
+    cursor.execute("SELECT id_ubicacion, nombre FROM ubicaciones WHERE nombre IN ('Anterior', 'Por lotes')")
+    return {fila['nombre']: fila['id_ubicacion'] for fila in cursor.fetchall()}
+
+
+def filas(lotes):
+    return [[f'PRD-{i % VARIANTES:04d}', 'Cuero', 'Negro', 'Goma', '', 'Latex', '35-40', 45.5, 89.9,
+             12 + i % 24, '2025-03-01', ''] for i in range(lotes)]
+
+
+def crear_excel(lotes):
+    from openpyxl import Workbook
+    libro = Workbook()
+    hoja = libro.active
+    hoja.append(COLUMNAS_PRODUCCION)
+    for fila in filas(lotes):
+        hoja.append(fila)
+    ruta = os.path.join(tempfile.mkdtemp(), 'produccion.xlsx')
+    libro.save(ruta)
+    return ruta
+
+
+def importar_anterior(conn, lotes, id_ubicacion):
+    """Lo que hacen crear_producto e ingresar_inventario, un lote por request"""
+    cursor = conn.cursor()
+    for fila in filas(lotes):
+        datos = dict(zip(COLUMNAS_PRODUCCION, fila))
+        cursor.execute('SELECT id_variante_base FROM variantes_base WHERE codigo_interno = ?',
+                       (datos['codigo_interno'],))
+        id_variante_base = cursor.fetchone()['id_variante_base']
+        cursor.execute('''
+            INSERT INTO productos_producidos
+            (id_variante_base, cuero, color_cuero, suela, forro, material_plantilla, serie_tallas,
+             pares_por_docena, costo_unitario, precio_sugerido, fecha_produccion,
+             cantidad_total_pares, cantidad_ingresada, observaciones)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 12, ?, ?, ?, ?, 0, ?)
+        ''', (id_variante_base, datos['cuero'], datos['color_cuero'], datos['suela'], datos['forro'],
+              datos['material_plantilla'], datos['serie_tallas'], datos['costo_unitario'], datos['precio_sugerido'],
+              datos['fecha_produccion'], datos['cantidad_total_pares'], datos['observaciones']))
+        id_producto = cursor.lastrowid
+        conn.commit()
+
+        pares = datos['cantidad_total_pares']
+        cursor.execute('SELECT cantidad_total_pares, cantidad_ingresada FROM productos_producidos WHERE id_producto = ?',
+                       (id_producto,))
+        cursor.fetchone()
+        sumar_inventario(cursor, [(id_producto, id_ubicacion, 'general', pares)])
+        cursor.execute('UPDATE productos_producidos SET cantidad_ingresada = cantidad_ingresada + ? '
+                       'WHERE id_producto = ?', (pares, id_producto))
+        registrar_movimientos(cursor, [(id_producto, id_ubicacion, 'general', pares, INGRESO, None)])
+        sumar_metricas_diarias(cursor, pares_ingresados=pares)
+        sumar_metrica_global(cursor, 'stock_total', pares)
+        conn.commit()
+    return lotes
+
+
+def importar_nuevo(conn, ruta, id_ubicacion):
+    with open(ruta, 'rb') as archivo:
+        return importar_produccion(conn, archivo, 'produccion.xlsx', id_ubicacion)['insertados']
+
+
+def totales(conn, id_ubicacion):
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT COUNT(*) AS lotes, SUM(p.cantidad_ingresada) AS ingresados,
+               (SELECT SUM(cantidad) FROM movimientos_inventario WHERE id_ubicacion = ?) AS movimientos
+        FROM inventario i JOIN productos_producidos p ON p.id_producto = i.id_producto
+        WHERE i.id_ubicacion = ? AND i.cantidad_pares = p.cantidad_total_pares
+    ''', (id_ubicacion, id_ubicacion))
+    return tuple(cursor.fetchone())
+
+
+def main():
+    lotes = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    aplicar_migraciones()
+    conn = get_db()
+    ubicaciones = crear_variantes(conn)
+    print(f"Motor: {'PostgreSQL' if is_postgres() else 'SQLite'}, {lotes} lotes con ingreso a una ubicacion\n")
+    print(f"{'metodo':>10} | {'segundos':>9} {'lotes/s':>9}")
+
+    resultados = {}
+    for nombre, importar in (('anterior', importar_anterior), ('por lotes', importar_nuevo)):
+        id_ubicacion = ubicaciones['Anterior' if importar is importar_anterior else 'Por lotes']
+        # El Excel se arma antes de medir; el metodo anterior recibe los datos ya leidos
+        entrada = lotes if importar is importar_anterior else crear_excel(lotes)
+        inicio = time.perf_counter()
+        insertados = importar(conn, entrada, id_ubicacion)
+        segundos = time.perf_counter() - inicio
+        print(f'{nombre:>10} | {segundos:>9.2f} {lotes / segundos:>9.0f}')
+        resultados[nombre] = (insertados,) + totales(conn, id_ubicacion)
+    conn.close()
+
+    if resultados['anterior'] != resultados['por lotes']:
+        print(f'\nERROR: los metodos no coinciden (lotes, lotes con stock, pares, movimientos): {resultados}')
+        sys.exit(1)
+    print('\nAmbos metodos dejaron los mismos lotes, stock y movimientos')
+
+
+if __name__ == '__main__':
+    main()
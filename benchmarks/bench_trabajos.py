@@ -0,0 +1,130 @@
+"""
+Benchmark: cuanto tiempo ocupa un request la carga masiva de variantes
+Compara cargar el Excel dentro del request (importacion.importar_variantes,
+como antes de trabajos.py) contra POST /api/variantes-base/carga-masiva, que
+solo guarda el archivo y responde 202; se mide tambien cuanto tarda el
+trabajo en terminar en segundo plano.
+
+Verifica ademas que con varios hilos tomando de la misma cola cada trabajo
+se ejecute exactamente una vez.
+
+Sin DATABASE_URL usa un archivo SQLite temporal. Con DATABASE_URL usa esa base
+de datos PostgreSQL: debe ser una base de datos VACIA de pruebas.
+
+Uso:
+    python benchmarks/bench_trabajos.py [filas]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+if not os.environ.get('DATABASE_URL'):
+    os.environ['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(), 'trabajos.db')
+os.environ['TRABAJOS_DIR'] = tempfile.mkdtemp()
+os.environ['TRABAJOS_ESPERA'] = '0.1'
+
+import app_v2  # aplica las migraciones sobre la BD de pruebas
+import trabajos
+from database import get_db, is_postgres
+from importacion import importar_variantes
+
+HILOS_COMPITIENDO = 4
+TRABAJOS_COMPITIENDO = 200
+
+ejecutados = Counter()
+_ejecutados_lock = threading.Lock()
+
+
+@trabajos.tipo('bench_contar')
+def _contar(parametros, archivo, al_avanzar):
+    with _ejecutados_lock:
+        ejecutados[parametros['n']] += 1
+    return {}, None
+
+
+def crear_excel(prefijo, filas):
+    from openpyxl import Workbook
+    # Modo normal: guarda la dimension de la hoja como Excel (write-only no la
+    # escribe y entonces openpyxl recorre toda la hoja solo para abrirla)
+    libro = Workbook()
+    hoja = libro.active
+    hoja.append(['codigo_interno', 'tipo_calzado', 'tipo_horma', 'segmento', 'descripcion'])
+    for i in range(filas):
+        hoja.append([f'{prefijo}-{i:06d}', 'Botin', 'Clasica', 'Dama', f'Botin de cuero modelo {i}'])
+    ruta = os.path.join(tempfile.mkdtemp(), f'{prefijo}.xlsx')
+    libro.save(ruta)
+    return ruta
+
+
+def medir_carga(filas):
+    """(segundos del request en linea, segundos del request 202, segundos hasta terminar el trabajo)"""
+    ruta = crear_excel('LIN', filas)
+    conn = get_db()
+    inicio = time.perf_counter()
+    with open(ruta, 'rb') as archivo:
+        importar_variantes(conn, archivo, ruta)
+    en_linea = time.perf_counter() - inicio
+    conn.close()
+
+    ruta = crear_excel('FON', filas)
+    cliente = app_v2.app.test_client()
+    inicio = time.perf_counter()
+    with open(ruta, 'rb') as archivo:
+        respuesta = cliente.post('/api/variantes-base/carga-masiva', data={'archivo': (archivo, 'variantes.xlsx')},
+                                 content_type='multipart/form-data')
+    encolado = time.perf_counter() - inicio
+    url = respuesta.get_json()['url']
+    while True:
+        trabajo = cliente.get(url).get_json()['trabajo']
+        if trabajo['estado'] not in (trabajos.PENDIENTE, trabajos.EN_PROCESO):
+            break
+        time.sleep(0.05)
+    terminado = time.perf_counter() - inicio
+    if trabajo['estado'] != trabajos.COMPLETADO or trabajo['resultado']['insertados'] != filas:
+        raise SystemExit(f'La carga en segundo plano fallo: {trabajo}')
+    return en_linea, encolado, terminado
+
+
+def competir():
+    """Encola TRABAJOS_COMPITIENDO trabajos con varios hilos tomando a la vez"""
+    detener = threading.Event()
+    hilos = [threading.Thread(target=trabajos.bucle, args=(detener,)) for _ in range(HILOS_COMPITIENDO)]
+    for hilo in hilos:
+        hilo.start()
+    for n in range(TRABAJOS_COMPITIENDO):
+        trabajos.encolar('bench_contar', {'n': n})
+    limite = time.monotonic() + 60
+    while sum(ejecutados.values()) < TRABAJOS_COMPITIENDO and time.monotonic() < limite:
+        time.sleep(0.05)
+    detener.set()
+    for hilo in hilos:
+        hilo.join()
+    repetidos = [n for n, veces in ejecutados.items() if veces > 1]
+    faltantes = TRABAJOS_COMPITIENDO - len(ejecutados)
+    return repetidos, faltantes
+
+
+def main():
+    filas = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print(f"Motor: {'PostgreSQL' if is_postgres() else 'SQLite'}, {filas} filas\n")
+
+    en_linea, encolado, terminado = medir_carga(filas)
+    print(f"{'request con la carga en linea':>32}: {en_linea:8.3f} s")
+    print(f"{'request 202 (en segundo plano)':>32}: {encolado:8.3f} s")
+    print(f"{'trabajo terminado':>32}: {terminado:8.3f} s")
+
+    repetidos, faltantes = competir()
+    print(f'\n{TRABAJOS_COMPITIENDO} trabajos, {HILOS_COMPITIENDO + app_v2.config.TRABAJOS_HILOS} hilos tomando: '
+          f'{len(repetidos)} repetidos, {faltantes} sin ejecutar')
+    if repetidos or faltantes:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Micro-benchmark: costo por sentencia de la traduccion SQLite -> PostgreSQL
+Compara la traduccion completa (reglas regex + placeholders) contra un acierto
+del cache LRU de traducir_sql(). Usa como muestra las sentencias SQL literales
+de app_v2.py, que son las que se ejecutan en produccion.
+
+Uso:
+    python benchmarks/bench_traduccion_sql.py [repeticiones]
+"""
+import ast
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from database import _convert_placeholders, _convert_sql, traducir_sql, estadisticas_traduccion
+
+
+def sentencias_de_la_app():
+    """Extrae los literales SQL de app_v2.py sin importar Flask"""
+    with open(os.path.join(BASE_DIR, 'app_v2.py'), encoding='utf-8') as f:
+        arbol = ast.parse(f.read())
+    palabras = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'BEGIN')
+    return [
+        nodo.value for nodo in ast.walk(arbol)
+        if isinstance(nodo, ast.Constant) and isinstance(nodo.value, str)
+        and any(p in nodo.value.upper() for p in palabras)
+    ]
+
+
+def medir(funcion, sentencias, repeticiones):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for sql in sentencias:
+            funcion(sql)
+    total = time.perf_counter() - inicio
+    return total / (repeticiones * len(sentencias)) * 1e6
+
+
+def main():
+    repeticiones = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    sentencias = sentencias_de_la_app()
+
+    def sin_cache(sql):
+        return _convert_placeholders(_convert_sql(sql))
+
+    # Precalentar el cache para medir solo aciertos
+    for sql in sentencias:
+        traducir_sql(sql)
+
+    us_sin_cache = medir(sin_cache, sentencias, repeticiones)
+    us_con_cache = medir(traducir_sql, sentencias, repeticiones)
+
+    print(f"Sentencias de muestra: {len(sentencias)} (x{repeticiones})")
+    print(f"Traduccion completa : {us_sin_cache:8.2f} us/sentencia")
+    print(f"Acierto de cache    : {us_con_cache:8.2f} us/sentencia")
+    print(f"Mejora              : {us_sin_cache / us_con_cache:8.1f}x")
+    print(f"Cache               : {estadisticas_traduccion()}")
+
+
+if __name__ == '__main__':
+    main()
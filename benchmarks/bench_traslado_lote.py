@@ -0,0 +1,107 @@
+"""
+Benchmark: traslado de muchos productos entre dos ubicaciones
+Compara N llamadas a /api/inventario/trasladar (una transaccion por producto)
+contra una sola llamada a /api/inventario/trasladar-lote con las N lineas.
+Despues de cada corrida se verifica que el stock total se conserve y que el
+historial de movimientos coincida con inventario.
+
+Sin DATABASE_URL usa un archivo SQLite temporal. Con DATABASE_URL usa esa base
+de datos PostgreSQL: debe ser una base de datos VACIA de pruebas.
+
+Uso:
+    python benchmarks/bench_traslado_lote.py [lineas]
+"""
+import os
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+if not os.environ.get('DATABASE_URL'):
+    os.environ['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(), 'traslado_lote.db')
+
+import app_v2  # aplica las migraciones sobre la BD de pruebas
+from database import get_db, is_postgres
+from movimientos import SALDO_INICIAL, registrar_movimientos, verificar_proyeccion
+
+STOCK = 1000
+PARES = 3
+
+
+def preparar_datos(n_productos):
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO ubicaciones (nombre, tipo) VALUES ('Tienda Bench', 'tienda')")
+    cursor.execute("INSERT INTO variantes_base (codigo_interno, tipo_calzado) VALUES ('LOTE-1', 'Botin')")
+    cursor.executemany('INSERT INTO productos_producidos (id_variante_base, cuero, color_cuero, serie_tallas, '
+                       'cantidad_total_pares) VALUES (1, ?, ?, ?, ?)',
+                       [('Cuero', 'Negro', '35-40', STOCK) for _ in range(n_productos)])
+    cursor.executemany('INSERT INTO inventario (id_producto, id_ubicacion, tipo_stock, cantidad_pares) '
+                       "VALUES (?, 1, 'general', ?)", [(i, STOCK) for i in range(1, n_productos + 1)])
+    registrar_movimientos(cursor, [(i, 1, 'general', STOCK, SALDO_INICIAL, 'bench')
+                                   for i in range(1, n_productos + 1)])
+    conn.commit()
+    conn.close()
+
+
+def total_y_diferencias():
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute('SELECT COALESCE(SUM(cantidad_pares), 0) as pares FROM inventario')
+    total = cursor.fetchone()['pares']
+    diferencias = verificar_proyeccion(cursor)
+    conn.close()
+    return total, diferencias
+
+
+def por_producto(cliente, n_productos, origen, destino):
+    for i in range(1, n_productos + 1):
+        respuesta = cliente.post('/api/inventario/trasladar', json={
+            'id_producto': i, 'id_ubicacion_origen': origen, 'id_ubicacion_destino': destino,
+            'cantidad_pares': PARES
+        })
+        assert respuesta.status_code == 200, respuesta.get_json()
+
+
+def en_lote(cliente, n_productos, origen, destino):
+    respuesta = cliente.post('/api/inventario/trasladar-lote', json={
+        'id_ubicacion_origen': origen, 'id_ubicacion_destino': destino,
+        'lineas': [{'id_producto': i, 'cantidad_pares': PARES} for i in range(1, n_productos + 1)]
+    })
+    datos = respuesta.get_json()
+    assert respuesta.status_code == 200 and all(r['trasladado'] for r in datos['resultados']), datos
+
+
+def main():
+    n_productos = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    preparar_datos(n_productos)
+    cliente = app_v2.app.test_client()
+
+    motor = 'PostgreSQL' if is_postgres() else 'SQLite'
+    print(f'Motor: {motor}, {n_productos} productos de {PARES} pares\n')
+
+    errores = []
+    # Ida con un camino y vuelta con el mismo, asi ambos parten del mismo estado
+    for nombre, funcion in (('una llamada por producto', por_producto), ('trasladar-lote', en_lote)):
+        tiempos = []
+        for origen, destino in ((1, 2), (2, 1)):
+            inicio = time.perf_counter()
+            funcion(cliente, n_productos, origen, destino)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        total, diferencias = total_y_diferencias()
+        print(f'{nombre:<26} ida {tiempos[0]:8.1f} ms   vuelta {tiempos[1]:8.1f} ms')
+        if total != STOCK * n_productos:
+            errores.append(f'{nombre}: stock total {total}, esperado {STOCK * n_productos}')
+        if diferencias:
+            errores.append(f'{nombre}: {len(diferencias)} diferencia(s) entre inventario y movimientos_inventario')
+
+    if errores:
+        print('\nERRORES:\n- ' + '\n- '.join(errores))
+        sys.exit(1)
+    print('\nStock conservado: inventario y movimientos coinciden')
+
+
+if __name__ == '__main__':
+    main()
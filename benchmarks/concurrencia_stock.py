@@ -0,0 +1,164 @@
+"""
+Prueba de concurrencia: muchas ventas directas simultaneas sobre un solo SKU
+Varios hilos venden a la vez del mismo inventario (stock inicial STOCK) a
+traves de /api/ventas/registrar-directa. Al final se verifica que:
+- el stock nunca quede negativo ni se venda mas de lo que habia
+- pares vendidos (ventas_detalle) == stock inicial - stock final
+- el historial de movimientos coincida con inventario
+
+Con --anterior corre ademas el patron previo (SELECT, comparar en Python y
+UPDATE sin condicion) desde los mismos hilos, para ver la sobreventa que
+evita el UPDATE condicionado. En PostgreSQL BEGIN IMMEDIATE se traduce a
+BEGIN y no serializa nada, asi que ese patron puede vender de mas.
+
+Sin DATABASE_URL usa un archivo SQLite temporal. Con DATABASE_URL usa esa base
+de datos PostgreSQL: debe ser una base de datos VACIA de pruebas.
+
+Uso:
+    python benchmarks/concurrencia_stock.py [hilos] [ventas_por_hilo] [--anterior]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+if not os.environ.get('DATABASE_URL'):
+    os.environ['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(), 'concurrencia.db')
+
+import app_v2  # aplica las migraciones sobre la BD de pruebas
+from database import get_db, is_postgres, liberar_conexiones
+from movimientos import SALDO_INICIAL, registrar_movimientos, verificar_proyeccion
+
+STOCK = 100
+PARES_POR_VENTA = 3
+
+
+def preparar_datos():
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO variantes_base (codigo_interno, tipo_calzado) VALUES ('CONC-1', 'Botin')")
+    # Producto 1 para la API y producto 2 para el patron anterior, cada uno con su inventario
+    for id_producto in (1, 2):
+        cursor.execute('INSERT INTO productos_producidos (id_producto, id_variante_base, cuero, color_cuero, '
+                       "serie_tallas, cantidad_total_pares) VALUES (?, 1, 'Cuero', 'Negro', '35-40', ?)",
+                       (id_producto, STOCK))
+        cursor.execute('INSERT INTO inventario (id_inventario, id_producto, id_ubicacion, tipo_stock, cantidad_pares) '
+                       "VALUES (?, ?, 1, 'general', ?)", (id_producto, id_producto, STOCK))
+    registrar_movimientos(cursor, [(id_producto, 1, 'general', STOCK, SALDO_INICIAL, 'concurrencia')
+                                   for id_producto in (1, 2)])
+    if is_postgres():
+        cursor.execute("SELECT setval(pg_get_serial_sequence('productos_producidos', 'id_producto'), 2)")
+        cursor.execute("SELECT setval(pg_get_serial_sequence('inventario', 'id_inventario'), 2)")
+    conn.commit()
+    conn.close()
+
+
+def venta_api(cliente, id_inventario):
+    respuesta = cliente.post('/api/ventas/registrar-directa', json={
+        'cliente': 'Concurrencia',
+        'productos': [{'id_inventario': id_inventario, 'id_producto': id_inventario,
+                       'cantidad_pares': PARES_POR_VENTA, 'precio_unitario': 20}]
+    })
+    return respuesta.status_code == 200
+
+
+def venta_anterior(id_inventario):
+    """Patron previo: leer, comparar en Python y descontar sin condicion"""
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('SELECT cantidad_pares FROM inventario WHERE id_inventario = ?', (id_inventario,))
+        if cursor.fetchone()['cantidad_pares'] < PARES_POR_VENTA:
+            conn.rollback()
+            return False
+        cursor.execute('UPDATE inventario SET cantidad_pares = cantidad_pares - ? WHERE id_inventario = ?',
+                       (PARES_POR_VENTA, id_inventario))
+        conn.commit()
+        return True
+    except Exception:
+        conn.rollback()
+        return False
+    finally:
+        conn.close()
+        liberar_conexiones()
+
+
+def correr(nombre, funcion, hilos, por_hilo):
+    barrera = threading.Barrier(hilos)
+    exitos = [0] * hilos
+
+    def trabajador(numero):
+        barrera.wait()
+        for _ in range(por_hilo):
+            if funcion():
+                exitos[numero] += 1
+
+    inicio = time.perf_counter()
+    trabajadores = [threading.Thread(target=trabajador, args=(i,)) for i in range(hilos)]
+    for t in trabajadores:
+        t.start()
+    for t in trabajadores:
+        t.join()
+    segundos = time.perf_counter() - inicio
+    return nombre, sum(exitos), segundos
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    hilos = int(args[0]) if args else 16
+    por_hilo = int(args[1]) if len(args) > 1 else 5
+    preparar_datos()
+
+    motor = 'PostgreSQL' if is_postgres() else 'SQLite'
+    intentos = hilos * por_hilo
+    print(f'Motor: {motor}, {hilos} hilos x {por_hilo} ventas de {PARES_POR_VENTA} pares, '
+          f'stock inicial {STOCK} (alcanza para {STOCK // PARES_POR_VENTA} ventas)\n')
+
+    def venta_con_cliente():
+        cliente = clientes.setdefault(threading.get_ident(), app_v2.app.test_client())
+        return venta_api(cliente, 1)
+
+    clientes = {}
+    resultados = [correr('UPDATE condicionado (API)', venta_con_cliente, hilos, por_hilo)]
+    if '--anterior' in sys.argv:
+        resultados.append(correr('SELECT + UPDATE (anterior)', lambda: venta_anterior(2), hilos, por_hilo))
+
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute('SELECT id_inventario, cantidad_pares FROM inventario ORDER BY id_inventario')
+    stock_final = {fila['id_inventario']: fila['cantidad_pares'] for fila in cursor.fetchall()}
+    cursor.execute('SELECT COALESCE(SUM(cantidad_pares), 0) as pares FROM ventas_detalle')
+    pares_registrados = cursor.fetchone()['pares']
+    # El patron anterior no escribe el historial: solo se audita el producto 1
+    diferencias = [fila for fila in verificar_proyeccion(cursor) if fila['id_producto'] == 1]
+    conn.close()
+
+    errores = []
+    for (nombre, exitos, segundos), id_inventario in zip(resultados, (1, 2)):
+        vendidos = exitos * PARES_POR_VENTA
+        sobreventa = max(0, vendidos - STOCK)
+        print(f'{nombre:<28} {exitos:>3}/{intentos} ventas, {vendidos:>3} pares, stock final '
+              f'{stock_final[id_inventario]:>4}, sobreventa {sobreventa:>3} pares, {segundos:6.2f} s')
+        if stock_final[id_inventario] != STOCK - vendidos:
+            errores.append(f'{nombre}: stock final no cuadra con las ventas')
+        if id_inventario == 1 and (sobreventa or stock_final[1] < 0):
+            errores.append(f'{nombre}: se vendio mas que el stock')
+
+    if pares_registrados != STOCK - stock_final[1]:
+        errores.append(f'ventas_detalle registra {pares_registrados} pares y se descontaron {STOCK - stock_final[1]}')
+    if diferencias:
+        errores.append(f'{len(diferencias)} diferencia(s) entre inventario y movimientos_inventario')
+
+    if errores:
+        print('\nERRORES:\n- ' + '\n- '.join(errores))
+        sys.exit(1)
+    print('\nSin sobreventa: stock, ventas y movimientos coinciden')
+
+
+if __name__ == '__main__':
+    main()
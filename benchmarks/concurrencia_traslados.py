@@ -0,0 +1,133 @@
+"""
+Prueba de concurrencia: traslados optimistas entre dos ubicaciones
+Varios hilos trasladan el mismo producto de ida y vuelta entre dos
+ubicaciones por /api/inventario/trasladar, mientras otros hilos venden de
+la ubicacion origen por /api/ventas/registrar-directa. Al final se verifica
+que:
+- ninguna fila de inventario quede negativa
+- stock final total == stock inicial - pares vendidos (no se crean ni
+  pierden pares en los traslados)
+- el historial de movimientos coincida con inventario
+y se muestran las estadisticas de conflictos (estadisticas_traslados).
+
+Sin DATABASE_URL usa un archivo SQLite temporal. Con DATABASE_URL usa esa base
+de datos PostgreSQL: debe ser una base de datos VACIA de pruebas.
+
+Uso:
+    python benchmarks/concurrencia_traslados.py [hilos] [operaciones_por_hilo]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+if not os.environ.get('DATABASE_URL'):
+    os.environ['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(), 'traslados.db')
+
+import app_v2  # aplica las migraciones sobre la BD de pruebas
+from database import get_db, is_postgres
+from movimientos import SALDO_INICIAL, estadisticas_traslados, registrar_movimientos, verificar_proyeccion
+
+STOCK = 200
+PARES_POR_TRASLADO = 2
+PARES_POR_VENTA = 1
+
+
+def preparar_datos():
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO ubicaciones (nombre, tipo) VALUES ('Tienda Concurrencia', 'tienda')")
+    cursor.execute("INSERT INTO variantes_base (codigo_interno, tipo_calzado) VALUES ('TRAS-1', 'Botin')")
+    cursor.execute('INSERT INTO productos_producidos (id_variante_base, cuero, color_cuero, serie_tallas, '
+                   "cantidad_total_pares) VALUES (1, 'Cuero', 'Negro', '35-40', ?)", (STOCK * 2,))
+    cursor.executemany('INSERT INTO inventario (id_producto, id_ubicacion, tipo_stock, cantidad_pares) '
+                       "VALUES (1, ?, 'general', ?)", [(1, STOCK), (2, STOCK)])
+    registrar_movimientos(cursor, [(1, ubicacion, 'general', STOCK, SALDO_INICIAL, 'concurrencia')
+                                   for ubicacion in (1, 2)])
+    cursor.execute('SELECT id_inventario FROM inventario WHERE id_ubicacion = 1')
+    id_inventario_origen = cursor.fetchone()['id_inventario']
+    conn.commit()
+    conn.close()
+    return id_inventario_origen
+
+
+def main():
+    hilos = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    por_hilo = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    id_inventario_origen = preparar_datos()
+
+    barrera = threading.Barrier(hilos)
+    resultados = {'traslados': 0, 'sin_stock': 0, 'conflictos': 0, 'ventas': 0, 'ventas_sin_stock': 0, 'errores': 0}
+    resultados_lock = threading.Lock()
+
+    def contar(clave):
+        with resultados_lock:
+            resultados[clave] += 1
+
+    def trabajador(numero):
+        cliente = app_v2.app.test_client()
+        barrera.wait()
+        for i in range(por_hilo):
+            if numero % 3 == 2:
+                # Un tercio de los hilos vende de la ubicacion 1
+                respuesta = cliente.post('/api/ventas/registrar-directa', json={
+                    'cliente': 'Concurrencia',
+                    'productos': [{'id_inventario': id_inventario_origen, 'id_producto': 1,
+                                   'cantidad_pares': PARES_POR_VENTA, 'precio_unitario': 20}]
+                })
+                contar('ventas' if respuesta.status_code == 200 else 'ventas_sin_stock')
+                continue
+
+            origen, destino = (1, 2) if (numero + i) % 2 == 0 else (2, 1)
+            respuesta = cliente.post('/api/inventario/trasladar', json={
+                'id_producto': 1, 'id_ubicacion_origen': origen, 'id_ubicacion_destino': destino,
+                'cantidad_pares': PARES_POR_TRASLADO
+            })
+            contar({200: 'traslados', 400: 'sin_stock', 409: 'conflictos'}.get(respuesta.status_code, 'errores'))
+
+    inicio = time.perf_counter()
+    trabajadores = [threading.Thread(target=trabajador, args=(i,)) for i in range(hilos)]
+    for t in trabajadores:
+        t.start()
+    for t in trabajadores:
+        t.join()
+    segundos = time.perf_counter() - inicio
+
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute('SELECT id_ubicacion, cantidad_pares, version FROM inventario ORDER BY id_ubicacion')
+    filas = cursor.fetchall()
+    diferencias = verificar_proyeccion(cursor)
+    conn.close()
+
+    motor = 'PostgreSQL' if is_postgres() else 'SQLite'
+    print(f'Motor: {motor}, {hilos} hilos x {por_hilo} operaciones en {segundos:.2f} s')
+    print(f'Resultados HTTP : {resultados}')
+    print('Inventario final: ' + ', '.join(f"ubicacion {f['id_ubicacion']}: {f['cantidad_pares']} pares "
+                                             f"(version {f['version']})" for f in filas))
+    print(f'Traslados       : {estadisticas_traslados()}')
+
+    errores = []
+    total = sum(fila['cantidad_pares'] for fila in filas)
+    esperado = 2 * STOCK - resultados['ventas'] * PARES_POR_VENTA
+    if total != esperado:
+        errores.append(f'stock total {total}, esperado {esperado}')
+    if any(fila['cantidad_pares'] < 0 for fila in filas):
+        errores.append('stock negativo')
+    if resultados['errores']:
+        errores.append(f"{resultados['errores']} respuesta(s) inesperadas")
+    if diferencias:
+        errores.append(f'{len(diferencias)} diferencia(s) entre inventario y movimientos_inventario')
+
+    if errores:
+        print('\nERRORES:\n- ' + '\n- '.join(errores))
+        sys.exit(1)
+    print('\nSin pares perdidos ni negativos: inventario y movimientos coinciden')
+
+
+if __name__ == '__main__':
+    main()
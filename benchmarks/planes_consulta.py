@@ -0,0 +1,123 @@
+"""
+Reporte de planes de consulta antes/despues de las migraciones de indices
+Crea las tablas en una base de datos vacia, carga datos sinteticos, muestra el
+plan de las consultas calientes, aplica las migraciones y lo muestra de nuevo.
+
+Sin DATABASE_URL usa un archivo SQLite temporal. Con DATABASE_URL usa esa base
+de datos PostgreSQL: debe ser una base de datos VACIA de pruebas.
+
+Uso:
+    python benchmarks/planes_consulta.py [escala]
+
+Reportes generados: benchmarks/planes_consulta_sqlite.md y planes_consulta_postgres.md
+"""
+import os
+import random
+import sys
+import tempfile
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import database
+from database import get_db, is_postgres, aplicar_migraciones
+
+CONSULTAS = [
+    ('Inventario por producto/ubicacion/tipo (ingresar, trasladar)',
+     'SELECT id_inventario, cantidad_pares FROM inventario '
+     'WHERE id_producto = ? AND id_ubicacion = ? AND tipo_stock = ?', (150, 2, 'general')),
+    ('Inventario disponible por ubicacion (venta directa)',
+     'SELECT id_producto, cantidad_pares FROM inventario WHERE id_ubicacion = ? AND cantidad_pares > 0', (3,)),
+    ('Detalle de una venta',
+     'SELECT * FROM ventas_detalle WHERE id_venta = ?', (1234,)),
+    ('Cuentas por cobrar de un cliente',
+     'SELECT * FROM cuentas_por_cobrar WHERE id_cliente = ? ORDER BY fecha_emision DESC', (42,)),
+    ('Cuenta asociada a una venta',
+     'SELECT * FROM cuentas_por_cobrar WHERE id_venta = ?', (1234,)),
+    ('Pagos de una cuenta',
+     'SELECT * FROM pagos WHERE id_cuenta = ? ORDER BY fecha_pago DESC', (77,)),
+    ('Ultimo correlativo del dia (codigo_venta LIKE)',
+     'SELECT COALESCE(MAX(CAST(SUBSTR(codigo_venta, 11) AS INTEGER)), 0) as ultimo '
+     'FROM ventas_v2 WHERE codigo_venta LIKE ?', ('V20250115-%',)),
+    ('Preparaciones pendientes',
+     "SELECT * FROM preparaciones WHERE estado = 'pendiente'", ()),
+]
+
+
+def cargar_datos(cursor, escala):
+    random.seed(7)
+    n_variantes, n_productos, n_ubicaciones = 50 * escala, 400 * escala, 6
+    n_clientes, n_ventas = 100 * escala, 4000 * escala
+
+    cursor.executemany('INSERT INTO variantes_base (codigo_interno, tipo_calzado) VALUES (?, ?)',
+                       [(f'MOD-{i:05d}', 'Botin') for i in range(n_variantes)])
+    cursor.executemany('INSERT INTO productos_producidos (id_variante_base, cuero, cantidad_total_pares) VALUES (?, ?, ?)',
+                       [(random.randint(1, n_variantes), 'Cuero', 120) for _ in range(n_productos)])
+    cursor.executemany('INSERT INTO ubicaciones (nombre) VALUES (?)', [(f'Ubicacion {i}',) for i in range(n_ubicaciones)])
+    cursor.executemany('INSERT INTO inventario (id_producto, id_ubicacion, tipo_stock, cantidad_pares) VALUES (?, ?, ?, ?)',
+                       [(p, u, t, random.randint(0, 60))
+                        for p in range(1, n_productos + 1) for u in range(1, n_ubicaciones + 1)
+                        for t in ('general', 'pedido') if random.random() < 0.4])
+    cursor.executemany('INSERT INTO clientes (nombre) VALUES (?)', [(f'Cliente {i}',) for i in range(n_clientes)])
+    cursor.executemany('INSERT INTO ventas_v2 (codigo_venta, id_cliente, fecha_venta, total_final) VALUES (?, ?, ?, ?)',
+                       [(f'V2025{1 + i % 12:02d}{1 + i % 28:02d}-{i:05d}', random.randint(1, n_clientes),
+                         f'2025-{1 + i % 12:02d}-{1 + i % 28:02d}', 100) for i in range(n_ventas)])
+    cursor.executemany('INSERT INTO ventas_detalle (id_venta, id_producto, cantidad_pares, precio_unitario) VALUES (?, ?, ?, ?)',
+                       [(v, random.randint(1, n_productos), 12, 20) for v in range(1, n_ventas + 1) for _ in range(3)])
+    cursor.executemany('INSERT INTO cuentas_por_cobrar (codigo_cuenta, id_cliente, id_venta, monto_total, saldo_pendiente) '
+                       'VALUES (?, ?, ?, ?, ?)',
+                       [(f'CC-{i:06d}', random.randint(1, n_clientes), i * 3, 100, 50) for i in range(1, n_ventas // 3)])
+    cursor.executemany('INSERT INTO pagos (codigo_pago, id_cuenta, monto_pago) VALUES (?, ?, ?)',
+                       [(f'PAG-{i:06d}', random.randint(1, n_ventas // 3 - 1), 10) for i in range(1, n_ventas // 2)])
+    cursor.executemany('INSERT INTO preparaciones (estado) VALUES (?)',
+                       [('completada' if i % 20 else 'pendiente',) for i in range(n_ventas // 10)])
+
+
+def planes(cursor):
+    resultado = {}
+    for titulo, sql, params in CONSULTAS:
+        if is_postgres():
+            cursor.execute('EXPLAIN ' + sql, params)
+            resultado[titulo] = [row[0] for row in cursor.fetchall()]
+        else:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            resultado[titulo] = [row['detail'] for row in cursor.fetchall()]
+    return resultado
+
+
+def main():
+    escala = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    if not is_postgres():
+        database.config.SQLITE_PATH = os.path.join(tempfile.mkdtemp(), 'planes.db')
+        database.init_sqlite()
+    else:
+        database.init_postgres()
+
+    conn = get_db()
+    cursor = conn.cursor()
+    cargar_datos(cursor, escala)
+    conn.commit()
+    cursor.execute('ANALYZE')
+    conn.commit()
+    antes = planes(cursor)
+    conn.close()
+
+    aplicar_migraciones()
+
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute('ANALYZE')
+    conn.commit()
+    despues = planes(cursor)
+    conn.close()
+
+    motor = 'PostgreSQL' if is_postgres() else 'SQLite'
+    print(f'# Planes de consulta ({motor}, escala {escala})\n')
+    for titulo, sql, _ in CONSULTAS:
+        print(f'## {titulo}\n\n```sql\n{sql}\n```\n')
+        print('Antes:\n```\n' + '\n'.join(antes[titulo]) + '\n```\n')
+        print('Despues:\n```\n' + '\n'.join(despues[titulo]) + '\n```\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+"""
+Cache de paginas con TTL e invalidacion por escrituras
+Las vistas de lectura se guardan por ruta y parametros; las APIs de escritura
+invalidan las tablas que modifican.
+
+Invalidacion por generaciones: cada tabla tiene un contador de generacion que
+forma parte de la clave de las paginas que dependen de ella. Una escritura
+incrementa el contador y las entradas viejas quedan inalcanzables (salen por
+TTL o por el limite de tamano), sin tener que buscarlas para borrarlas.
+
+Backends:
+- CacheMemoria: en el proceso (por worker de gunicorn). Es el backend por
+  defecto y el reemplazo local del compartido.
+- CacheRedis: compartido entre workers si CACHE_REDIS_URL esta configurada y
+  el paquete redis esta instalado. Con varios workers y CacheMemoria, una
+  escritura solo invalida el cache de su propio worker; el TTL limita cuanto
+  tiempo pueden ver datos viejos los demas.
+"""
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+from flask import make_response, request, session
+
+from config import get_config
+
+# Obtener configuracion
+config = get_config()
+
+# redis solo se importa si hay un backend compartido configurado (opcional)
+REDIS_AVAILABLE = False
+if config.CACHE_REDIS_URL:
+    try:
+        import redis
+        REDIS_AVAILABLE = True
+    except ImportError:
+        pass
+
+
+class CacheMemoria:
+    """LRU acotado por cantidad de entradas, con TTL por entrada"""
+
+    def __init__(self, maximo):
+        self.maximo = maximo
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()  # clave -> (valor, expira)
+        self._generaciones = {}
+        self._stats = {'aciertos': 0, 'fallos': 0, 'expiradas': 0, 'desalojadas': 0}
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self._stats['fallos'] += 1
+                return None
+            valor, expira = entrada
+            if expira <= time.monotonic():
+                del self._entradas[clave]
+                self._stats['expiradas'] += 1
+                self._stats['fallos'] += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self._stats['aciertos'] += 1
+            return valor
+
+    def guardar(self, clave, valor, ttl):
+        with self._lock:
+            self._entradas[clave] = (valor, time.monotonic() + ttl)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.maximo:
+                self._entradas.popitem(last=False)
+                self._stats['desalojadas'] += 1
+
+    def generaciones(self, tablas):
+        with self._lock:
+            return [self._generaciones.get(tabla, 0) for tabla in tablas]
+
+    def invalidar(self, tablas):
+        with self._lock:
+            for tabla in tablas:
+                self._generaciones[tabla] = self._generaciones.get(tabla, 0) + 1
+
+    def estadisticas(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entradas'] = len(self._entradas)
+        stats['maximo'] = self.maximo
+        return stats
+
+
+class CacheRedis:
+    """Cache compartido entre workers: las entradas expiran con SETEX y el
+    desalojo por tamano lo hace Redis (maxmemory-policy allkeys-lru)"""
+
+    PREFIJO = 'calzado:cache:'
+
+    def __init__(self, url):
+        self.cliente = redis.Redis.from_url(url)
+        self._lock = threading.Lock()
+        self._stats = {'aciertos': 0, 'fallos': 0}
+
+    def _contar(self, campo):
+        with self._lock:
+            self._stats[campo] += 1
+
+    def obtener(self, clave):
+        valor = self.cliente.get(self.PREFIJO + clave)
+        if valor is None:
+            self._contar('fallos')
+            return None
+        self._contar('aciertos')
+        return valor.decode('utf-8')
+
+    def guardar(self, clave, valor, ttl):
+        self.cliente.setex(self.PREFIJO + clave, int(ttl), valor.encode('utf-8'))
+
+    def generaciones(self, tablas):
+        if not tablas:
+            return []
+        valores = self.cliente.mget([self.PREFIJO + 'gen:' + tabla for tabla in tablas])
+        return [int(valor or 0) for valor in valores]
+
+    def invalidar(self, tablas):
+        pipe = self.cliente.pipeline(transaction=False)
+        for tabla in tablas:
+            pipe.incr(self.PREFIJO + 'gen:' + tabla)
+        pipe.execute()
+
+    def estadisticas(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['backend_compartido'] = True
+        return stats
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_cache():
+    """Backend de cache del proceso (Redis si esta configurado, si no memoria)"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if config.CACHE_REDIS_URL and REDIS_AVAILABLE:
+                _backend = CacheRedis(config.CACHE_REDIS_URL)
+            else:
+                _backend = CacheMemoria(config.CACHE_MAX_ENTRADAS)
+        return _backend
+
+
+def set_cache(backend):
+    """Reemplaza el backend (por ejemplo, CacheMemoria en lugar de Redis)"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+def cachear_vista(*tablas, ttl=None):
+    """
+    Decorador para vistas GET que devuelven HTML renderizado.
+    La clave incluye la ruta con sus parametros y la generacion de cada tabla
+    de la que depende la pagina. Si hay mensajes flash pendientes la pagina
+    se renderiza sin cache (se muestran una sola vez).
+    """
+    def decorador(vista):
+        @functools.wraps(vista)
+        def envoltura(*args, **kwargs):
+            # Con mensajes flash pendientes se renderiza para mostrarlos
+            if not config.CACHE_HABILITADO or request.method != 'GET' or session.get('_flashes'):
+                return vista(*args, **kwargs)
+
+            cache = get_cache()
+            try:
+                generaciones = cache.generaciones(tablas)
+                clave = f"vista:{request.endpoint}:{request.full_path}:" + ','.join(map(str, generaciones))
+                pagina = cache.obtener(clave)
+            except Exception:
+                # Un backend compartido caido no debe tumbar la pagina
+                return vista(*args, **kwargs)
+
+            if pagina is not None:
+                respuesta = make_response(pagina)
+                respuesta.headers['X-Cache'] = 'HIT'
+                return respuesta
+
+            resultado = vista(*args, **kwargs)
+            respuesta = make_response(resultado)
+            if isinstance(resultado, str):
+                try:
+                    cache.guardar(clave, resultado, ttl or config.CACHE_TTL)
+                except Exception:
+                    pass
+                respuesta.headers['X-Cache'] = 'MISS'
+            return respuesta
+        return envoltura
+    return decorador
+
+
+def invalida(*tablas):
+    """
+    Decorador para APIs de escritura: tras una respuesta exitosa (ya con el
+    commit hecho) invalida las paginas que dependen de `tablas`.
+    """
+    def decorador(vista):
+        @functools.wraps(vista)
+        def envoltura(*args, **kwargs):
+            respuesta = make_response(vista(*args, **kwargs))
+            if respuesta.status_code < 400:
+                invalidar(*tablas)
+            return respuesta
+        return envoltura
+    return decorador
+
+
+def invalidar(*tablas):
+    """Invalida las paginas que dependen de `tablas` (para llamar a mano)"""
+    try:
+        get_cache().invalidar(tablas)
+    except Exception:
+        # Sin backend no hay que invalidar; las entradas vencen por TTL
+        pass
+
+
+def estadisticas_cache():
+    """Aciertos, fallos y tasa de aciertos del backend actual"""
+    stats = get_cache().estadisticas()
+    consultas = stats['aciertos'] + stats['fallos']
+    stats['tasa_aciertos'] = round(stats['aciertos'] / consultas, 4) if consultas else 0.0
+    return stats
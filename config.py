@@ -3,6 +3,7 @@ Configuracion para diferentes entornos
 Soporta SQLite (desarrollo) y PostgreSQL (produccion/Render)
 """
 import os
+import tempfile
 
 # Directorio base del proyecto
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -18,9 +19,67 @@ class Config:
     DATABASE_URL = os.environ.get('DATABASE_URL')
 
     # Ruta a SQLite (solo para desarrollo local)
-    SQLITE_PATH = os.path.join(BASE_DIR, 'calzado.db')
+    SQLITE_PATH = os.environ.get('SQLITE_PATH') or os.path.join(BASE_DIR, 'calzado.db')
     SQLITE_TIMEOUT = 30.0
 
+    # Pool de conexiones PostgreSQL (uno por worker de gunicorn)
+    DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', 1))
+    DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', 5))
+    # Segundos maximos de vida de una conexion antes de reciclarla
+    DB_POOL_MAX_LIFETIME = float(os.environ.get('DB_POOL_MAX_LIFETIME', 1800))
+    # Conexiones inactivas por mas de estos segundos se verifican con SELECT 1
+    DB_POOL_HEALTHCHECK_IDLE = float(os.environ.get('DB_POOL_HEALTHCHECK_IDLE', 30))
+    # Segundos a esperar por una conexion libre cuando el pool esta lleno
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+
+    # Sentencias por viaje cuando executemany() agrupa filas en PostgreSQL
+    DB_BATCH_PAGE_SIZE = int(os.environ.get('DB_BATCH_PAGE_SIZE', 100))
+
+    # Aplicar migraciones pendientes al arrancar si el esquema esta atrasado
+    # (en produccion se puede desactivar y correr `python migrar.py` en el deploy)
+    MIGRAR_AL_INICIAR = os.environ.get('MIGRAR_AL_INICIAR', '1') == '1'
+
+    # Cache de paginas de lectura (dashboard, listados); ver cache.py
+    CACHE_HABILITADO = os.environ.get('CACHE_HABILITADO', '1') == '1'
+    # Segundos que vive una pagina en cache si ninguna escritura la invalida
+    CACHE_TTL = float(os.environ.get('CACHE_TTL', 60))
+    # Paginas guardadas por worker antes de desalojar las menos usadas
+    CACHE_MAX_ENTRADAS = int(os.environ.get('CACHE_MAX_ENTRADAS', 256))
+    # Backend compartido entre workers (opcional, requiere el paquete redis)
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+
+    # Traslados con concurrencia optimista (columna inventario.version):
+    # reintentos si otra operacion modifico el inventario origen entre la
+    # lectura y la escritura, y espera base en milisegundos entre reintentos
+    # (se duplica en cada intento, con variacion aleatoria)
+    TRASLADO_REINTENTOS = int(os.environ.get('TRASLADO_REINTENTOS', 8))
+    TRASLADO_ESPERA_MS = float(os.environ.get('TRASLADO_ESPERA_MS', 5))
+
+    # Filas por pagina de los listados (ventas, produccion, inventario, ...);
+    # ?limite= puede pedir menos o mas, hasta LISTADO_PAGINA_MAXIMA
+    LISTADO_PAGINA = int(os.environ.get('LISTADO_PAGINA', 50))
+    LISTADO_PAGINA_MAXIMA = int(os.environ.get('LISTADO_PAGINA_MAXIMA', 200))
+
+    # Filas que la exportacion de ventas lee de la BD por vez (memoria constante)
+    EXPORTACION_LOTE = int(os.environ.get('EXPORTACION_LOTE', 1000))
+
+    # Filas de Excel que la carga masiva valida e inserta por sentencia
+    IMPORTACION_LOTE = int(os.environ.get('IMPORTACION_LOTE', 500))
+
+    # Trabajos en segundo plano (cargas masivas, exportaciones); ver trabajos.py.
+    # Hilos por worker de gunicorn que los ejecutan (0 = solo `python trabajos.py`),
+    # segundos entre consultas a la cola, segundos sin avance para dar un trabajo
+    # por abandonado, horas que se guardan los terminados (con sus archivos) y
+    # carpeta de los archivos subidos y exportados
+    TRABAJOS_HILOS = int(os.environ.get('TRABAJOS_HILOS', 1))
+    TRABAJOS_ESPERA = float(os.environ.get('TRABAJOS_ESPERA', 2))
+    TRABAJOS_ABANDONO = float(os.environ.get('TRABAJOS_ABANDONO', 600))
+    TRABAJOS_RETENCION_HORAS = float(os.environ.get('TRABAJOS_RETENCION_HORAS', 24))
+    TRABAJOS_DIR = os.environ.get('TRABAJOS_DIR') or os.path.join(tempfile.gettempdir(), 'calzado_trabajos')
+
+    # Sentencias SQLite->PostgreSQL traducidas que se memorizan por worker
+    SQL_TRANSLATION_CACHE_SIZE = int(os.environ.get('SQL_TRANSLATION_CACHE_SIZE', 512))
+
     @property
     def USE_POSTGRES(self):
         """Determina si usar PostgreSQL o SQLite"""
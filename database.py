@@ -2,23 +2,190 @@
 Modulo de base de datos con soporte dual: SQLite (desarrollo) y PostgreSQL (produccion)
 Incluye wrapper para compatibilidad de consultas SQL
 """
+import functools
 import os
 import sqlite3
 import re
-
-# Intentar importar psycopg2 para PostgreSQL
-try:
-    import psycopg2
-    from psycopg2.extras import RealDictCursor
-    POSTGRES_AVAILABLE = True
-except ImportError:
-    POSTGRES_AVAILABLE = False
+import threading
+import time
 
 from config import get_config
 
 # Obtener configuracion
 config = get_config()
 
+# psycopg2 solo se importa si hay DATABASE_URL: con SQLite ningun proceso lo usa
+# y cargarlo suma ~18 ms y ~3 MB al arranque de cada worker
+POSTGRES_AVAILABLE = False
+if config.USE_POSTGRES:
+    try:
+        import psycopg2
+        import psycopg2.extras
+        from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+        POSTGRES_AVAILABLE = True
+    except ImportError:
+        pass
+
+# Conexiones entregadas por get_db() en el hilo actual (se liberan al terminar el request)
+_local = threading.local()
+
+
+class PoolAgotadoError(Exception):
+    """No se obtuvo una conexion libre del pool dentro del tiempo de espera"""
+
+
+class PostgresPool:
+    """
+    Pool de conexiones psycopg2 para un proceso (un pool por worker de gunicorn).
+    - Abre hasta `maxconn` conexiones y deja `minconn` abiertas desde el inicio
+    - Verifica con SELECT 1 las conexiones que estuvieron inactivas mucho tiempo
+    - Recicla las conexiones que superan su tiempo maximo de vida
+    """
+
+    def __init__(self, dsn, minconn, maxconn, max_lifetime, healthcheck_idle, timeout):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.max_lifetime = max_lifetime
+        self.healthcheck_idle = healthcheck_idle
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self._cond = threading.Condition()
+        self._libres = []  # (conn, creada, liberada)
+        self._abiertas = 0
+
+        for _ in range(minconn):
+            try:
+                with self._cond:
+                    self._abiertas += 1
+                conn, creada = self._abrir()
+            except Exception:
+                break
+            self._libres.append((conn, creada, time.monotonic()))
+
+    def _abrir(self):
+        """Abre una conexion nueva (el cupo en _abiertas ya fue reservado)"""
+        try:
+            conn = psycopg2.connect(self.dsn)
+        except Exception:
+            with self._cond:
+                self._abiertas -= 1
+                self._cond.notify()
+            raise
+        return conn, time.monotonic()
+
+    def _es_utilizable(self, conn, creada, liberada):
+        """Health check al entregar una conexion"""
+        if conn.closed:
+            return False
+        ahora = time.monotonic()
+        if ahora - creada > self.max_lifetime:
+            return False
+        if ahora - liberada > self.healthcheck_idle:
+            try:
+                cursor = conn.cursor()
+                cursor.execute('SELECT 1')
+                cursor.close()
+                conn.rollback()
+            except Exception:
+                return False
+        return True
+
+    def _descartar(self, conn):
+        with self._cond:
+            self._abiertas -= 1
+            self._cond.notify()
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def obtener(self):
+        """Entrega (conexion, momento_de_creacion); espera si el pool esta lleno"""
+        limite = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                while not self._libres and self._abiertas >= self.maxconn:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        raise PoolAgotadoError(
+                            f'No hay conexiones libres (maximo {self.maxconn}) tras {self.timeout}s de espera'
+                        )
+                    self._cond.wait(restante)
+
+                if self._libres:
+                    conn, creada, liberada = self._libres.pop()
+                else:
+                    self._abiertas += 1
+                    conn = None
+
+            if conn is None:
+                return self._abrir()
+            if self._es_utilizable(conn, creada, liberada):
+                return conn, creada
+            self._descartar(conn)
+
+    def devolver(self, conn, creada):
+        """Devuelve una conexion al pool descartando cualquier transaccion abierta"""
+        if os.getpid() != self.pid:
+            # Conexion heredada por fork: no se toca el socket del proceso padre
+            return
+
+        reutilizable = not conn.closed and time.monotonic() - creada <= self.max_lifetime
+        if reutilizable:
+            try:
+                if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                reutilizable = False
+
+        if not reutilizable:
+            self._descartar(conn)
+            return
+
+        with self._cond:
+            self._libres.append((conn, creada, time.monotonic()))
+            self._cond.notify()
+
+    def estadisticas(self):
+        with self._cond:
+            return {
+                'abiertas': self._abiertas,
+                'libres': len(self._libres),
+                'en_uso': self._abiertas - len(self._libres),
+                'maximo': self.maxconn
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _postgres_dsn():
+    """DATABASE_URL normalizada para psycopg2"""
+    database_url = config.DATABASE_URL
+
+    # Render usa 'postgres://' pero psycopg2 necesita 'postgresql://'
+    if database_url.startswith('postgres://'):
+        database_url = database_url.replace('postgres://', 'postgresql://', 1)
+    return database_url
+
+
+def get_pool():
+    """Pool de conexiones del proceso actual (se recrea tras un fork)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = PostgresPool(
+                _postgres_dsn(),
+                minconn=config.DB_POOL_MIN,
+                maxconn=config.DB_POOL_MAX,
+                max_lifetime=config.DB_POOL_MAX_LIFETIME,
+                healthcheck_idle=config.DB_POOL_HEALTHCHECK_IDLE,
+                timeout=config.DB_POOL_TIMEOUT
+            )
+        return _pool
+
 
 class PostgresWrapper:
     """
@@ -26,14 +193,25 @@ class PostgresWrapper:
     Convierte placeholders ? a %s y funciones de fecha SQLite a PostgreSQL
     """
 
-    def __init__(self, conn):
+    def __init__(self, conn, pool=None, creada=None):
         self.conn = conn
         self._cursor = None
+        self._pool = pool
+        self._creada = creada
+        self._cerrada = False
 
     def cursor(self):
         self._cursor = PostgresCursorWrapper(self.conn.cursor())
         return self._cursor
 
+    def cursor_servidor(self, nombre):
+        """
+        Cursor con nombre (del lado del servidor): execute no descarga el
+        resultado y cada fetchmany pide el bloque siguiente con FETCH.
+        Vive hasta el fin de la transaccion.
+        """
+        return PostgresCursorWrapper(self.conn.cursor(name=nombre))
+
     def commit(self):
         self.conn.commit()
 
@@ -41,7 +219,14 @@ class PostgresWrapper:
         self.conn.rollback()
 
     def close(self):
-        self.conn.close()
+        """Devuelve la conexion al pool (o la cierra si no proviene de uno)"""
+        if self._cerrada:
+            return
+        self._cerrada = True
+        if self._pool is not None:
+            self._pool.devolver(self.conn, self._creada)
+        else:
+            self.conn.close()
 
     def execute(self, sql, params=None):
         cursor = self.cursor()
@@ -57,12 +242,12 @@ class PostgresCursorWrapper:
     def __init__(self, cursor):
         self.cursor = cursor
         self.description = cursor.description
+        self._columnas = None
+        self._ultimo_insert = False
 
     def execute(self, sql, params=None):
-        # Convertir sintaxis SQLite a PostgreSQL
-        sql = self._convert_sql(sql)
-        # Convertir placeholders ? a %s
-        sql = self._convert_placeholders(sql)
+        # Convertir sintaxis SQLite a PostgreSQL y placeholders ? a %s (memoizado)
+        sql = traducir_sql(sql)
 
         if params:
             self.cursor.execute(sql, params)
@@ -70,12 +255,18 @@ class PostgresCursorWrapper:
             self.cursor.execute(sql)
 
         self.description = self.cursor.description
+        self._columnas = None
+        self._ultimo_insert = sql.lstrip()[:6].upper() == 'INSERT'
         return self
 
     def executemany(self, sql, params_list):
-        sql = self._convert_sql(sql)
-        sql = self._convert_placeholders(sql)
-        self.cursor.executemany(sql, params_list)
+        # executemany de psycopg2 hace un viaje por fila; execute_batch agrupa
+        # las sentencias en paginas de DB_BATCH_PAGE_SIZE por viaje
+        sql = traducir_sql(sql)
+        psycopg2.extras.execute_batch(self.cursor, sql, params_list, page_size=config.DB_BATCH_PAGE_SIZE)
+        self.description = None
+        self._columnas = None
+        self._ultimo_insert = sql.lstrip()[:6].upper() == 'INSERT'
         return self
 
     def executescript(self, sql):
@@ -87,281 +278,369 @@ class PostgresCursorWrapper:
                 self.execute(stmt)
         return self
 
+    def _mapa_columnas(self):
+        """Mapa columna -> indice, compartido por todas las filas del resultado"""
+        if self._columnas is None:
+            self._columnas = {col[0]: i for i, col in enumerate(self.cursor.description)}
+        return self._columnas
+
     def fetchone(self):
         row = self.cursor.fetchone()
         if row is None:
             return None
-        # Convertir RealDictRow a algo indexable como sqlite3.Row
-        return DictRow(row)
+        # Convertir la tupla a algo indexable como sqlite3.Row
+        return DictRow(self._mapa_columnas(), row)
 
     def fetchall(self):
         rows = self.cursor.fetchall()
-        return [DictRow(row) for row in rows]
+        if not rows:
+            return []
+        columnas = self._mapa_columnas()
+        return [DictRow(columnas, row) for row in rows]
 
     def fetchmany(self, size=None):
         rows = self.cursor.fetchmany(size) if size else self.cursor.fetchmany()
-        return [DictRow(row) for row in rows]
+        if not rows:
+            return []
+        columnas = self._mapa_columnas()
+        return [DictRow(columnas, row) for row in rows]
 
     @property
     def lastrowid(self):
-        """PostgreSQL no tiene lastrowid directamente, usamos RETURNING"""
-        return getattr(self.cursor, 'lastrowid', None)
+        """
+        PostgreSQL no tiene lastrowid (el de psycopg2 es el OID, siempre 0).
+        Tras un INSERT en una tabla SERIAL, LASTVAL() devuelve el id generado
+        en esta sesion.
+        """
+        if not self._ultimo_insert:
+            return None
+        consulta = self.cursor.connection.cursor()
+        try:
+            consulta.execute('SELECT LASTVAL()')
+            return consulta.fetchone()[0]
+        finally:
+            consulta.close()
 
     @property
     def rowcount(self):
         return self.cursor.rowcount
 
-    def _convert_placeholders(self, sql):
-        """Convierte ? a %s para PostgreSQL"""
-        # Evitar convertir ?? (escape) y ? dentro de strings
-        result = []
-        in_string = False
-        string_char = None
-        i = 0
-        while i < len(sql):
-            char = sql[i]
-
-            # Detectar inicio/fin de string
-            if char in ("'", '"') and (i == 0 or sql[i-1] != '\\'):
-                if not in_string:
-                    in_string = True
-                    string_char = char
-                elif char == string_char:
-                    in_string = False
-                    string_char = None
-
-            # Convertir ? a %s solo fuera de strings
-            if char == '?' and not in_string:
-                result.append('%s')
-            else:
-                result.append(char)
-            i += 1
+    def close(self):
+        self.cursor.close()
 
-        return ''.join(result)
 
-    def _convert_sql(self, sql):
-        """Convierte funciones SQLite a PostgreSQL"""
+# ============================================================================
+# TRADUCCION SQL: SQLite -> PostgreSQL
+# ============================================================================
 
-        # BEGIN IMMEDIATE -> BEGIN (PostgreSQL no soporta IMMEDIATE)
-        sql = re.sub(r'\bBEGIN\s+IMMEDIATE\b', 'BEGIN', sql, flags=re.IGNORECASE)
+# Reglas (patron, reemplazo) que se compilan una sola vez, en la primera
+# traduccion: con SQLite no se traduce nada y no se compilan. El orden importa:
+# los patrones especificos deben aplicarse antes que los generales.
+_REGLAS_SQL = [
+    # BEGIN IMMEDIATE -> BEGIN (PostgreSQL no soporta IMMEDIATE)
+    (r'\bBEGIN\s+IMMEDIATE\b', 'BEGIN'),
 
-        # DATE("now") -> CURRENT_DATE
-        sql = re.sub(r'DATE\s*\(\s*["\']now["\']\s*\)', 'CURRENT_DATE', sql, flags=re.IGNORECASE)
+    # DATE("now") -> CURRENT_DATE
+    (r'DATE\s*\(\s*["\']now["\']\s*\)', 'CURRENT_DATE'),
 
-        # DATE('now') -> CURRENT_DATE
-        sql = re.sub(r"DATE\s*\(\s*'now'\s*\)", 'CURRENT_DATE', sql, flags=re.IGNORECASE)
+    # DATE('now') -> CURRENT_DATE
+    (r"DATE\s*\(\s*'now'\s*\)", 'CURRENT_DATE'),
 
-        # datetime('now') -> CURRENT_TIMESTAMP
-        sql = re.sub(r"datetime\s*\(\s*['\"]now['\"]\s*\)", 'CURRENT_TIMESTAMP', sql, flags=re.IGNORECASE)
+    # DATE('now', 'start of month', '+1 month') -> primer dia del mes siguiente
+    (r"DATE\s*\(\s*'now'\s*,\s*'start of month'\s*,\s*'\+1 month'\s*\)",
+     "(DATE_TRUNC('month', CURRENT_DATE) + INTERVAL '1 month')::date"),
 
-        # strftime('%Y-%m', fecha) = strftime('%Y-%m', 'now')
-        # -> TO_CHAR(fecha, 'YYYY-MM') = TO_CHAR(CURRENT_DATE, 'YYYY-MM')
-        sql = re.sub(
-            r"strftime\s*\(\s*'%Y-%m'\s*,\s*(\w+)\s*\)\s*=\s*strftime\s*\(\s*'%Y-%m'\s*,\s*'now'\s*\)",
-            r"TO_CHAR(\1, 'YYYY-MM') = TO_CHAR(CURRENT_DATE, 'YYYY-MM')",
-            sql,
-            flags=re.IGNORECASE
-        )
+    # DATE('now', 'start of month') -> primer dia del mes actual
+    (r"DATE\s*\(\s*'now'\s*,\s*'start of month'\s*\)", "DATE_TRUNC('month', CURRENT_DATE)::date"),
 
-        # strftime('%Y-%m', campo) -> TO_CHAR(campo, 'YYYY-MM')
-        sql = re.sub(
-            r"strftime\s*\(\s*'%Y-%m'\s*,\s*(\w+)\s*\)",
-            r"TO_CHAR(\1, 'YYYY-MM')",
-            sql,
-            flags=re.IGNORECASE
-        )
+    # datetime('now') -> CURRENT_TIMESTAMP
+    (r"datetime\s*\(\s*['\"]now['\"]\s*\)", 'CURRENT_TIMESTAMP'),
 
-        # strftime('%Y-%m', 'now') -> TO_CHAR(CURRENT_DATE, 'YYYY-MM')
-        sql = re.sub(
-            r"strftime\s*\(\s*'%Y-%m'\s*,\s*'now'\s*\)",
-            "TO_CHAR(CURRENT_DATE, 'YYYY-MM')",
-            sql,
-            flags=re.IGNORECASE
-        )
+    # strftime('%Y-%m', fecha) = strftime('%Y-%m', 'now')
+    # -> TO_CHAR(fecha, 'YYYY-MM') = TO_CHAR(CURRENT_DATE, 'YYYY-MM')
+    (r"strftime\s*\(\s*'%Y-%m'\s*,\s*(\w+)\s*\)\s*=\s*strftime\s*\(\s*'%Y-%m'\s*,\s*'now'\s*\)",
+     r"TO_CHAR(\1, 'YYYY-MM') = TO_CHAR(CURRENT_DATE, 'YYYY-MM')"),
 
-        # strftime('%Y-%m-%d', campo) -> TO_CHAR(campo, 'YYYY-MM-DD')
-        sql = re.sub(
-            r"strftime\s*\(\s*'%Y-%m-%d'\s*,\s*(\w+)\s*\)",
-            r"TO_CHAR(\1, 'YYYY-MM-DD')",
-            sql,
-            flags=re.IGNORECASE
-        )
+    # strftime('%Y-%m', campo) -> TO_CHAR(campo, 'YYYY-MM')
+    (r"strftime\s*\(\s*'%Y-%m'\s*,\s*(\w+)\s*\)", r"TO_CHAR(\1, 'YYYY-MM')"),
 
-        # AUTOINCREMENT no existe en PostgreSQL (usa SERIAL)
-        sql = re.sub(r'\bAUTOINCREMENT\b', '', sql, flags=re.IGNORECASE)
+    # strftime('%Y-%m', 'now') -> TO_CHAR(CURRENT_DATE, 'YYYY-MM')
+    (r"strftime\s*\(\s*'%Y-%m'\s*,\s*'now'\s*\)", "TO_CHAR(CURRENT_DATE, 'YYYY-MM')"),
 
-        # GROUP_CONCAT(campo, separador) -> STRING_AGG(campo::text, separador)
-        # Ejemplo: GROUP_CONCAT(codigo, ', ') -> STRING_AGG(codigo::text, ', ')
-        sql = re.sub(
-            r"GROUP_CONCAT\s*\(\s*([^,]+)\s*,\s*(['\"][^'\"]+['\"])\s*\)",
-            r"STRING_AGG(\1::text, \2)",
-            sql,
-            flags=re.IGNORECASE
-        )
+    # strftime('%Y-%m-%d', campo) -> TO_CHAR(campo, 'YYYY-MM-DD')
+    (r"strftime\s*\(\s*'%Y-%m-%d'\s*,\s*(\w+)\s*\)", r"TO_CHAR(\1, 'YYYY-MM-DD')"),
 
-        # GROUP_CONCAT(campo) -> STRING_AGG(campo::text, ',')
-        sql = re.sub(
-            r"GROUP_CONCAT\s*\(\s*([^)]+)\s*\)",
-            r"STRING_AGG(\1::text, ',')",
-            sql,
-            flags=re.IGNORECASE
-        )
+    # AUTOINCREMENT no existe en PostgreSQL (usa SERIAL)
+    (r'\bAUTOINCREMENT\b', ''),
 
-        # IFNULL -> COALESCE (PostgreSQL usa COALESCE)
-        sql = re.sub(r'\bIFNULL\b', 'COALESCE', sql, flags=re.IGNORECASE)
+    # GROUP_CONCAT(campo, separador) -> STRING_AGG(campo::text, separador)
+    # Ejemplo: GROUP_CONCAT(codigo, ', ') -> STRING_AGG(codigo::text, ', ')
+    (r"GROUP_CONCAT\s*\(\s*([^,]+)\s*,\s*(['\"][^'\"]+['\"])\s*\)", r"STRING_AGG(\1::text, \2)"),
 
-        # JULIANDAY('now') -> EXTRACT(EPOCH FROM CURRENT_TIMESTAMP)/86400
-        # Para calcular diferencia de dias: JULIANDAY(a) - JULIANDAY(b) -> (a::date - b::date)
-        sql = re.sub(
-            r"JULIANDAY\s*\(\s*'now'\s*\)\s*-\s*JULIANDAY\s*\(\s*(\w+(?:\.\w+)?)\s*\)",
-            r"(CURRENT_DATE - \1::date)",
-            sql,
-            flags=re.IGNORECASE
-        )
-        sql = re.sub(
-            r"JULIANDAY\s*\(\s*(\w+(?:\.\w+)?)\s*\)\s*-\s*JULIANDAY\s*\(\s*'now'\s*\)",
-            r"(\1::date - CURRENT_DATE)",
-            sql,
-            flags=re.IGNORECASE
-        )
-        # CAST(JULIANDAY(a) - JULIANDAY(b) AS INTEGER) -> (a::date - b::date)
-        sql = re.sub(
-            r"CAST\s*\(\s*JULIANDAY\s*\(\s*(\w+(?:\.\w+)?)\s*\)\s*-\s*JULIANDAY\s*\(\s*'now'\s*\)\s*AS\s+INTEGER\s*\)",
-            r"(\1::date - CURRENT_DATE)",
-            sql,
-            flags=re.IGNORECASE
-        )
-        # JULIANDAY('now') solo -> EXTRACT(EPOCH FROM CURRENT_TIMESTAMP)/86400
-        sql = re.sub(
-            r"JULIANDAY\s*\(\s*'now'\s*\)",
-            "EXTRACT(EPOCH FROM CURRENT_TIMESTAMP)/86400",
-            sql,
-            flags=re.IGNORECASE
-        )
-        # JULIANDAY(campo) -> EXTRACT(EPOCH FROM campo::timestamp)/86400
-        sql = re.sub(
-            r"JULIANDAY\s*\(\s*(\w+(?:\.\w+)?)\s*\)",
-            r"EXTRACT(EPOCH FROM \1::timestamp)/86400",
-            sql,
-            flags=re.IGNORECASE
-        )
+    # GROUP_CONCAT(campo) -> STRING_AGG(campo::text, ',')
+    (r"GROUP_CONCAT\s*\(\s*([^)]+)\s*\)", r"STRING_AGG(\1::text, ',')"),
 
-        # CAST(JULIANDAY('now') - JULIANDAY(campo) AS INTEGER) -> (CURRENT_DATE - campo::date)
-        sql = re.sub(
-            r"CAST\s*\(\s*JULIANDAY\s*\(\s*'now'\s*\)\s*-\s*JULIANDAY\s*\(\s*(\w+(?:\.\w+)?)\s*\)\s*AS\s+INTEGER\s*\)",
-            r"(CURRENT_DATE - \1::date)",
-            sql,
-            flags=re.IGNORECASE
-        )
+    # IFNULL -> COALESCE (PostgreSQL usa COALESCE)
+    (r'\bIFNULL\b', 'COALESCE'),
 
-        # DATE('now', '+X days') o DATE('now', '+' || var || ' days') -> CURRENT_DATE + INTERVAL
-        # Patrón simple: DATE('now', '+30 days') -> CURRENT_DATE + INTERVAL '30 days'
-        sql = re.sub(
-            r"DATE\s*\(\s*'now'\s*,\s*'\+(\d+)\s+days?'\s*\)",
-            r"CURRENT_DATE + INTERVAL '\1 days'",
-            sql,
-            flags=re.IGNORECASE
-        )
+    # Para calcular diferencia de dias: JULIANDAY(a) - JULIANDAY(b) -> (a::date - b::date)
+    (r"JULIANDAY\s*\(\s*'now'\s*\)\s*-\s*JULIANDAY\s*\(\s*(\w+(?:\.\w+)?)\s*\)",
+     r"(CURRENT_DATE - \1::date)"),
+    (r"JULIANDAY\s*\(\s*(\w+(?:\.\w+)?)\s*\)\s*-\s*JULIANDAY\s*\(\s*'now'\s*\)",
+     r"(\1::date - CURRENT_DATE)"),
 
-        # Patrón con variable: DATE('now', '+' || ? || ' days')
-        # Este es más complejo, lo manejamos convirtiendo a: CURRENT_DATE + (? * INTERVAL '1 day')
-        sql = re.sub(
-            r"DATE\s*\(\s*'now'\s*,\s*'\+'\s*\|\|\s*\?\s*\|\|\s*'\s*days?'\s*\)",
-            r"CURRENT_DATE + (? * INTERVAL '1 day')",
-            sql,
-            flags=re.IGNORECASE
-        )
+    # CAST(JULIANDAY(a) - JULIANDAY(b) AS INTEGER) -> (a::date - b::date)
+    (r"CAST\s*\(\s*JULIANDAY\s*\(\s*(\w+(?:\.\w+)?)\s*\)\s*-\s*JULIANDAY\s*\(\s*'now'\s*\)\s*AS\s+INTEGER\s*\)",
+     r"(\1::date - CURRENT_DATE)"),
+
+    # JULIANDAY('now') solo -> EXTRACT(EPOCH FROM CURRENT_TIMESTAMP)/86400
+    (r"JULIANDAY\s*\(\s*'now'\s*\)", "EXTRACT(EPOCH FROM CURRENT_TIMESTAMP)/86400"),
 
-        # INTEGER PRIMARY KEY en PostgreSQL necesita ser SERIAL
-        # (esto es para CREATE TABLE, manejado en init_postgres)
+    # JULIANDAY(campo) -> EXTRACT(EPOCH FROM campo::timestamp)/86400
+    (r"JULIANDAY\s*\(\s*(\w+(?:\.\w+)?)\s*\)", r"EXTRACT(EPOCH FROM \1::timestamp)/86400"),
 
-        return sql
+    # CAST(JULIANDAY('now') - JULIANDAY(campo) AS INTEGER) -> (CURRENT_DATE - campo::date)
+    (r"CAST\s*\(\s*JULIANDAY\s*\(\s*'now'\s*\)\s*-\s*JULIANDAY\s*\(\s*(\w+(?:\.\w+)?)\s*\)\s*AS\s+INTEGER\s*\)",
+     r"(CURRENT_DATE - \1::date)"),
+
+    # DATE('now', '+X days') o DATE('now', '+' || var || ' days') -> CURRENT_DATE + INTERVAL
+    # Patrón simple: DATE('now', '+30 days') -> CURRENT_DATE + INTERVAL '30 days'
+    (r"DATE\s*\(\s*'now'\s*,\s*'\+(\d+)\s+days?'\s*\)", r"CURRENT_DATE + INTERVAL '\1 days'"),
+
+    # Patrón con variable: DATE('now', '+' || ? || ' days')
+    # Este es más complejo, lo manejamos convirtiendo a: CURRENT_DATE + (? * INTERVAL '1 day')
+    (r"DATE\s*\(\s*'now'\s*,\s*'\+'\s*\|\|\s*\?\s*\|\|\s*'\s*days?'\s*\)",
+     r"CURRENT_DATE + (? * INTERVAL '1 day')"),
+
+    # INTEGER PRIMARY KEY en PostgreSQL necesita ser SERIAL
+    # (esto es para CREATE TABLE, manejado en init_postgres)
+]
+
+
+@functools.cache
+def _reglas_compiladas():
+    """_REGLAS_SQL con los patrones compilados"""
+    return [(re.compile(patron, re.IGNORECASE), reemplazo) for patron, reemplazo in _REGLAS_SQL]
+
+
+def _convert_sql(sql):
+    """Convierte funciones SQLite a PostgreSQL"""
+    for patron, reemplazo in _reglas_compiladas():
+        sql = patron.sub(reemplazo, sql)
+    return sql
+
+
+def _convert_placeholders(sql):
+    """Convierte ? a %s para PostgreSQL"""
+    # Evitar convertir ?? (escape) y ? dentro de strings
+    result = []
+    in_string = False
+    string_char = None
+    i = 0
+    while i < len(sql):
+        char = sql[i]
+
+        # Detectar inicio/fin de string
+        if char in ("'", '"') and (i == 0 or sql[i-1] != '\\'):
+            if not in_string:
+                in_string = True
+                string_char = char
+            elif char == string_char:
+                in_string = False
+                string_char = None
+
+        # Convertir ? a %s solo fuera de strings
+        if char == '?' and not in_string:
+            result.append('%s')
+        else:
+            result.append(char)
+        i += 1
+
+    return ''.join(result)
+
+
+@functools.lru_cache(maxsize=config.SQL_TRANSLATION_CACHE_SIZE)
+def traducir_sql(sql):
+    """
+    Traduce una sentencia SQLite a PostgreSQL (funciones + placeholders).
+    Memoizada con LRU acotado: las sentencias literales de las vistas se traducen
+    una sola vez por worker.
+    """
+    return _convert_placeholders(_convert_sql(sql))
+
+
+def estadisticas_traduccion():
+    """Aciertos/fallos del cache de traduccion SQL"""
+    info = traducir_sql.cache_info()
+    total = info.hits + info.misses
+    return {
+        'aciertos': info.hits,
+        'fallos': info.misses,
+        'tasa_aciertos': round(info.hits / total, 4) if total else 0.0,
+        'tamano': info.currsize,
+        'maximo': info.maxsize
+    }
 
 
 class DictRow:
     """
     Clase que simula sqlite3.Row para PostgreSQL
-    Permite acceso por indice y por nombre de columna
+    Permite acceso por indice y por nombre de columna.
+    Los valores van en la tupla que entrega psycopg2 y el mapa columna -> indice
+    se comparte entre todas las filas del mismo resultado.
     """
 
-    def __init__(self, data):
-        if isinstance(data, dict):
-            self._data = data
-            self._keys = list(data.keys())
-        else:
-            # Si ya es un objeto similar a Row
-            self._data = dict(data) if hasattr(data, 'keys') else {}
-            self._keys = list(self._data.keys())
+    __slots__ = ('_columnas', '_valores')
+
+    def __init__(self, columnas, valores):
+        self._columnas = columnas
+        self._valores = valores
 
     def __getitem__(self, key):
-        if isinstance(key, int):
-            return self._data[self._keys[key]]
-        return self._data[key]
+        if isinstance(key, str):
+            return self._valores[self._columnas[key]]
+        return self._valores[key]
 
     def __contains__(self, key):
-        return key in self._data
+        return key in self._columnas
+
+    def __iter__(self):
+        return iter(self._valores)
+
+    def __len__(self):
+        return len(self._valores)
+
+    def __repr__(self):
+        return f'DictRow({dict(self.items())!r})'
 
     def keys(self):
-        return self._keys
+        return list(self._columnas)
 
     def values(self):
-        return [self._data[k] for k in self._keys]
+        return [self._valores[i] for i in self._columnas.values()]
 
     def items(self):
-        return self._data.items()
+        return [(k, self._valores[i]) for k, i in self._columnas.items()]
 
     def get(self, key, default=None):
-        return self._data.get(key, default)
+        indice = self._columnas.get(key)
+        if indice is None:
+            return default
+        return self._valores[indice]
 
 
-def get_db():
+def get_db(nueva=False):
     """
     Obtiene conexion a la base de datos.
     Usa PostgreSQL si DATABASE_URL esta configurada, sino usa SQLite.
+    La conexion sale de un pool (PostgreSQL) o se reutiliza por hilo (SQLite);
+    close() la devuelve en lugar de destruirla.
+    Con nueva=True, en SQLite se abre una conexion aparte de la del hilo: sus
+    commit() y close() no tocan la transaccion que el hilo tenga abierta (en
+    PostgreSQL cada llamada ya entrega una conexion distinta del pool).
     """
     if config.USE_POSTGRES and POSTGRES_AVAILABLE:
         return get_postgres_connection()
+    elif nueva:
+        conn = _abrir_sqlite(sqlite3.Connection)
+        _registrar_conexion(conn)
+        return conn
     else:
         return get_sqlite_connection()
 
 
-def get_sqlite_connection():
-    """Conexion a SQLite para desarrollo local"""
-    conn = sqlite3.connect(config.SQLITE_PATH, timeout=config.SQLITE_TIMEOUT)
+class SQLiteConnection(sqlite3.Connection):
+    """
+    Conexion SQLite reutilizable por hilo.
+    close() solo descarta la transaccion pendiente; cerrar() la cierra de verdad.
+    """
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def cerrar(self):
+        super().close()
+
+
+def _abrir_sqlite(factory):
+    conn = sqlite3.connect(config.SQLITE_PATH, timeout=config.SQLITE_TIMEOUT, factory=factory)
     conn.row_factory = sqlite3.Row
     conn.execute('PRAGMA journal_mode=WAL')
     return conn
 
 
-def get_postgres_connection():
-    """Conexion a PostgreSQL para produccion (con wrapper de compatibilidad)"""
-    database_url = config.DATABASE_URL
+def get_sqlite_connection():
+    """Conexion a SQLite para desarrollo local (una por hilo, reutilizada entre requests)"""
+    conn = getattr(_local, 'sqlite', None)
+    if conn is not None and (_local.sqlite_pid != os.getpid() or _local.sqlite_path != config.SQLITE_PATH):
+        conn = None
+
+    if conn is None:
+        conn = _abrir_sqlite(SQLiteConnection)
+        _local.sqlite = conn
+        _local.sqlite_pid = os.getpid()
+        _local.sqlite_path = config.SQLITE_PATH
+
+    _registrar_conexion(conn)
+    return conn
 
-    # Render usa 'postgres://' pero psycopg2 necesita 'postgresql://'
-    if database_url.startswith('postgres://'):
-        database_url = database_url.replace('postgres://', 'postgresql://', 1)
 
-    conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
-    return PostgresWrapper(conn)
+def get_postgres_connection():
+    """Conexion a PostgreSQL para produccion (del pool, con wrapper de compatibilidad)"""
+    pool = get_pool()
+    conn, creada = pool.obtener()
+    wrapper = PostgresWrapper(conn, pool, creada)
+    _registrar_conexion(wrapper)
+    return wrapper
 
 
-def init_database():
+def cursor_por_partes(conn, nombre):
     """
-    Inicializa la base de datos creando todas las tablas necesarias.
-    Detecta automaticamente si usar SQLite o PostgreSQL.
+    Cursor para recorrer un resultado grande con fetchmany sin tenerlo entero
+    en memoria. En PostgreSQL es un cursor con nombre (el cursor normal de
+    psycopg2 descarga todo el resultado en execute); en SQLite el cursor
+    normal ya avanza fila a fila.
     """
-    if config.USE_POSTGRES and POSTGRES_AVAILABLE:
-        init_postgres()
-    else:
-        init_sqlite()
+    if isinstance(conn, PostgresWrapper):
+        return conn.cursor_servidor(nombre)
+    return conn.cursor()
 
 
-def init_sqlite():
-    """Crea las tablas en SQLite"""
-    conn = get_sqlite_connection()
-    cursor = conn.cursor()
+def _registrar_conexion(conn):
+    activas = getattr(_local, 'activas', None)
+    if activas is None:
+        activas = _local.activas = []
+    activas.append(conn)
+
+
+def liberar_conexiones():
+    """
+    Libera las conexiones entregadas en este hilo que la vista no cerro
+    (por ejemplo en un return temprano). Se llama al terminar cada request.
+    """
+    activas = getattr(_local, 'activas', None)
+    if not activas:
+        return
+    _local.activas = []
+    for conn in activas:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def init_sqlite(cursor=None):
+    """
+    Crea las tablas en SQLite.
+    Con `cursor` se ejecuta dentro de la transaccion del llamador, sin commit.
+    """
+    conn = None
+    if cursor is None:
+        conn = get_sqlite_connection()
+        cursor = conn.cursor()
 
-    cursor.executescript('''
+    script = '''
         CREATE TABLE IF NOT EXISTS variantes_base (
             id_variante_base INTEGER PRIMARY KEY AUTOINCREMENT,
             codigo_interno TEXT UNIQUE NOT NULL,
@@ -528,21 +807,28 @@ def init_sqlite():
             fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (id_cuenta) REFERENCES cuentas_por_cobrar(id_cuenta)
         );
-    ''')
+    '''
 
-    conn.commit()
-    conn.close()
-    print("Base de datos SQLite inicializada correctamente")
+    # Sentencia por sentencia: executescript() haria COMMIT de la transaccion abierta
+    for sentencia in script.split(';'):
+        if sentencia.strip():
+            cursor.execute(sentencia)
 
+    if conn is not None:
+        conn.commit()
+        conn.close()
+    print("Base de datos SQLite inicializada correctamente")
 
-def init_postgres():
-    """Crea las tablas en PostgreSQL"""
-    database_url = config.DATABASE_URL
-    if database_url.startswith('postgres://'):
-        database_url = database_url.replace('postgres://', 'postgresql://', 1)
 
-    conn = psycopg2.connect(database_url)
-    cursor = conn.cursor()
+def init_postgres(cursor=None):
+    """
+    Crea las tablas en PostgreSQL.
+    Con `cursor` se ejecuta dentro de la transaccion del llamador, sin commit.
+    """
+    conn = None
+    if cursor is None:
+        conn = psycopg2.connect(_postgres_dsn())
+        cursor = conn.cursor()
 
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS variantes_base (
@@ -717,34 +1003,456 @@ def init_postgres():
         )
     ''')
 
-    conn.commit()
-    conn.close()
+    if conn is not None:
+        conn.commit()
+        conn.close()
     print("Base de datos PostgreSQL inicializada correctamente")
 
 
-def insert_initial_data():
-    """Inserta datos iniciales si no existen"""
-    conn = get_db()
-    cursor = conn.cursor()
+# ============================================================================
+# MIGRACIONES DE ESQUEMA (versionadas en la tabla schema_version)
+# ============================================================================
 
-    cursor.execute('SELECT COUNT(*) as total FROM ubicaciones')
-    result = cursor.fetchone()
-    total = result['total']
+def _migracion_indices(cursor, postgres):
+    """Indices para los filtros y JOINs de las vistas y APIs mas usadas"""
 
-    if total == 0:
+    # Consolidar filas duplicadas de inventario antes de la restriccion UNIQUE:
+    # la cantidad se suma en el registro mas antiguo de cada terna
+    cursor.execute('''
+        UPDATE inventario
+        SET cantidad_pares = (
+            SELECT SUM(i2.cantidad_pares)
+            FROM inventario i2
+            WHERE i2.id_producto = inventario.id_producto
+              AND i2.id_ubicacion = inventario.id_ubicacion
+              AND i2.tipo_stock = inventario.tipo_stock
+        )
+        WHERE id_inventario IN (
+            SELECT MIN(id_inventario)
+            FROM inventario
+            GROUP BY id_producto, id_ubicacion, tipo_stock
+            HAVING COUNT(*) > 1
+        )
+    ''')
+    cursor.execute('''
+        UPDATE preparaciones_detalle
+        SET id_inventario = (
+            SELECT MIN(i2.id_inventario)
+            FROM inventario i1
+            JOIN inventario i2 ON i2.id_producto = i1.id_producto
+                              AND i2.id_ubicacion = i1.id_ubicacion
+                              AND i2.tipo_stock = i1.tipo_stock
+            WHERE i1.id_inventario = preparaciones_detalle.id_inventario
+        )
+        WHERE id_inventario NOT IN (
+            SELECT MIN(id_inventario)
+            FROM inventario
+            GROUP BY id_producto, id_ubicacion, tipo_stock
+        )
+    ''')
+    cursor.execute('''
+        DELETE FROM inventario
+        WHERE id_inventario NOT IN (
+            SELECT MIN(id_inventario)
+            FROM inventario
+            GROUP BY id_producto, id_ubicacion, tipo_stock
+        )
+    ''')
+
+    indices = [
+        # Una sola fila de stock por producto/ubicacion/tipo (ingresar, trasladar, llegadas)
+        'CREATE UNIQUE INDEX IF NOT EXISTS ux_inventario_producto_ubicacion_tipo '
+        'ON inventario (id_producto, id_ubicacion, tipo_stock)',
+        # Stock por ubicacion (venta directa, /ubicaciones) sin leer la tabla
+        'CREATE INDEX IF NOT EXISTS ix_inventario_ubicacion '
+        'ON inventario (id_ubicacion, tipo_stock, id_producto, cantidad_pares)',
+        'CREATE INDEX IF NOT EXISTS ix_productos_variante ON productos_producidos (id_variante_base)',
+        'CREATE INDEX IF NOT EXISTS ix_preparaciones_estado ON preparaciones (estado, fecha_preparacion)',
+        'CREATE INDEX IF NOT EXISTS ix_preparaciones_detalle_preparacion '
+        'ON preparaciones_detalle (id_preparacion, id_producto)',
+        'CREATE INDEX IF NOT EXISTS ix_ventas_fecha ON ventas_v2 (fecha_venta, id_venta)',
+        'CREATE INDEX IF NOT EXISTS ix_ventas_cliente ON ventas_v2 (id_cliente, fecha_venta)',
+        'CREATE INDEX IF NOT EXISTS ix_ventas_estado_pago ON ventas_v2 (estado_pago)',
+        # Cubre COUNT/SUM de pares por venta en /ventas
+        'CREATE INDEX IF NOT EXISTS ix_ventas_detalle_venta ON ventas_detalle (id_venta, cantidad_pares)',
+        'CREATE INDEX IF NOT EXISTS ix_ventas_detalle_producto ON ventas_detalle (id_producto)',
+        # Cubre la deuda por cliente en /clientes
+        'CREATE INDEX IF NOT EXISTS ix_cuentas_cliente ON cuentas_por_cobrar (id_cliente, saldo_pendiente)',
+        'CREATE INDEX IF NOT EXISTS ix_cuentas_venta ON cuentas_por_cobrar (id_venta)',
+        'CREATE INDEX IF NOT EXISTS ix_cuentas_estado ON cuentas_por_cobrar (estado, fecha_vencimiento)',
+        'CREATE INDEX IF NOT EXISTS ix_pagos_cuenta ON pagos (id_cuenta, fecha_pago)',
+    ]
+
+    # codigo_venta LIKE 'V20250101-%': busqueda por prefijo
+    if postgres:
+        indices.append('CREATE INDEX IF NOT EXISTS ix_ventas_codigo_prefijo '
+                       'ON ventas_v2 (codigo_venta varchar_pattern_ops)')
+    else:
+        # LIKE de SQLite no distingue mayusculas: solo usa indices NOCASE
+        indices.append('CREATE INDEX IF NOT EXISTS ix_ventas_codigo_prefijo '
+                       'ON ventas_v2 (codigo_venta COLLATE NOCASE)')
+
+    for sql in indices:
+        cursor.execute(sql)
+
+
+def _migracion_datos_iniciales(cursor, postgres):
+    """Ubicacion por defecto para instalaciones nuevas"""
+    cursor.execute('SELECT COUNT(*) as total FROM ubicaciones')
+    if cursor.fetchone()['total'] == 0:
         cursor.execute('''
             INSERT INTO ubicaciones (nombre, tipo, direccion, activo)
             VALUES (?, ?, ?, ?)
         ''', ('Almacen Central', 'almacen', 'Direccion del almacen principal', 1))
+        print("Datos iniciales insertados: Almacen Central creado")
+
+
+def _migracion_metricas(cursor, postgres):
+    """Contadores del dashboard (ver metricas.py), poblados desde los datos actuales"""
+    monto = 'DECIMAL(14,2)' if postgres else 'REAL'
+    entero_grande = 'BIGINT' if postgres else 'INTEGER'
+
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS metricas_diarias (
+            fecha DATE PRIMARY KEY,
+            ventas_cantidad INTEGER NOT NULL DEFAULT 0,
+            ventas_monto {monto} NOT NULL DEFAULT 0,
+            pares_vendidos INTEGER NOT NULL DEFAULT 0,
+            pares_ingresados INTEGER NOT NULL DEFAULT 0,
+            pagos_cantidad INTEGER NOT NULL DEFAULT 0,
+            pagos_monto {monto} NOT NULL DEFAULT 0,
+            preparaciones_creadas INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS metricas_globales (
+            clave TEXT PRIMARY KEY,
+            valor {entero_grande} NOT NULL DEFAULT 0
+        )
+    ''')
+
+    from metricas import reconstruir_metricas
+    reconstruir_metricas(cursor)
+
+
+def _migracion_secuencias(cursor, postgres):
+    """Contadores de codigos (ver siguiente_secuencia), iniciados con el mayor codigo existente"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS secuencias (
+            clave VARCHAR(50) PRIMARY KEY,
+            valor INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+    # (clave, numero) a partir de los codigos ya emitidos
+    semillas = [
+        # V20250115-001: clave por dia, numero desde la posicion 11
+        '''SELECT SUBSTR(codigo_venta, 1, 9), MAX(CAST(SUBSTR(codigo_venta, 11) AS INTEGER))
+           FROM ventas_v2
+           WHERE codigo_venta LIKE 'V%-%' AND codigo_venta NOT LIKE 'VD%'
+           GROUP BY SUBSTR(codigo_venta, 1, 9)''',
+        # VD20250115-001: venta directa, numero desde la posicion 12
+        '''SELECT SUBSTR(codigo_venta, 1, 10), MAX(CAST(SUBSTR(codigo_venta, 12) AS INTEGER))
+           FROM ventas_v2
+           WHERE codigo_venta LIKE 'VD%-%'
+           GROUP BY SUBSTR(codigo_venta, 1, 10)''',
+        # P20250115-001: preparaciones
+        '''SELECT SUBSTR(codigo_preparacion, 1, 9), MAX(CAST(SUBSTR(codigo_preparacion, 11) AS INTEGER))
+           FROM preparaciones
+           WHERE codigo_preparacion LIKE 'P%-%'
+           GROUP BY SUBSTR(codigo_preparacion, 1, 9)''',
+        # CC-000001 y PAG-000001: numeracion global
+        '''SELECT 'CC', MAX(CAST(SUBSTR(codigo_cuenta, 4) AS INTEGER))
+           FROM cuentas_por_cobrar
+           WHERE codigo_cuenta LIKE 'CC-%'
+           HAVING COUNT(*) > 0''',
+        '''SELECT 'PAG', MAX(CAST(SUBSTR(codigo_pago, 5) AS INTEGER))
+           FROM pagos
+           WHERE codigo_pago LIKE 'PAG-%'
+           HAVING COUNT(*) > 0''',
+    ]
+    for sql in semillas:
+        cursor.execute(f'INSERT INTO secuencias (clave, valor) {sql}')
+
+
+def _migracion_movimientos(cursor, postgres):
+    """Libro de movimientos de inventario y cortes diarios (ver movimientos.py)"""
+    id_serial = 'SERIAL PRIMARY KEY' if postgres else 'INTEGER PRIMARY KEY AUTOINCREMENT'
+
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS movimientos_inventario (
+            id_movimiento {id_serial},
+            fecha TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            id_producto INTEGER NOT NULL,
+            id_ubicacion INTEGER NOT NULL,
+            tipo_stock VARCHAR(20) NOT NULL DEFAULT 'general',
+            cantidad INTEGER NOT NULL,
+            tipo_movimiento VARCHAR(30) NOT NULL,
+            referencia VARCHAR(50)
+        )
+    ''')
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS inventario_cortes (
+            id_corte {id_serial},
+            fecha_corte TIMESTAMP NOT NULL UNIQUE,
+            fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS inventario_snapshots (
+            id_corte INTEGER NOT NULL REFERENCES inventario_cortes(id_corte),
+            id_producto INTEGER NOT NULL,
+            id_ubicacion INTEGER NOT NULL,
+            tipo_stock VARCHAR(20) NOT NULL,
+            cantidad_pares INTEGER NOT NULL,
+            PRIMARY KEY (id_corte, id_ubicacion, id_producto, tipo_stock)
+        )
+    ''')
+    # Delta acotado por fecha (cortes y stock_a_fecha) e historial de un producto
+    cursor.execute('CREATE INDEX IF NOT EXISTS ix_movimientos_fecha ON movimientos_inventario (fecha)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS ix_movimientos_producto '
+                   'ON movimientos_inventario (id_producto, id_ubicacion, tipo_stock, fecha)')
+
+    # El historial empieza aqui: el saldo actual entra como un solo movimiento
+    cursor.execute('''
+        INSERT INTO movimientos_inventario
+        (id_producto, id_ubicacion, tipo_stock, cantidad, tipo_movimiento, referencia)
+        SELECT id_producto, id_ubicacion, tipo_stock, cantidad_pares, 'saldo_inicial', 'migracion 5'
+        FROM inventario
+        WHERE cantidad_pares <> 0
+    ''')
+
+
+def _migracion_version_inventario(cursor, postgres):
+    """Contador de cambios por fila de inventario (ver movimientos.trasladar_stock)"""
+    cursor.execute('ALTER TABLE inventario ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+
+
+def _migracion_fecha_completada(cursor, postgres):
+    """Fecha de llegada de la preparacion (la escribe confirmar_llegada_preparacion)"""
+    cursor.execute('ALTER TABLE preparaciones ADD COLUMN fecha_completada TIMESTAMP')
+
+
+def _migracion_paginacion(cursor, postgres):
+    """
+    Indices por la clave de orden de los listados paginados (ver listados.py)
+    y fechas sin NULL: la comparacion (fecha, id) < (?, ?) descarta las filas
+    con fecha NULL, que quedarian fuera de todas las paginas
+    """
+    for tabla, columna in (('ventas_v2', 'fecha_venta'), ('productos_producidos', 'fecha_produccion'),
+                           ('preparaciones', 'fecha_preparacion')):
+        cursor.execute(f'''
+            UPDATE {tabla}
+            SET {columna} = COALESCE(DATE(fecha_creacion), CURRENT_DATE)
+            WHERE {columna} IS NULL
+        ''')
+    cursor.execute('UPDATE clientes SET fecha_creacion = CURRENT_TIMESTAMP WHERE fecha_creacion IS NULL')
+
+    # ventas_v2 ya tiene ix_ventas_fecha (fecha_venta, id_venta)
+    for sql in (
+        'CREATE INDEX IF NOT EXISTS ix_productos_fecha ON productos_producidos (fecha_produccion, id_producto)',
+        'CREATE INDEX IF NOT EXISTS ix_preparaciones_fecha ON preparaciones (fecha_preparacion, id_preparacion)',
+        'CREATE INDEX IF NOT EXISTS ix_clientes_fecha ON clientes (fecha_creacion, id_cliente)',
+    ):
+        cursor.execute(sql)
+
+
+def _migracion_trabajos(cursor, postgres):
+    """Cola de trabajos en segundo plano: importaciones y exportaciones (ver trabajos.py)"""
+    id_serial = 'SERIAL PRIMARY KEY' if postgres else 'INTEGER PRIMARY KEY AUTOINCREMENT'
+
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS trabajos (
+            id_trabajo {id_serial},
+            tipo VARCHAR(50) NOT NULL,
+            estado VARCHAR(20) NOT NULL DEFAULT 'pendiente',
+            parametros TEXT,
+            archivo TEXT,
+            progreso INTEGER NOT NULL DEFAULT 0,
+            total INTEGER,
+            resultado TEXT,
+            error TEXT,
+            fecha_creacion TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            fecha_inicio TIMESTAMP,
+            fecha_actualizacion TIMESTAMP,
+            fecha_fin TIMESTAMP
+        )
+    ''')
+    # Tomar el pendiente mas antiguo y detectar trabajos abandonados
+    cursor.execute('CREATE INDEX IF NOT EXISTS ix_trabajos_estado ON trabajos (estado, id_trabajo)')
+
+
+# (version, descripcion, funcion). Solo se agregan al final; nunca se renumeran.
+MIGRACIONES = [
+    (1, 'Indices para consultas frecuentes y UNIQUE de inventario', _migracion_indices),
+    (2, 'Datos iniciales: Almacen Central', _migracion_datos_iniciales),
+    (3, 'Contadores del dashboard: metricas_diarias y metricas_globales', _migracion_metricas),
+    (4, 'Secuencias para codigos de venta, preparacion, cuenta y pago', _migracion_secuencias),
+    (5, 'Libro de movimientos de inventario con cortes diarios', _migracion_movimientos),
+    (6, 'Version de fila en inventario para traslados optimistas', _migracion_version_inventario),
+    (7, 'Fecha de llegada en preparaciones', _migracion_fecha_completada),
+    (8, 'Indices y fechas no nulas para los listados paginados', _migracion_paginacion),
+    (9, 'Cola de trabajos en segundo plano', _migracion_trabajos),
+]
+
+VERSION_ESQUEMA = MIGRACIONES[-1][0]
+
+# Clave de pg_advisory_xact_lock que serializa las migraciones entre workers
+LOCK_MIGRACIONES = 727310
+
+
+def version_esquema(cursor):
+    """Ultima migracion aplicada (0 si no hay ninguna)"""
+    cursor.execute('SELECT COALESCE(MAX(version), 0) as version FROM schema_version')
+    return cursor.fetchone()['version']
+
+
+def esquema_al_dia():
+    """
+    Chequeo de arranque: una sola consulta a schema_version.
+    Devuelve False si la tabla no existe o falta alguna migracion.
+    """
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        return version_esquema(cursor) >= VERSION_ESQUEMA
+    except Exception:
+        conn.rollback()
+        return False
+    finally:
+        conn.close()
+
+
+def aplicar_migraciones():
+    """
+    Lleva el esquema a la ultima version: tablas base (si la BD es nueva),
+    migraciones pendientes y datos iniciales, todo en una transaccion.
+    Es seguro con varios workers arrancando a la vez: el trabajo se hace
+    bajo pg_advisory_xact_lock (PostgreSQL) o BEGIN IMMEDIATE (SQLite) y la
+    version se vuelve a leer despues de obtener el lock.
+    """
+    postgres = is_postgres()
+    conn = get_db()
+    cursor = conn.cursor()
+    aplicadas = 0
+
+    try:
+        if postgres:
+            cursor.execute('SELECT pg_advisory_xact_lock(?)', (LOCK_MIGRACIONES,))
+        else:
+            cursor.execute('BEGIN IMMEDIATE')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                descripcion TEXT,
+                fecha_aplicacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        actual = version_esquema(cursor)
+
+        if actual == 0:
+            if postgres:
+                init_postgres(cursor)
+            else:
+                init_sqlite(cursor)
+
+        for version, descripcion, migracion in MIGRACIONES:
+            if version <= actual:
+                continue
+            migracion(cursor, postgres)
+            cursor.execute(
+                'INSERT INTO schema_version (version, descripcion) VALUES (?, ?)',
+                (version, descripcion)
+            )
+            aplicadas += 1
+            print(f"Migracion {version} aplicada: {descripcion}")
 
         conn.commit()
-        print("Datos iniciales insertados: Almacen Central creado")
-    else:
-        print(f"Ya existen {total} ubicacion(es), no se insertan datos iniciales")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
 
-    conn.close()
+    return aplicadas
 
 
 def is_postgres():
     """Indica si estamos usando PostgreSQL"""
     return config.USE_POSTGRES and POSTGRES_AVAILABLE
+
+
+# Errores de PostgreSQL que abortan la transaccion por un conflicto con otra
+# (deadlock, fallo de serializacion): la operacion se puede reintentar entera
+ERRORES_REINTENTABLES = (psycopg2.extensions.TransactionRollbackError,) if POSTGRES_AVAILABLE else ()
+
+
+# ============================================================================
+# SECUENCIAS (numeracion de codigos sin recorrer el historial)
+# ============================================================================
+
+# RETURNING existe en SQLite desde la version 3.35
+SQLITE_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# Parametros por sentencia que acepta SQLite < 3.32; las sentencias con
+# muchas filas o valores se parten para no pasarlo
+MAX_PARAMETROS = 999
+
+
+def siguiente_secuencia(cursor, clave):
+    """
+    Incrementa y devuelve el contador `clave` (empieza en 1) en una sola
+    sentencia. Debe llamarse dentro de la transaccion que usa el codigo: la
+    fila queda bloqueada hasta el commit, asi dos transacciones nunca obtienen
+    el mismo numero y un rollback no deja huecos.
+    Ejemplo: siguiente_secuencia(cursor, 'V20250115') -> 4 (codigo V20250115-004)
+    """
+    upsert = '''
+        INSERT INTO secuencias (clave, valor) VALUES (?, 1)
+        ON CONFLICT (clave) DO UPDATE SET valor = secuencias.valor + 1
+    '''
+    if is_postgres() or SQLITE_RETURNING:
+        cursor.execute(upsert + ' RETURNING valor', (clave,))
+    else:
+        cursor.execute(upsert, (clave,))
+        cursor.execute('SELECT valor FROM secuencias WHERE clave = ?', (clave,))
+    # fetchall() y no fetchone(): SQLite no termina el INSERT ... RETURNING
+    # hasta consumir todas sus filas
+    return cursor.fetchall()[0]['valor']
+
+
+# ============================================================================
+# INVENTARIO (upsert compartido por ingresos, traslados y llegadas)
+# ============================================================================
+
+def sumar_inventario(cursor, filas):
+    """
+    Suma pares al inventario creando las filas que no existan, en una sola
+    sentencia INSERT ... ON CONFLICT DO UPDATE (PostgreSQL y SQLite >= 3.24)
+    sobre el indice UNIQUE (id_producto, id_ubicacion, tipo_stock). Sin
+    SELECT previo: dos ingresos simultaneos al mismo producto/ubicacion no
+    pueden crear filas duplicadas. Sube inventario.version de las filas que
+    ya existian.
+    `filas` es una lista de (id_producto, id_ubicacion, tipo_stock, cantidad);
+    las repetidas se suman antes (PostgreSQL no permite actualizar la misma
+    fila dos veces en una sentencia).
+    Ejemplo: sumar_inventario(cursor, [(5, 1, 'general', 12)])
+    Se parte en sentencias de hasta MAX_PARAMETROS // 4 filas.
+    """
+    cantidades = {}
+    for id_producto, id_ubicacion, tipo_stock, cantidad in filas:
+        clave = (int(id_producto), int(id_ubicacion), tipo_stock)
+        cantidades[clave] = cantidades.get(clave, 0) + int(cantidad)
+
+    pendientes = list(cantidades.items())
+    por_sentencia = MAX_PARAMETROS // 4
+    for inicio in range(0, len(pendientes), por_sentencia):
+        bloque = pendientes[inicio:inicio + por_sentencia]
+        cursor.execute(f'''
+            INSERT INTO inventario (id_producto, id_ubicacion, tipo_stock, cantidad_pares)
+            VALUES {', '.join('(?, ?, ?, ?)' for _ in bloque)}
+            ON CONFLICT (id_producto, id_ubicacion, tipo_stock) DO UPDATE SET
+                cantidad_pares = inventario.cantidad_pares + excluded.cantidad_pares,
+                version = inventario.version + 1
+        ''', [valor for clave, cantidad in bloque for valor in clave + (cantidad,)])
@@ -3,7 +3,7 @@ Script para inicializar la base de datos y datos iniciales
 Compatible con SQLite (desarrollo) y PostgreSQL (produccion/Render)
 """
 
-from database import init_database, insert_initial_data, is_postgres
+from database import aplicar_migraciones, is_postgres
 from config import get_config
 
 config = get_config()
@@ -27,13 +27,10 @@ def main():
     print("\n" + "-"*70)
 
     try:
-        # Crear tablas
-        print("\n1. Creando tablas...")
-        init_database()
-
-        # Insertar datos iniciales
-        print("\n2. Insertando datos iniciales...")
-        insert_initial_data()
+        # Crear tablas, indices y datos iniciales (migraciones pendientes)
+        print("\n1. Aplicando migraciones...")
+        aplicadas = aplicar_migraciones()
+        print(f"   {aplicadas} migracion(es) aplicada(s)")
 
         print("\n" + "="*70)
         print(" INICIALIZACION COMPLETADA")
@@ -0,0 +1,173 @@
+"""
+Exportacion de ventas con sus lineas de detalle para contabilidad
+Compatible con SQLite (desarrollo) y PostgreSQL (produccion/Render)
+
+Una fila por linea de venta (las ventas sin detalle salen en una fila sin
+producto), en orden de fecha. El resultado nunca esta entero en memoria:
+se lee de a EXPORTACION_LOTE filas con fetchmany sobre un cursor con nombre
+de PostgreSQL (database.cursor_por_partes) y:
+
+- CSV: cada bloque se escribe y se envia al cliente mientras se lee el
+  siguiente (generar_csv es un generador para una respuesta en streaming).
+- XLSX: openpyxl en modo write-only vuelca las filas a disco a medida que
+  llegan; el libro se arma en un archivo temporal que luego se envia.
+
+exportar_archivo escribe cualquiera de los dos formatos en una ruta, para
+las exportaciones en segundo plano (trabajos.py).
+"""
+import csv
+import io
+import tempfile
+from datetime import date
+
+from config import get_config
+from database import get_db, cursor_por_partes
+from listados import filtrar_ventas
+
+config = get_config()
+
+# (expresion SQL, encabezado) de cada columna exportada
+COLUMNAS = [
+    ('v.id_venta', 'ID venta'),
+    ('v.codigo_venta', 'Código venta'),
+    ('v.fecha_venta', 'Fecha'),
+    ("COALESCE(TRIM(c.nombre || ' ' || COALESCE(c.apellido, '')), v.cliente)", 'Cliente'),
+    ('c.numero_documento', 'Documento'),
+    ('u.nombre', 'Ubicación'),
+    ('v.estado_pago', 'Estado de pago'),
+    ('v.modalidad_pago', 'Modalidad'),
+    ('v.metodo_pago', 'Método de pago'),
+    ('v.descuento_total', 'Descuento venta'),
+    ('v.total_final', 'Total venta'),
+    ('vd.codigo_interno', 'Código producto'),
+    ('vd.cuero', 'Cuero'),
+    ('vd.color_cuero', 'Color'),
+    ('vd.serie_tallas', 'Serie'),
+    ('vd.cantidad_pares', 'Pares'),
+    ('vd.precio_unitario', 'Precio unitario'),
+    ('vd.descuento_linea', 'Descuento línea'),
+    ('vd.subtotal', 'Subtotal línea'),
+]
+
+# Posicion de la fecha, que SQLite devuelve como texto
+_COLUMNA_FECHA = 2
+
+_ORIGEN_SQL = '''
+    FROM ventas_v2 v
+    LEFT JOIN ventas_detalle vd ON vd.id_venta = v.id_venta
+    LEFT JOIN clientes c ON v.id_cliente = c.id_cliente
+    LEFT JOIN ubicaciones u ON v.id_ubicacion = u.id_ubicacion
+    WHERE {where}
+'''
+
+EXPORTACION_SQL = 'SELECT {columnas}' + _ORIGEN_SQL + 'ORDER BY v.fecha_venta, v.id_venta, vd.id_detalle_venta'
+
+CONTEO_SQL = 'SELECT COUNT(*) AS total' + _ORIGEN_SQL
+
+
+def _bloques(conn, filtros):
+    """Bloques de hasta EXPORTACION_LOTE filas, en el orden de COLUMNAS"""
+    condiciones, params = filtrar_ventas(filtros)
+    cursor = cursor_por_partes(conn, 'exportacion_ventas')
+    cursor.execute(EXPORTACION_SQL.format(
+        columnas=', '.join(expresion for expresion, _ in COLUMNAS),
+        where=' AND '.join(condiciones) or '1 = 1'
+    ), params)
+    try:
+        while True:
+            filas = cursor.fetchmany(config.EXPORTACION_LOTE)
+            if not filas:
+                return
+            yield filas
+    finally:
+        cursor.close()
+
+
+def generar_csv(filtros):
+    """
+    Texto CSV por bloques para una respuesta en streaming, con BOM para que
+    Excel reconozca UTF-8. La conexion se pide al empezar a recorrerlo: Flask
+    ya libero las conexiones de la vista (teardown) antes de enviar el cuerpo.
+    Se devuelve al terminar o si el cliente corta la descarga.
+    """
+    conn = get_db()
+    try:
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        escritor.writerow([encabezado for _, encabezado in COLUMNAS])
+        yield '\ufeff' + buffer.getvalue()
+        for filas in _bloques(conn, filtros):
+            buffer.seek(0)
+            buffer.truncate()
+            escritor.writerows(filas)
+            yield buffer.getvalue()
+    finally:
+        conn.close()
+
+
+def _libro_xlsx(conn, filtros, al_avanzar=None):
+    """Libro write-only con las filas de la exportacion (falta guardarlo)"""
+    from openpyxl import Workbook
+
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet('Ventas')
+    hoja.append([encabezado for _, encabezado in COLUMNAS])
+    escritas = 0
+    for filas in _bloques(conn, filtros):
+        for fila in filas:
+            fila = list(fila)
+            if isinstance(fila[_COLUMNA_FECHA], str):
+                fila[_COLUMNA_FECHA] = date.fromisoformat(fila[_COLUMNA_FECHA][:10])
+            hoja.append(fila)
+        escritas += len(filas)
+        if al_avanzar:
+            al_avanzar(escritas)
+    return libro
+
+
+def generar_xlsx(filtros):
+    """Libro XLSX en un archivo temporal (posicionado al inicio, se borra al cerrarlo)"""
+    conn = get_db()
+    try:
+        libro = _libro_xlsx(conn, filtros)
+    finally:
+        conn.close()
+
+    archivo = tempfile.TemporaryFile()
+    libro.save(archivo)
+    archivo.seek(0)
+    return archivo
+
+
+def contar_lineas(conn, filtros):
+    """Cantidad de filas que tendra la exportacion (para informar el avance)"""
+    condiciones, params = filtrar_ventas(filtros)
+    cursor = conn.cursor()
+    cursor.execute(CONTEO_SQL.format(where=' AND '.join(condiciones) or '1 = 1'), params)
+    return cursor.fetchone()['total']
+
+
+def exportar_archivo(conn, filtros, formato, ruta, al_avanzar=None):
+    """
+    Escribe la exportacion en `ruta` ('csv' o 'xlsx'); devuelve las lineas
+    escritas. al_avanzar(lineas escritas, total) se llama tras cada bloque.
+    """
+    total = contar_lineas(conn, filtros)
+
+    def avanzar(escritas):
+        if al_avanzar:
+            al_avanzar(escritas, total)
+
+    if formato == 'xlsx':
+        _libro_xlsx(conn, filtros, avanzar).save(ruta)
+        return total
+
+    escritas = 0
+    with open(ruta, 'w', encoding='utf-8-sig', newline='') as archivo:
+        escritor = csv.writer(archivo)
+        escritor.writerow([encabezado for _, encabezado in COLUMNAS])
+        for filas in _bloques(conn, filtros):
+            escritor.writerows(filas)
+            escritas += len(filas)
+            avanzar(escritas)
+    return escritas
@@ -0,0 +1,425 @@
+"""
+Importacion de catalogos desde Excel o CSV por lotes
+Compatible con SQLite (desarrollo) y PostgreSQL (produccion/Render)
+
+El archivo no se carga entero: openpyxl en modo read_only (o el modulo csv)
+entrega las filas de a una (filas_archivo) y se procesan de a
+IMPORTACION_LOTE. Cada lote se valida junto (requeridos, largos, numeros,
+codigos) y se inserta con una sola sentencia:
+
+    INSERT INTO variantes_base (...) VALUES (...), (...), ...
+    ON CONFLICT (codigo_interno) DO NOTHING RETURNING codigo_interno
+
+Variantes base: los codigos que ya existian no cortan la carga (en
+PostgreSQL un error de UNIQUE aborta la transaccion entera): se informan
+como error de su fila. Cada lote se confirma al terminar, asi que si la
+carga se corta se puede volver a subir el mismo archivo; lo ya cargado se
+informa como existente.
+
+Produccion: los lotes no tienen una clave que permita detectar los ya
+cargados, asi que la carga es todo o nada. Se valida el archivo entero
+(codigo_interno -> id_variante_base con un solo mapa en memoria) y, si no
+hay errores, se insertan todos los lotes en una sola transaccion, con el
+ingreso opcional del stock a una ubicacion.
+"""
+import csv
+import io
+import math
+import time
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from config import get_config
+from database import is_postgres, sumar_inventario, SQLITE_RETURNING
+from metricas import sumar_metricas_diarias, sumar_metrica_global
+from movimientos import registrar_movimientos, INGRESO
+
+config = get_config()
+
+# Errores por fila que se devuelven; del resto solo se informa la cantidad
+MAX_ERRORES = 200
+
+# Largo maximo de las columnas VARCHAR(100) de PostgreSQL
+LARGO_MAXIMO = 100
+
+# Extensiones que se aceptan en las cargas masivas
+EXTENSIONES = ('.xlsx', '.xls', '.csv')
+
+
+class ArchivoInvalido(ValueError):
+    """Archivo que no se puede leer o al que le faltan columnas (HTTP 400)"""
+
+
+def _texto(valor):
+    """Celda -> texto sin espacios ('' si esta vacia; 1001.0 -> '1001')"""
+    if valor is None or (isinstance(valor, float) and math.isnan(valor)):
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor).strip()
+
+
+def _abrir_csv(archivo):
+    """
+    Texto del CSV y su separador. Excel en espanol lo guarda en cp1252 y con
+    ';'; se detecta con el comienzo del archivo.
+    """
+    inicio = archivo.read(64 * 1024)
+    archivo.seek(0)
+    try:
+        inicio.decode('utf-8')
+        codificacion = 'utf-8-sig'
+    except UnicodeDecodeError as e:
+        # El corte de 64 KB puede partir un caracter de varios bytes
+        codificacion = 'utf-8-sig' if e.start >= len(inicio) - 3 else 'cp1252'
+    primera = inicio.decode(codificacion, errors='replace').lstrip('\ufeff').split('\n', 1)[0]
+    separador = max(';,\t', key=primera.count)
+    return io.TextIOWrapper(archivo, encoding=codificacion, newline=''), separador
+
+
+def filas_archivo(archivo, nombre_archivo, requeridas):
+    """
+    Abre la primera hoja (o el CSV) y valida los encabezados (sin espacios ni
+    mayusculas). Devuelve (total estimado de filas o None, generador de
+    (numero de fila en el archivo, {columna: texto})) que saltea filas vacias.
+    .xlsx se lee por partes con openpyxl y .csv con el modulo csv; .xls
+    (formato viejo) solo se puede leer entero con pandas.
+    """
+    nombre = nombre_archivo.lower()
+    libro = texto = None
+    total = None
+    if nombre.endswith('.xls'):
+        import pandas as pd
+        df = pd.read_excel(archivo, dtype=object)
+        encabezados = [str(columna) for columna in df.columns]
+        filas = (list(fila) for fila in df.itertuples(index=False, name=None))
+        total = len(df)
+    elif nombre.endswith('.csv'):
+        try:
+            texto, separador = _abrir_csv(archivo)
+            filas = csv.reader(texto, delimiter=separador)
+            encabezados = [_texto(valor).lstrip('\ufeff') for valor in next(filas, ())]
+        except (csv.Error, UnicodeDecodeError) as e:
+            raise ArchivoInvalido(f'No se pudo leer el archivo CSV: {e}')
+    else:
+        from openpyxl import load_workbook
+        try:
+            libro = load_workbook(archivo, read_only=True, data_only=True)
+            hoja = libro.worksheets[0]
+            filas = hoja.iter_rows(values_only=True)
+            encabezados = [_texto(valor) for valor in next(filas, ())]
+        except Exception as e:
+            raise ArchivoInvalido(f'No se pudo leer el archivo Excel: {e}')
+        # max_row sale de la dimension guardada en el archivo (puede faltar)
+        total = hoja.max_row - 1 if hoja.max_row else None
+
+    def cerrar():
+        if libro is not None:
+            libro.close()
+        if texto is not None:
+            # Sin cerrar el archivo original, que es de quien lo abrio
+            texto.detach()
+
+    columnas = [encabezado.strip().lower() for encabezado in encabezados]
+    faltantes = [columna for columna in requeridas if columna not in columnas]
+    if faltantes:
+        cerrar()
+        raise ArchivoInvalido(f'Columnas faltantes: {", ".join(faltantes)}. '
+                              f'Columnas encontradas: {", ".join(e for e in encabezados if e)}')
+
+    def leer():
+        try:
+            for numero, valores in enumerate(filas, start=2):
+                fila = {columna: _texto(valor) for columna, valor in zip(columnas, valores) if columna}
+                if any(fila.values()):
+                    yield numero, fila
+        except (csv.Error, UnicodeDecodeError) as e:
+            raise ArchivoInvalido(f'No se pudo leer el archivo CSV: {e}')
+        finally:
+            cerrar()
+
+    return total, leer()
+
+
+def validar_archivo(archivo, nombre_archivo, requeridas):
+    """Abre el archivo y valida sus encabezados sin cargar nada (ArchivoInvalido si no sirve)"""
+    _, filas = filas_archivo(archivo, nombre_archivo, requeridas)
+    # Leer la primera fila arranca el generador, asi close() cierra el libro
+    next(filas, None)
+    filas.close()
+
+
+def lotes(filas, tamano):
+    """Agrupa un iterable en listas de hasta `tamano` elementos"""
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) == tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+class Resultado:
+    """Conteo de una importacion y errores por fila (los primeros MAX_ERRORES)"""
+
+    def __init__(self):
+        self.filas = 0
+        self.insertados = 0
+        self.total_errores = 0
+        self.errores = []
+        self._inicio = time.perf_counter()
+
+    def error(self, numero, mensaje):
+        self.total_errores += 1
+        if len(self.errores) < MAX_ERRORES:
+            self.errores.append(f'Fila {numero}: {mensaje}')
+
+    def como_dict(self):
+        segundos = time.perf_counter() - self._inicio
+        errores = list(self.errores)
+        if self.total_errores > len(errores):
+            errores.append(f'... y {self.total_errores - len(errores)} errores mas')
+        return {
+            'filas': self.filas,
+            'insertados': self.insertados,
+            'errores': errores,
+            'total_errores': self.total_errores,
+            'segundos': round(segundos, 3),
+            'filas_por_segundo': round(self.filas / segundos) if segundos else None
+        }
+
+
+# ============================================================================
+# VARIANTES BASE
+# ============================================================================
+
+COLUMNAS_VARIANTES = ['codigo_interno', 'tipo_calzado', 'tipo_horma', 'segmento', 'descripcion']
+
+
+def _validar_variantes(lote, resultado, vistos):
+    """
+    Filas validas del lote como tuplas en el orden de COLUMNAS_VARIANTES.
+    `vistos` ({codigo: fila}) acumula los codigos de los lotes anteriores.
+    """
+    validas = []
+    for numero, fila in lote:
+        valores = tuple(fila.get(columna, '') for columna in COLUMNAS_VARIANTES)
+        codigo, tipo = valores[0], valores[1]
+        if not codigo or not tipo:
+            resultado.error(numero, 'codigo_interno y tipo_calzado son requeridos')
+            continue
+        largas = [columna for columna, valor in zip(COLUMNAS_VARIANTES[:4], valores) if len(valor) > LARGO_MAXIMO]
+        if largas:
+            resultado.error(numero, f"{', '.join(largas)} supera {LARGO_MAXIMO} caracteres")
+            continue
+        if codigo in vistos:
+            resultado.error(numero, f"El codigo '{codigo}' esta repetido en el archivo (fila {vistos[codigo]})")
+            continue
+        vistos[codigo] = numero
+        validas.append((numero, valores))
+    return validas
+
+
+def _insertar_variantes(cursor, validas):
+    """Inserta el lote salteando codigos existentes; devuelve los codigos insertados"""
+    sql = ('INSERT INTO variantes_base (codigo_interno, tipo_calzado, tipo_horma, segmento, descripcion) '
+           'VALUES {} ON CONFLICT (codigo_interno) DO NOTHING')
+    if is_postgres() or SQLITE_RETURNING:
+        cursor.execute(sql.format(', '.join('(?, ?, ?, ?, ?)' for _ in validas)) + ' RETURNING codigo_interno',
+                       [valor for _, valores in validas for valor in valores])
+        return {fila['codigo_interno'] for fila in cursor.fetchall()}
+
+    # SQLite < 3.35: una sentencia por fila para saber cuales se insertaron
+    insertados = set()
+    for _, valores in validas:
+        cursor.execute(sql.format('(?, ?, ?, ?, ?)'), valores)
+        if cursor.rowcount:
+            insertados.add(valores[0])
+    return insertados
+
+
+def importar_variantes(conn, archivo, nombre_archivo, al_avanzar=None):
+    """
+    Carga masiva de variantes base desde Excel o CSV; devuelve Resultado.como_dict().
+    al_avanzar(filas leidas, total estimado) se llama tras cada lote.
+    """
+    resultado = Resultado()
+    vistos = {}
+    cursor = conn.cursor()
+    total, filas = filas_archivo(archivo, nombre_archivo, COLUMNAS_VARIANTES[:2])
+    for lote in lotes(filas, config.IMPORTACION_LOTE):
+        resultado.filas += len(lote)
+        validas = _validar_variantes(lote, resultado, vistos)
+        if validas:
+            insertados = _insertar_variantes(cursor, validas)
+            conn.commit()
+            resultado.insertados += len(insertados)
+            for numero, valores in validas:
+                if valores[0] not in insertados:
+                    resultado.error(numero, f"El codigo '{valores[0]}' ya existe")
+        if al_avanzar:
+            al_avanzar(resultado.filas, total)
+    return resultado.como_dict()
+
+
+# ============================================================================
+# PRODUCCION
+# ============================================================================
+
+# Columnas del archivo; las de texto se guardan tal cual en productos_producidos
+COLUMNAS_PRODUCCION = ['codigo_interno', 'cuero', 'color_cuero', 'suela', 'forro', 'material_plantilla',
+                       'serie_tallas', 'costo_unitario', 'precio_sugerido', 'cantidad_total_pares',
+                       'fecha_produccion', 'observaciones']
+REQUERIDAS_PRODUCCION = ['codigo_interno', 'cuero', 'color_cuero', 'serie_tallas', 'costo_unitario',
+                         'precio_sugerido', 'cantidad_total_pares']
+_TEXTOS_PRODUCCION = ['cuero', 'color_cuero', 'suela', 'forro', 'material_plantilla', 'serie_tallas']
+
+# Maximo de DECIMAL(10,2)
+IMPORTE_MAXIMO = Decimal('99999999.99')
+
+INSERTAR_PRODUCCION_SQL = '''
+    INSERT INTO productos_producidos
+    (id_variante_base, cuero, color_cuero, suela, forro, material_plantilla, serie_tallas,
+     pares_por_docena, costo_unitario, precio_sugerido, fecha_produccion,
+     cantidad_total_pares, cantidad_ingresada, observaciones)
+    VALUES {}
+'''
+_MARCAS_PRODUCCION = '(?, ?, ?, ?, ?, ?, ?, 12, ?, ?, ?, ?, ?, ?)'
+
+
+def _importe(texto):
+    """'1.234,50', '1234.5' o '1234,5' -> importe con 2 decimales (None si no es valido)"""
+    if ',' in texto:
+        texto = texto.replace('.', '').replace(',', '.')
+    try:
+        valor = Decimal(texto).quantize(Decimal('0.01'))
+        if not 0 <= valor <= IMPORTE_MAXIMO:
+            return None
+    except InvalidOperation:
+        # Texto que no es numero, NaN o infinito
+        return None
+    # float: sqlite3 no acepta Decimal como parametro
+    return float(valor)
+
+
+def _fecha(texto):
+    """AAAA-MM-DD (tambien con hora, como llega de Excel) o DD/MM/AAAA -> 'AAAA-MM-DD'"""
+    for formato, largo in (('%Y-%m-%d', 10), ('%d/%m/%Y', 10)):
+        try:
+            return datetime.strptime(texto[:largo], formato).date().isoformat()
+        except ValueError:
+            pass
+    return None
+
+
+def _validar_produccion(lote, resultado, variantes, hoy):
+    """
+    Filas validas del lote como tuplas para INSERTAR_PRODUCCION_SQL (sin
+    cantidad_ingresada). `variantes` es el mapa {codigo_interno: id_variante_base}.
+    """
+    validas = []
+    for numero, fila in lote:
+        codigo = fila.get('codigo_interno', '')
+        faltantes = [columna for columna in REQUERIDAS_PRODUCCION if not fila.get(columna)]
+        if faltantes:
+            resultado.error(numero, f"{', '.join(faltantes)} es requerido")
+            continue
+        if codigo not in variantes:
+            resultado.error(numero, f"La variante '{codigo}' no existe en el catalogo")
+            continue
+        largas = [columna for columna in _TEXTOS_PRODUCCION if len(fila.get(columna, '')) > LARGO_MAXIMO]
+        if largas:
+            resultado.error(numero, f"{', '.join(largas)} supera {LARGO_MAXIMO} caracteres")
+            continue
+        costo, precio = _importe(fila['costo_unitario']), _importe(fila['precio_sugerido'])
+        if costo is None or precio is None:
+            resultado.error(numero, 'costo_unitario y precio_sugerido deben ser importes entre 0 y 99999999.99')
+            continue
+        try:
+            pares = int(fila['cantidad_total_pares'])
+        except ValueError:
+            pares = 0
+        if pares <= 0:
+            resultado.error(numero, 'cantidad_total_pares debe ser un entero mayor a 0')
+            continue
+        fecha = _fecha(fila['fecha_produccion']) if fila.get('fecha_produccion') else hoy
+        if fecha is None:
+            resultado.error(numero, 'fecha_produccion debe ser AAAA-MM-DD o DD/MM/AAAA')
+            continue
+        validas.append((variantes[codigo], *(fila.get(columna, '') for columna in _TEXTOS_PRODUCCION),
+                        costo, precio, fecha, pares, fila.get('observaciones', '')))
+    return validas
+
+
+def _insertar_produccion(cursor, validas, ingresar):
+    """
+    Inserta el lote; devuelve [(id_producto, cantidad_total_pares)]. Con
+    `ingresar` los pares quedan ya ingresados (cantidad_ingresada = total).
+    """
+    filas = [valores[:-1] + (valores[-2] if ingresar else 0, valores[-1]) for valores in validas]
+    if is_postgres() or SQLITE_RETURNING:
+        cursor.execute(INSERTAR_PRODUCCION_SQL.format(', '.join(_MARCAS_PRODUCCION for _ in filas)) +
+                       ' RETURNING id_producto, cantidad_total_pares',
+                       [valor for valores in filas for valor in valores])
+        return [(fila['id_producto'], fila['cantidad_total_pares']) for fila in cursor.fetchall()]
+
+    # SQLite < 3.35: una sentencia por fila para conocer cada id
+    insertados = []
+    for valores in filas:
+        cursor.execute(INSERTAR_PRODUCCION_SQL.format(_MARCAS_PRODUCCION), valores)
+        insertados.append((cursor.lastrowid, valores[-3]))
+    return insertados
+
+
+def importar_produccion(conn, archivo, nombre_archivo, id_ubicacion=None, al_avanzar=None):
+    """
+    Carga masiva de lotes de produccion desde Excel o CSV, todo o nada;
+    devuelve Resultado.como_dict() con los pares ingresados. Con
+    `id_ubicacion` cada lote entra entero al stock 'general' de esa ubicacion
+    en la misma transaccion (como /api/inventario/ingresar).
+    al_avanzar(filas leidas, total estimado) se llama tras cada lote.
+    """
+    resultado = Resultado()
+    cursor = conn.cursor()
+    if id_ubicacion is not None:
+        cursor.execute('SELECT id_ubicacion FROM ubicaciones WHERE id_ubicacion = ?', (id_ubicacion,))
+        if cursor.fetchone() is None:
+            raise ArchivoInvalido(f'La ubicacion {id_ubicacion} no existe')
+
+    # Un solo mapa para todo el archivo en lugar de una consulta por fila
+    cursor.execute('SELECT codigo_interno, id_variante_base FROM variantes_base')
+    variantes = {fila['codigo_interno']: fila['id_variante_base'] for fila in cursor.fetchall()}
+
+    hoy = date.today().isoformat()
+    validas = []
+    total, filas = filas_archivo(archivo, nombre_archivo, REQUERIDAS_PRODUCCION)
+    for lote in lotes(filas, config.IMPORTACION_LOTE):
+        resultado.filas += len(lote)
+        validas.extend(_validar_produccion(lote, resultado, variantes, hoy))
+        if al_avanzar:
+            al_avanzar(resultado.filas, total)
+
+    pares = 0
+    if validas and not resultado.total_errores:
+        try:
+            for lote in lotes(validas, config.IMPORTACION_LOTE):
+                insertados = _insertar_produccion(cursor, lote, id_ubicacion is not None)
+                resultado.insertados += len(insertados)
+                if id_ubicacion is not None:
+                    stock = [(id_producto, id_ubicacion, 'general', cantidad) for id_producto, cantidad in insertados]
+                    sumar_inventario(cursor, stock)
+                    registrar_movimientos(cursor, [fila + (INGRESO, None) for fila in stock])
+                    pares += sum(cantidad for _, cantidad in insertados)
+            if pares:
+                sumar_metricas_diarias(cursor, pares_ingresados=pares)
+                sumar_metrica_global(cursor, 'stock_total', pares)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    datos = resultado.como_dict()
+    datos['pares_ingresados'] = pares
+    return datos
@@ -3,10 +3,13 @@ Script para limpiar datos de prueba del sistema
 Mantiene la estructura de la base de datos pero elimina todos los registros transaccionales
 """
 
+import os
 import sqlite3
 import shutil
 from datetime import datetime
 
+from config import get_config
+
 def limpiar_datos_prueba(limpiar_catalogo=False):
     """
     Limpia todos los datos de prueba del sistema
@@ -48,7 +51,14 @@ def limpiar_datos_prueba(limpiar_catalogo=False):
             'preparaciones',
             'inventario',
             'productos_producidos',
-            'clientes'
+            'clientes',
+            'metricas_diarias',
+            'metricas_globales',
+            'secuencias',
+            'inventario_snapshots',
+            'inventario_cortes',
+            'movimientos_inventario',
+            'trabajos'
         ]
 
         registros_antes = {}
@@ -94,7 +104,14 @@ def limpiar_datos_prueba(limpiar_catalogo=False):
             'preparaciones',
             'inventario',
             'productos_producidos',
-            'clientes'
+            'clientes',
+            'metricas_diarias',
+            'metricas_globales',
+            'secuencias',
+            'inventario_snapshots',
+            'inventario_cortes',
+            'movimientos_inventario',
+            'trabajos'
         ]
 
         for tabla in orden_limpieza:
@@ -123,8 +140,20 @@ def limpiar_datos_prueba(limpiar_catalogo=False):
         print("\n💾 Paso 9: Guardando cambios...")
         conn.commit()
 
-        # Paso 11: Verificar limpieza
-        print("\n✅ Paso 10: Verificando limpieza...")
+        # Paso 11: Borrar los archivos subidos y exportados de los trabajos
+        print("\n🗑️  Paso 10: Borrando archivos de trabajos en segundo plano...")
+        carpeta_trabajos = get_config().TRABAJOS_DIR
+        archivos_trabajos = 0
+        if os.path.isdir(carpeta_trabajos):
+            for nombre in os.listdir(carpeta_trabajos):
+                ruta = os.path.join(carpeta_trabajos, nombre)
+                if os.path.isfile(ruta):
+                    os.remove(ruta)
+                    archivos_trabajos += 1
+        print(f"   ✓ {carpeta_trabajos} vaciada ({archivos_trabajos} archivos eliminados)")
+
+        # Paso 12: Verificar limpieza
+        print("\n✅ Paso 11: Verificando limpieza...")
         total_registros = 0
         for tabla in tablas_transaccionales:
             cursor.execute(f'SELECT COUNT(*) as total FROM {tabla}')
@@ -177,6 +206,7 @@ if __name__ == "__main__":
     print("  ✓ Productos producidos")
     print("  ✓ Inventario")
     print("  ✓ Preparaciones")
+    print("  ✓ Trabajos en segundo plano y sus archivos")
 
     print("\n¿También deseas limpiar el CATÁLOGO?")
     print("  - Variantes base (modelos de calzado)")
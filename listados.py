@@ -0,0 +1,517 @@
+"""
+Listados paginados: ventas, produccion, inventario, preparaciones y clientes
+Compatible con SQLite (desarrollo) y PostgreSQL (produccion/Render)
+
+Las paginas se piden por clave (keyset) y no con OFFSET. Cada listado
+ordena por sus columnas de siempre mas el id como desempate, y la pagina
+siguiente empieza despues de la clave de la ultima fila mostrada:
+
+    WHERE (v.fecha_venta, v.id_venta) < (?, ?)
+    ORDER BY v.fecha_venta DESC, v.id_venta DESC
+    LIMIT 51
+
+Con los indices de la migracion 8 el costo de una pagina depende del
+tamano de pagina, no del tamano de la tabla ni de cuantas paginas se
+recorrieron. Los totales por fila (pares, stock, deuda) son subconsultas
+correlacionadas: solo se calculan para las filas de la pagina.
+
+El navegador recibe la clave de la ultima fila como un cursor opaco
+(codificar_cursor) y pide la pagina siguiente con ?cursor=...
+
+Los mismos listados sirven a las APIs JSON (/api/ventas, /api/produccion,
+...): ?orden=campo o ?orden=-campo elige otra clave entre las ORDEN_* de
+cada listado y ?campos=a,b (proyectar) deja solo las columnas pedidas.
+"""
+import base64
+import json
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from config import get_config
+
+config = get_config()
+
+# Pares por debajo de los cuales el inventario se marca como stock bajo
+STOCK_BAJO = 6
+
+
+class FiltroInvalido(ValueError):
+    """Filtro, tamano de pagina o cursor que no se puede interpretar (HTTP 400)"""
+
+
+# ============================================================================
+# CURSORES Y FILTROS
+# ============================================================================
+
+def codificar_cursor(valores):
+    """Clave de la ultima fila -> texto para la URL (fechas en ISO 8601, decimales como texto)"""
+    texto = json.dumps([v.isoformat() if isinstance(v, (date, datetime))
+                        else str(v) if isinstance(v, Decimal) else v
+                        for v in valores])
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor, columnas):
+    """Inverso de codificar_cursor; valida que traiga `columnas` valores simples"""
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise FiltroInvalido('Cursor de paginación inválido')
+    if (not isinstance(valores, list) or len(valores) != columnas
+            or any(isinstance(v, (list, dict)) for v in valores)):
+        raise FiltroInvalido('Cursor de paginación inválido')
+    return valores
+
+
+def tamano_pagina(valor):
+    """Filas por pagina pedidas (?limite=), acotadas a LISTADO_PAGINA_MAXIMA"""
+    if valor in (None, ''):
+        return config.LISTADO_PAGINA
+    try:
+        limite = int(valor)
+    except ValueError:
+        raise FiltroInvalido(f'Límite inválido: {valor}')
+    return max(1, min(limite, config.LISTADO_PAGINA_MAXIMA))
+
+
+def rango_periodo(periodo, hoy=None):
+    """
+    (desde, hasta) de los periodos de los botones de filtro: hoy,
+    esta-semana, semana-pasada y este-mes (la semana empieza el domingo)
+    """
+    hoy = hoy or date.today()
+    inicio_semana = hoy - timedelta(days=(hoy.weekday() + 1) % 7)
+    if periodo == 'hoy':
+        return hoy, hoy
+    if periodo == 'esta-semana':
+        return inicio_semana, inicio_semana + timedelta(days=6)
+    if periodo == 'semana-pasada':
+        return inicio_semana - timedelta(days=7), inicio_semana - timedelta(days=1)
+    if periodo == 'este-mes':
+        return hoy.replace(day=1), hoy
+    raise FiltroInvalido(f'Período inválido: {periodo}')
+
+
+def leer_filtros(args):
+    """
+    Filtros comunes desde los parametros de la URL: desde y hasta
+    (AAAA-MM-DD, ambos inclusive) o periodo, id_ubicacion, id_cliente y
+    estado. Cada listado usa los que le corresponden.
+    """
+    filtros = {}
+    for nombre in ('desde', 'hasta'):
+        if args.get(nombre):
+            try:
+                filtros[nombre] = datetime.strptime(args[nombre], '%Y-%m-%d').date()
+            except ValueError:
+                raise FiltroInvalido(f'Fecha inválida en {nombre}: usa AAAA-MM-DD')
+    if args.get('periodo'):
+        filtros['periodo'] = args['periodo']
+        filtros['desde'], filtros['hasta'] = rango_periodo(args['periodo'])
+    for nombre in ('id_ubicacion', 'id_cliente'):
+        if args.get(nombre):
+            try:
+                filtros[nombre] = int(args[nombre])
+            except ValueError:
+                raise FiltroInvalido(f'{nombre} inválido: {args[nombre]}')
+    if args.get('estado'):
+        filtros['estado'] = args['estado']
+    if args.get('orden'):
+        filtros['orden'] = args['orden']
+    return filtros
+
+
+def proyectar(filas, campos=None):
+    """
+    Filas de un listado como dicts para JSON, solo con `campos` (texto
+    separado por comas; todos si viene vacio). Fechas en ISO 8601 y
+    decimales de PostgreSQL como float, igual que en SQLite.
+    """
+    resultado = []
+    pedidos = [campo.strip() for campo in (campos or '').split(',') if campo.strip()]
+    for fila in filas:
+        datos = {clave: valor for clave, valor in dict(fila).items() if not clave.startswith('clave_')}
+        if pedidos:
+            desconocidos = [campo for campo in pedidos if campo not in datos]
+            if desconocidos:
+                raise FiltroInvalido(f"Campos inválidos: {', '.join(desconocidos)}")
+            datos = {campo: datos[campo] for campo in pedidos}
+        for clave, valor in datos.items():
+            if isinstance(valor, (date, datetime)):
+                datos[clave] = valor.isoformat()
+            elif isinstance(valor, Decimal):
+                datos[clave] = float(valor)
+        resultado.append(datos)
+    return resultado
+
+
+def _rango_fechas(columna, filtros, condiciones, params):
+    """desde/hasta sobre una columna de fecha; hasta incluye todo ese dia"""
+    if 'desde' in filtros:
+        condiciones.append(f'{columna} >= ?')
+        params.append(filtros['desde'].isoformat())
+    if 'hasta' in filtros:
+        condiciones.append(f'{columna} < ?')
+        params.append((filtros['hasta'] + timedelta(days=1)).isoformat())
+
+
+def _estado(filtros, opciones):
+    """Condicion SQL del estado pedido entre `opciones` ({estado: condicion})"""
+    estado = filtros.get('estado')
+    if estado is None:
+        return None
+    if estado not in opciones:
+        raise FiltroInvalido(f"Estado inválido: {estado}. Usa: {', '.join(opciones)}")
+    return opciones[estado]
+
+
+def _orden(filtros, opciones, defecto):
+    """
+    Clave de orden pedida (?orden=campo ascendente, ?orden=-campo
+    descendente) entre `opciones` ({campo: [expresiones]}).
+    Devuelve (texto del orden, expresiones, descendente).
+    """
+    orden = filtros.get('orden') or defecto
+    campo = orden[1:] if orden.startswith('-') else orden
+    if campo not in opciones:
+        raise FiltroInvalido(f"Orden inválido: {orden}. Usa: {', '.join(opciones)} (con - para descendente)")
+    return orden, opciones[campo], orden.startswith('-')
+
+
+def _paginar(cursor, sql, condiciones, params, orden, claves, descendente, despues, limite):
+    """
+    Ejecuta `sql` (SELECT {clave}, ... WHERE {where}, sin ORDER BY) por clave.
+    `claves` son las expresiones SQL del orden (sin NULL, la ultima unica);
+    se seleccionan como clave_0, clave_1... para armar el cursor, que lleva
+    tambien el texto de `orden` para rechazar cursores de otro orden.
+    Devuelve (filas, cursor de la pagina siguiente o None si no hay mas).
+    """
+    condiciones = list(condiciones)
+    params = list(params)
+    if despues:
+        valores = decodificar_cursor(despues, len(claves) + 1)
+        if valores[0] != orden:
+            raise FiltroInvalido('El cursor corresponde a otro orden')
+        condiciones.append('({}) {} ({})'.format(
+            ', '.join(claves),
+            '<' if descendente else '>',
+            ', '.join('?' for _ in claves)
+        ))
+        params.extend(valores[1:])
+
+    direccion = ' DESC' if descendente else ''
+    cursor.execute(
+        sql.format(clave=', '.join(f'{expresion} as clave_{n}' for n, expresion in enumerate(claves)),
+                   where=' AND '.join(condiciones) or '1 = 1')
+        + ' ORDER BY ' + ', '.join(expresion + direccion for expresion in claves)
+        + ' LIMIT ?',
+        params + [limite + 1]
+    )
+    filas = cursor.fetchall()
+
+    if len(filas) <= limite:
+        return filas, None
+    filas = filas[:limite]
+    return filas, codificar_cursor([orden] + [filas[-1][f'clave_{n}'] for n in range(len(claves))])
+
+
+# ============================================================================
+# LISTADOS
+# ============================================================================
+
+VENTAS_SQL = '''
+    SELECT
+        {clave},
+        v.id_venta,
+        v.codigo_venta,
+        v.id_cliente,
+        v.cliente,
+        v.id_preparacion,
+        v.id_ubicacion,
+        v.fecha_venta,
+        v.estado_pago,
+        v.total_final,
+        v.descuento_total,
+        v.modalidad_pago,
+        v.observaciones,
+        v.fecha_creacion,
+        c.nombre as cliente_nombre,
+        c.apellido as cliente_apellido,
+        u.nombre as ubicacion_nombre,
+        (SELECT COUNT(*) FROM ventas_detalle vd
+         WHERE vd.id_venta = v.id_venta) as total_productos,
+        (SELECT COALESCE(SUM(vd.cantidad_pares), 0) FROM ventas_detalle vd
+         WHERE vd.id_venta = v.id_venta) as total_pares
+    FROM ventas_v2 v
+    LEFT JOIN clientes c ON v.id_cliente = c.id_cliente
+    LEFT JOIN ubicaciones u ON v.id_ubicacion = u.id_ubicacion
+    WHERE {where}
+'''
+
+# ?orden= de cada listado: expresiones de la clave, la ultima es el id
+ORDEN_VENTAS = {
+    'fecha_venta': ['v.fecha_venta', 'v.id_venta'],
+    'total_final': ['COALESCE(v.total_final, 0)', 'v.id_venta'],
+    'codigo_venta': ["COALESCE(v.codigo_venta, '')", 'v.id_venta'],
+    'id_venta': ['v.id_venta'],
+}
+
+
+def filtrar_ventas(filtros):
+    """(condiciones, params) sobre ventas_v2 v: fechas, ubicacion, cliente y estado de pago"""
+    condiciones, params = [], []
+    _rango_fechas('v.fecha_venta', filtros, condiciones, params)
+    for campo in ('id_ubicacion', 'id_cliente'):
+        if campo in filtros:
+            condiciones.append(f'v.{campo} = ?')
+            params.append(filtros[campo])
+    if 'estado' in filtros:
+        condiciones.append('v.estado_pago = ?')
+        params.append(filtros['estado'])
+    return condiciones, params
+
+
+def listar_ventas(cursor, filtros, despues=None, limite=None):
+    """Ventas de la mas reciente a la mas antigua (filtros: fechas, ubicacion, cliente, estado de pago)"""
+    orden, claves, descendente = _orden(filtros, ORDEN_VENTAS, '-fecha_venta')
+    condiciones, params = filtrar_ventas(filtros)
+    return _paginar(cursor, VENTAS_SQL, condiciones, params, orden, claves,
+                    descendente, despues, limite or config.LISTADO_PAGINA)
+
+
+# Stock del producto en todas las ubicaciones (subconsulta correlacionada)
+_STOCK_PRODUCTO = '(SELECT COALESCE(SUM(i.cantidad_pares), 0) FROM inventario i WHERE i.id_producto = p.id_producto)'
+_TIENE_INVENTARIO = 'EXISTS (SELECT 1 FROM inventario i WHERE i.id_producto = p.id_producto)'
+
+PRODUCCION_SQL = f'''
+    SELECT
+        {{clave}},
+        p.id_producto,
+        p.id_variante_base,
+        p.cuero,
+        p.color_cuero,
+        p.suela,
+        p.forro,
+        p.material_plantilla,
+        p.serie_tallas,
+        p.pares_por_docena,
+        p.costo_unitario,
+        p.precio_sugerido,
+        p.cantidad_total_pares,
+        p.cantidad_ingresada,
+        p.fecha_produccion,
+        p.observaciones,
+        p.activo,
+        p.fecha_creacion,
+        v.codigo_interno,
+        v.tipo_calzado,
+        v.tipo_horma,
+        v.segmento,
+        {_STOCK_PRODUCTO} as stock_actual,
+        (SELECT COALESCE(SUM(i.cantidad_pares), 0) FROM inventario i
+         WHERE i.id_producto = p.id_producto AND i.tipo_stock = 'general') as stock_general,
+        (SELECT COALESCE(SUM(i.cantidad_pares), 0) FROM inventario i
+         WHERE i.id_producto = p.id_producto AND i.tipo_stock = 'pedido') as stock_pedido,
+        (SELECT COUNT(*) FROM inventario i
+         WHERE i.id_producto = p.id_producto) as tiene_registros_inventario,
+        (p.cantidad_total_pares - COALESCE(p.cantidad_ingresada, 0)) as pendiente_ingresar
+    FROM productos_producidos p
+    JOIN variantes_base v ON p.id_variante_base = v.id_variante_base
+    WHERE {{where}}
+'''
+
+ORDEN_PRODUCCION = {
+    'fecha_produccion': ['p.fecha_produccion', 'p.id_producto'],
+    'codigo_interno': ['v.codigo_interno', 'p.id_producto'],
+    'cantidad_total_pares': ['COALESCE(p.cantidad_total_pares, 0)', 'p.id_producto'],
+    'id_producto': ['p.id_producto'],
+}
+
+ESTADOS_PRODUCCION = {
+    'pendiente': f'NOT {_TIENE_INVENTARIO}',
+    'disponible': f'{_STOCK_PRODUCTO} > 0',
+    'agotado': f'{_TIENE_INVENTARIO} AND {_STOCK_PRODUCTO} <= 0',
+}
+
+
+def listar_produccion(cursor, filtros, despues=None, limite=None):
+    """
+    Productos producidos del mas reciente al mas antiguo (filtros: fechas de
+    produccion, ubicacion con inventario y estado pendiente/disponible/agotado)
+    """
+    orden, claves, descendente = _orden(filtros, ORDEN_PRODUCCION, '-fecha_produccion')
+    condiciones, params = [], []
+    _rango_fechas('p.fecha_produccion', filtros, condiciones, params)
+    if 'id_ubicacion' in filtros:
+        condiciones.append('EXISTS (SELECT 1 FROM inventario i '
+                           'WHERE i.id_producto = p.id_producto AND i.id_ubicacion = ?)')
+        params.append(filtros['id_ubicacion'])
+    estado = _estado(filtros, ESTADOS_PRODUCCION)
+    if estado:
+        condiciones.append(estado)
+    return _paginar(cursor, PRODUCCION_SQL, condiciones, params, orden, claves,
+                    descendente, despues, limite or config.LISTADO_PAGINA)
+
+
+INVENTARIO_SQL = '''
+    SELECT
+        {clave},
+        i.*,
+        p.cuero,
+        p.color_cuero,
+        p.suela,
+        p.forro,
+        p.serie_tallas,
+        p.precio_sugerido,
+        vb.codigo_interno,
+        vb.tipo_calzado,
+        vb.tipo_horma,
+        vb.segmento,
+        u.nombre as ubicacion_nombre
+    FROM inventario i
+    JOIN productos_producidos p ON i.id_producto = p.id_producto
+    JOIN variantes_base vb ON p.id_variante_base = vb.id_variante_base
+    JOIN ubicaciones u ON i.id_ubicacion = u.id_ubicacion
+    WHERE {where}
+'''
+
+ORDEN_INVENTARIO = {
+    'ubicacion': ['u.nombre', 'vb.codigo_interno', "COALESCE(p.cuero, '')", "COALESCE(p.color_cuero, '')",
+                  'i.id_inventario'],
+    'codigo_interno': ['vb.codigo_interno', 'i.id_inventario'],
+    'cantidad_pares': ['COALESCE(i.cantidad_pares, 0)', 'i.id_inventario'],
+    'id_inventario': ['i.id_inventario'],
+}
+
+ESTADOS_INVENTARIO = {
+    'con-stock': 'i.cantidad_pares > 0',
+    'sin-stock': 'i.cantidad_pares = 0',
+    'stock-bajo': f'i.cantidad_pares > 0 AND i.cantidad_pares < {STOCK_BAJO}',
+}
+
+
+def listar_inventario(cursor, filtros, despues=None, limite=None):
+    """Inventario por ubicacion, codigo, cuero y color (filtros: ubicacion y estado de stock)"""
+    orden, claves, descendente = _orden(filtros, ORDEN_INVENTARIO, 'ubicacion')
+    condiciones, params = [], []
+    if 'id_ubicacion' in filtros:
+        condiciones.append('i.id_ubicacion = ?')
+        params.append(filtros['id_ubicacion'])
+    estado = _estado(filtros, ESTADOS_INVENTARIO)
+    if estado:
+        condiciones.append(estado)
+    return _paginar(cursor, INVENTARIO_SQL, condiciones, params, orden, claves,
+                    descendente, despues, limite or config.LISTADO_PAGINA)
+
+
+def stock_por_ubicacion(cursor):
+    """{id_ubicacion: pares} para el resumen de /inventario (cubierto por ix_inventario_ubicacion)"""
+    cursor.execute('''
+        SELECT id_ubicacion, COALESCE(SUM(cantidad_pares), 0) as pares
+        FROM inventario
+        GROUP BY id_ubicacion
+    ''')
+    return {fila['id_ubicacion']: fila['pares'] for fila in cursor.fetchall()}
+
+
+PREPARACIONES_SQL = '''
+    SELECT
+        {clave},
+        p.id_preparacion,
+        p.codigo_preparacion,
+        p.fecha_preparacion,
+        p.dia_venta,
+        p.estado,
+        p.id_ubicacion_origen,
+        p.id_ubicacion_destino,
+        p.observaciones,
+        p.fecha_creacion,
+        p.fecha_completada,
+        u_origen.nombre as ubicacion_origen,
+        u_destino.nombre as ubicacion_destino,
+        (SELECT COUNT(*) FROM preparaciones_detalle pd
+         WHERE pd.id_preparacion = p.id_preparacion) as total_items,
+        (SELECT COALESCE(SUM(pd.cantidad_pares), 0) FROM preparaciones_detalle pd
+         WHERE pd.id_preparacion = p.id_preparacion) as total_pares
+    FROM preparaciones p
+    LEFT JOIN ubicaciones u_origen ON p.id_ubicacion_origen = u_origen.id_ubicacion
+    LEFT JOIN ubicaciones u_destino ON p.id_ubicacion_destino = u_destino.id_ubicacion
+    WHERE {where}
+'''
+
+ORDEN_PREPARACIONES = {
+    'fecha_preparacion': ['p.fecha_preparacion', 'p.id_preparacion'],
+    'estado': ["COALESCE(p.estado, '')", 'p.id_preparacion'],
+    'id_preparacion': ['p.id_preparacion'],
+}
+
+
+def listar_preparaciones(cursor, filtros, despues=None, limite=None):
+    """
+    Preparaciones de la mas reciente a la mas antigua (filtros: fechas o
+    periodo, ubicacion de origen o destino y estado)
+    """
+    orden, claves, descendente = _orden(filtros, ORDEN_PREPARACIONES, '-fecha_preparacion')
+    condiciones, params = [], []
+    _rango_fechas('p.fecha_preparacion', filtros, condiciones, params)
+    if 'id_ubicacion' in filtros:
+        condiciones.append('(p.id_ubicacion_origen = ? OR p.id_ubicacion_destino = ?)')
+        params.extend([filtros['id_ubicacion']] * 2)
+    if 'estado' in filtros:
+        condiciones.append('p.estado = ?')
+        params.append(filtros['estado'])
+    return _paginar(cursor, PREPARACIONES_SQL, condiciones, params, orden, claves,
+                    descendente, despues, limite or config.LISTADO_PAGINA)
+
+
+_TIENE_DEUDA = ('EXISTS (SELECT 1 FROM cuentas_por_cobrar c '
+                'WHERE c.id_cliente = cl.id_cliente AND c.saldo_pendiente > 0)')
+
+CLIENTES_SQL = '''
+    SELECT
+        {clave},
+        cl.id_cliente,
+        cl.codigo_cliente,
+        cl.nombre,
+        cl.apellido,
+        cl.nombre_comercial,
+        cl.tipo_documento,
+        cl.numero_documento,
+        cl.email,
+        cl.telefono,
+        cl.direccion,
+        cl.limite_credito,
+        cl.dias_credito,
+        cl.activo,
+        cl.observaciones,
+        cl.fecha_creacion,
+        (SELECT COALESCE(SUM(c.saldo_pendiente), 0) FROM cuentas_por_cobrar c
+         WHERE c.id_cliente = cl.id_cliente AND c.saldo_pendiente > 0) as deuda_total,
+        (SELECT COUNT(*) FROM cuentas_por_cobrar c
+         WHERE c.id_cliente = cl.id_cliente AND c.saldo_pendiente > 0) as num_cuentas_pendientes
+    FROM clientes cl
+    WHERE {where}
+'''
+
+ORDEN_CLIENTES = {
+    'fecha_creacion': ['cl.fecha_creacion', 'cl.id_cliente'],
+    'nombre': ['cl.nombre', 'cl.id_cliente'],
+    'id_cliente': ['cl.id_cliente'],
+}
+
+ESTADOS_CLIENTE = {
+    'activo': 'cl.activo = 1',
+    'inactivo': 'cl.activo = 0',
+    'con-deuda': _TIENE_DEUDA,
+}
+
+
+def listar_clientes(cursor, filtros, despues=None, limite=None):
+    """Clientes del mas nuevo al mas antiguo (filtro: estado activo/inactivo/con-deuda)"""
+    orden, claves, descendente = _orden(filtros, ORDEN_CLIENTES, '-fecha_creacion')
+    condiciones = []
+    estado = _estado(filtros, ESTADOS_CLIENTE)
+    if estado:
+        condiciones.append(estado)
+    return _paginar(cursor, CLIENTES_SQL, condiciones, [], orden, claves,
+                    descendente, despues, limite or config.LISTADO_PAGINA)
@@ -0,0 +1,255 @@
+"""
+Metricas de negocio para el dashboard
+Compatible con SQLite (desarrollo) y PostgreSQL (produccion/Render)
+
+Las ventas por dia y el stock total se leen de contadores (metricas_diarias y
+metricas_globales) que se actualizan en la misma transaccion que registra la
+venta, el ingreso, el pago o la preparacion. Si se desincronizan (limpieza
+manual de datos, restauracion de un backup) se reconstruyen con:
+
+    python metricas.py --reconstruir
+"""
+import sys
+
+from database import get_db, is_postgres
+from movimientos import INGRESO
+
+# Contadores por dia que se pueden sumar con sumar_metricas_diarias()
+COLUMNAS_DIARIAS = (
+    'ventas_cantidad', 'ventas_monto', 'pares_vendidos', 'pares_ingresados',
+    'pagos_cantidad', 'pagos_monto', 'preparaciones_creadas',
+)
+
+# Todas las metricas del dashboard en una sola sentencia (un viaje a la BD).
+# Cada CTE devuelve exactamente una fila, asi que el producto cruzado final
+# tambien es una sola fila. Las ventas de hoy y del mes salen de a lo sumo 31
+# filas de metricas_diarias y el stock de una fila de metricas_globales, sin
+# importar el tamano del historial. El resto (catalogo, cuentas pendientes y
+# preparaciones activas) son conjuntos acotados que se cuentan en vivo.
+RESUMEN_DASHBOARD_SQL = '''
+    WITH
+    variantes AS (
+        SELECT COUNT(*) as total
+        FROM variantes_base
+        WHERE activo = 1
+    ),
+    productos AS (
+        SELECT
+            COUNT(*) as total,
+            COALESCE(SUM(CASE WHEN cantidad_total_pares > COALESCE(cantidad_ingresada, 0)
+                              THEN 1 ELSE 0 END), 0) as pendientes_cantidad,
+            COALESCE(SUM(CASE WHEN cantidad_total_pares > COALESCE(cantidad_ingresada, 0)
+                              THEN cantidad_total_pares - COALESCE(cantidad_ingresada, 0)
+                              ELSE 0 END), 0) as pendientes_pares
+        FROM productos_producidos
+        WHERE activo = 1
+    ),
+    stock AS (
+        SELECT COALESCE(MAX(valor), 0) as total
+        FROM metricas_globales
+        WHERE clave = 'stock_total'
+    ),
+    ventas AS (
+        SELECT
+            COALESCE(SUM(CASE WHEN fecha = DATE("now") THEN ventas_cantidad ELSE 0 END), 0) as hoy_cantidad,
+            COALESCE(SUM(CASE WHEN fecha = DATE("now") THEN ventas_monto ELSE 0 END), 0) as hoy_monto,
+            COALESCE(SUM(ventas_cantidad), 0) as mes_cantidad,
+            COALESCE(SUM(ventas_monto), 0) as mes_monto
+        FROM metricas_diarias
+        WHERE fecha >= DATE('now', 'start of month')
+        AND fecha < DATE('now', 'start of month', '+1 month')
+    ),
+    cuentas AS (
+        SELECT
+            COUNT(*) as cantidad,
+            COALESCE(SUM(saldo_pendiente), 0) as monto
+        FROM cuentas_por_cobrar
+        WHERE estado = 'pendiente' AND saldo_pendiente > 0
+    ),
+    preparaciones_activas AS (
+        SELECT COUNT(*) as total
+        FROM preparaciones
+        WHERE estado = 'pendiente'
+    )
+    SELECT
+        variantes.total as variantes,
+        productos.total as productos,
+        stock.total as stock,
+        ventas.hoy_cantidad, ventas.hoy_monto,
+        ventas.mes_cantidad, ventas.mes_monto,
+        cuentas.cantidad as cuentas_cantidad, cuentas.monto as cuentas_monto,
+        productos.pendientes_cantidad, productos.pendientes_pares,
+        preparaciones_activas.total as preparaciones_activas
+    FROM variantes, productos, stock, ventas, cuentas, preparaciones_activas
+'''
+
+
+def resumen_dashboard(cursor):
+    """Metricas del dashboard con la forma que espera index_v2.html"""
+    cursor.execute(RESUMEN_DASHBOARD_SQL)
+    fila = cursor.fetchone()
+
+    return {
+        'variantes': fila['variantes'],
+        'productos': fila['productos'],
+        'stock': fila['stock'],
+        'ventas_hoy': {
+            'cantidad': fila['hoy_cantidad'],
+            'monto': fila['hoy_monto']
+        },
+        'ventas_mes': {
+            'cantidad': fila['mes_cantidad'],
+            'monto': fila['mes_monto']
+        },
+        'cuentas_por_cobrar': {
+            'cantidad': fila['cuentas_cantidad'],
+            'monto': fila['cuentas_monto']
+        },
+        'pendientes_ingreso': {
+            'cantidad': fila['pendientes_cantidad'],
+            'pares': fila['pendientes_pares']
+        },
+        'preparaciones_activas': fila['preparaciones_activas']
+    }
+
+
+# ============================================================================
+# CONTADORES (se actualizan dentro de la transaccion de cada operacion)
+# ============================================================================
+
+def sumar_metricas_diarias(cursor, fecha=None, **incrementos):
+    """
+    Suma los incrementos a la fila del dia (la crea si no existe).
+    Sin fecha se usa la fecha actual de la BD, la misma que CURRENT_DATE pone
+    por defecto en ventas_v2.fecha_venta.
+    Ejemplo: sumar_metricas_diarias(cursor, ventas_cantidad=1, ventas_monto=150.0)
+    """
+    columnas = [c for c in COLUMNAS_DIARIAS if c in incrementos]
+    desconocidas = set(incrementos) - set(columnas)
+    if desconocidas:
+        raise ValueError(f"Metricas diarias desconocidas: {', '.join(sorted(desconocidas))}")
+    if not columnas:
+        return
+
+    cursor.execute(f'''
+        INSERT INTO metricas_diarias (fecha, {', '.join(columnas)})
+        VALUES (COALESCE(?, CURRENT_DATE), {', '.join('?' for _ in columnas)})
+        ON CONFLICT (fecha) DO UPDATE SET
+            {', '.join(f'{c} = metricas_diarias.{c} + excluded.{c}' for c in columnas)}
+    ''', (fecha, *(incrementos[c] for c in columnas)))
+
+
+def sumar_metrica_global(cursor, clave, incremento):
+    """Suma `incremento` al contador global `clave` (ej. 'stock_total')"""
+    if not incremento:
+        return
+    cursor.execute('''
+        INSERT INTO metricas_globales (clave, valor)
+        VALUES (?, ?)
+        ON CONFLICT (clave) DO UPDATE SET valor = metricas_globales.valor + excluded.valor
+    ''', (clave, incremento))
+
+
+def reconstruir_metricas(cursor):
+    """
+    Recalcula los contadores desde las tablas de origen.
+    pares_ingresados sale de los ingresos del libro movimientos_inventario,
+    que empieza con la migracion 5: los dias hasta el de esa migracion
+    inclusive (ese dia solo tiene los ingresos posteriores) se conservan tal
+    cual. Antes de la migracion 5 no hay libro y no se recalcula.
+    """
+    cursor.execute('''
+        UPDATE metricas_diarias
+        SET ventas_cantidad = 0, ventas_monto = 0, pares_vendidos = 0,
+            pagos_cantidad = 0, pagos_monto = 0, preparaciones_creadas = 0
+    ''')
+
+    cursor.execute('''
+        INSERT INTO metricas_diarias (fecha, ventas_cantidad, ventas_monto)
+        SELECT DATE(fecha_venta), COUNT(*), COALESCE(SUM(total_final), 0)
+        FROM ventas_v2
+        WHERE DATE(fecha_venta) IS NOT NULL
+        GROUP BY DATE(fecha_venta)
+        ON CONFLICT (fecha) DO UPDATE SET
+            ventas_cantidad = excluded.ventas_cantidad,
+            ventas_monto = excluded.ventas_monto
+    ''')
+
+    cursor.execute('''
+        INSERT INTO metricas_diarias (fecha, pares_vendidos)
+        SELECT DATE(v.fecha_venta), SUM(vd.cantidad_pares)
+        FROM ventas_detalle vd
+        JOIN ventas_v2 v ON vd.id_venta = v.id_venta
+        WHERE DATE(v.fecha_venta) IS NOT NULL
+        GROUP BY DATE(v.fecha_venta)
+        ON CONFLICT (fecha) DO UPDATE SET pares_vendidos = excluded.pares_vendidos
+    ''')
+
+    cursor.execute('''
+        INSERT INTO metricas_diarias (fecha, pagos_cantidad, pagos_monto)
+        SELECT DATE(fecha_pago), COUNT(*), COALESCE(SUM(monto_pago), 0)
+        FROM pagos
+        WHERE DATE(fecha_pago) IS NOT NULL
+        GROUP BY DATE(fecha_pago)
+        ON CONFLICT (fecha) DO UPDATE SET
+            pagos_cantidad = excluded.pagos_cantidad,
+            pagos_monto = excluded.pagos_monto
+    ''')
+
+    cursor.execute('''
+        INSERT INTO metricas_diarias (fecha, preparaciones_creadas)
+        SELECT DATE(fecha_preparacion), COUNT(*)
+        FROM preparaciones
+        WHERE DATE(fecha_preparacion) IS NOT NULL
+        GROUP BY DATE(fecha_preparacion)
+        ON CONFLICT (fecha) DO UPDATE SET preparaciones_creadas = excluded.preparaciones_creadas
+    ''')
+
+    cursor.execute('SELECT DATE(fecha_aplicacion) AS desde FROM schema_version WHERE version = 5')
+    libro = cursor.fetchone()
+    if libro:
+        cursor.execute('UPDATE metricas_diarias SET pares_ingresados = 0 WHERE fecha > ?', (libro['desde'],))
+        cursor.execute('''
+            INSERT INTO metricas_diarias (fecha, pares_ingresados)
+            SELECT DATE(fecha), SUM(cantidad)
+            FROM movimientos_inventario
+            WHERE tipo_movimiento = ? AND DATE(fecha) > ?
+            GROUP BY DATE(fecha)
+            ON CONFLICT (fecha) DO UPDATE SET pares_ingresados = excluded.pares_ingresados
+        ''', (INGRESO, libro['desde']))
+
+    cursor.execute('''
+        INSERT INTO metricas_globales (clave, valor)
+        SELECT 'stock_total', COALESCE(SUM(cantidad_pares), 0)
+        FROM inventario
+        WHERE 1 = 1
+        ON CONFLICT (clave) DO UPDATE SET valor = excluded.valor
+    ''')
+
+
+def main():
+    if '--reconstruir' not in sys.argv:
+        print(__doc__)
+        return
+
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        # Bloquear los contadores: las operaciones en curso terminan antes de
+        # recalcular y las nuevas esperan a que la reconstruccion confirme
+        if is_postgres():
+            cursor.execute('LOCK TABLE metricas_diarias, metricas_globales IN EXCLUSIVE MODE')
+        else:
+            cursor.execute('BEGIN IMMEDIATE')
+        reconstruir_metricas(cursor)
+        conn.commit()
+        print(f"Metricas reconstruidas: {resumen_dashboard(cursor)}")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
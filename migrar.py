@@ -0,0 +1,48 @@
+"""
+Script para aplicar las migraciones de esquema pendientes
+Compatible con SQLite (desarrollo) y PostgreSQL (produccion/Render)
+
+Uso:
+    python migrar.py            # aplica las migraciones pendientes
+    python migrar.py --estado   # muestra la version actual sin modificar nada
+"""
+import sys
+
+from database import (
+    MIGRACIONES, VERSION_ESQUEMA, aplicar_migraciones, get_db, is_postgres, version_esquema
+)
+
+
+def mostrar_estado():
+    """Imprime la version aplicada y las migraciones pendientes"""
+    conn = get_db()
+    try:
+        actual = version_esquema(conn.cursor())
+    except Exception:
+        conn.rollback()
+        actual = 0
+    finally:
+        conn.close()
+
+    print(f"Motor: {'PostgreSQL' if is_postgres() else 'SQLite'}")
+    print(f"Version aplicada: {actual} / ultima: {VERSION_ESQUEMA}")
+    for version, descripcion, _ in MIGRACIONES:
+        marca = 'x' if version <= actual else ' '
+        print(f"  [{marca}] {version:03d} {descripcion}")
+    return actual
+
+
+def main():
+    if '--estado' in sys.argv:
+        mostrar_estado()
+        return
+
+    aplicadas = aplicar_migraciones()
+    if aplicadas:
+        print(f"{aplicadas} migracion(es) aplicada(s). Esquema en version {VERSION_ESQUEMA}")
+    else:
+        print(f"El esquema ya esta en la version {VERSION_ESQUEMA}, nada que aplicar")
+
+
+if __name__ == "__main__":
+    main()
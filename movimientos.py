@@ -0,0 +1,518 @@
+"""
+Historial de movimientos de inventario
+Compatible con SQLite (desarrollo) y PostgreSQL (produccion/Render)
+
+movimientos_inventario es un libro de solo agregado: cada operacion que cambia
+inventario.cantidad_pares (ingreso, traslado, preparacion, llegada de una
+preparacion, venta directa) escribe aqui la diferencia con signo, en la misma
+transaccion. La tabla inventario sigue siendo el saldo actual que leen las
+vistas; es una proyeccion del libro y se puede auditar contra el con:
+
+    python movimientos.py --verificar
+
+Para consultar el stock a una fecha pasada no se recorre todo el libro: se
+parte del corte (foto del saldo) a las 00:00 de ese dia y se suman solo los
+movimientos posteriores. Los cortes se crean al primer uso de cada dia o con:
+
+    python movimientos.py --corte
+
+Las fechas son las de la BD (CURRENT_TIMESTAMP), igual que el resto de
+columnas fecha_*. El historial empieza con la migracion 5, que registra el
+saldo de ese momento como 'saldo_inicial'.
+"""
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from config import get_config
+from database import get_db, is_postgres, sumar_inventario, MAX_PARAMETROS, SQLITE_RETURNING, ERRORES_REINTENTABLES
+
+# Obtener configuracion
+config = get_config()
+
+# Tipos de movimiento que escriben las rutas
+SALDO_INICIAL = 'saldo_inicial'
+INGRESO = 'ingreso'
+TRASLADO = 'traslado'
+PREPARACION = 'preparacion'
+LLEGADA_PREPARACION = 'llegada_preparacion'
+VENTA_DIRECTA = 'venta_directa'
+
+FORMATO_FECHA = '%Y-%m-%d %H:%M:%S'
+
+
+def registrar_movimientos(cursor, movimientos):
+    """
+    Agrega movimientos al libro (un solo executemany). Se llama dentro de la
+    transaccion que actualiza inventario, con la misma cantidad con signo.
+    Cada movimiento es (id_producto, id_ubicacion, tipo_stock, cantidad,
+    tipo_movimiento, referencia).
+    Ejemplo: registrar_movimientos(cursor, [(7, 1, 'general', -12, VENTA_DIRECTA, 'VD20250115-001')])
+    """
+    filas = [mov for mov in movimientos if mov[3]]
+    if not filas:
+        return
+    cursor.executemany('''
+        INSERT INTO movimientos_inventario
+        (id_producto, id_ubicacion, tipo_stock, cantidad, tipo_movimiento, referencia)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', filas)
+
+
+def descontar_stock(cursor, descuentos, tipo_movimiento, referencia=None):
+    """
+    Descuenta stock de varias filas de inventario en una sola sentencia
+    condicionada: cada fila solo se actualiza si cantidad_pares alcanza, asi
+    dos transacciones concurrentes nunca dejan stock negativo (la segunda
+    espera el lock de la fila y vuelve a evaluar la condicion).
+    `descuentos` es {id_inventario: pares}, ya acumulado por inventario.
+
+    Devuelve {} si todo se desconto (y registra los movimientos) o
+    {id_inventario: disponible} con las filas que no alcanzaron (disponible
+    None si la fila no existe). En ese caso la transaccion debe revertirse:
+    las demas filas ya quedaron descontadas.
+    """
+    pedido = [(int(id_inventario), int(pares)) for id_inventario, pares in descuentos.items()]
+    if not pedido:
+        return {}
+
+    if is_postgres() or SQLITE_RETURNING:
+        # VALUES sin lista de columnas (column1 = id_inventario, column2 = pares):
+        # SQLite no acepta alias de columnas y un CTE se materializa en cada ejecucion
+        cursor.execute(f'''
+            UPDATE inventario
+            SET cantidad_pares = inventario.cantidad_pares - pedido.column2,
+                version = inventario.version + 1
+            FROM (VALUES {', '.join('(?, ?)' for _ in pedido)}) AS pedido
+            WHERE inventario.id_inventario = pedido.column1
+              AND inventario.cantidad_pares >= pedido.column2
+            RETURNING inventario.id_inventario, inventario.id_producto,
+                      inventario.id_ubicacion, inventario.tipo_stock
+        ''', [valor for fila in pedido for valor in fila])
+        descontados = {fila['id_inventario']: fila for fila in cursor.fetchall()}
+    else:
+        # SQLite < 3.35: una sentencia condicionada por fila (BEGIN IMMEDIATE ya serializa)
+        ids = []
+        for id_inventario, pares in pedido:
+            cursor.execute('''
+                UPDATE inventario
+                SET cantidad_pares = cantidad_pares - ?, version = version + 1
+                WHERE id_inventario = ? AND cantidad_pares >= ?
+            ''', (pares, id_inventario, pares))
+            if cursor.rowcount:
+                ids.append(id_inventario)
+        descontados = {}
+        if ids:
+            cursor.execute(f'''
+                SELECT id_inventario, id_producto, id_ubicacion, tipo_stock FROM inventario
+                WHERE id_inventario IN ({', '.join('?' for _ in ids)})
+            ''', ids)
+            descontados = {fila['id_inventario']: fila for fila in cursor.fetchall()}
+
+    faltantes = [id_inventario for id_inventario, _ in pedido if id_inventario not in descontados]
+    if faltantes:
+        # Solo en el camino de error: stock actual de las filas que no alcanzaron
+        cursor.execute(f'''
+            SELECT id_inventario, cantidad_pares FROM inventario
+            WHERE id_inventario IN ({', '.join('?' for _ in faltantes)})
+        ''', faltantes)
+        disponibles = {fila['id_inventario']: fila['cantidad_pares'] for fila in cursor.fetchall()}
+        return {id_inventario: disponibles.get(id_inventario) for id_inventario in faltantes}
+
+    registrar_movimientos(cursor, [
+        (descontados[id_inventario]['id_producto'], descontados[id_inventario]['id_ubicacion'],
+         descontados[id_inventario]['tipo_stock'], -pares, tipo_movimiento, referencia)
+        for id_inventario, pares in pedido
+    ])
+    return {}
+
+
+# ============================================================================
+# TRASLADOS (concurrencia optimista con inventario.version)
+# ============================================================================
+
+class TrasladoRechazado(Exception):
+    """El traslado no procede (datos invalidos, sin inventario en origen o stock insuficiente)"""
+
+    def __init__(self, mensaje, codigo=400):
+        super().__init__(mensaje)
+        self.codigo = codigo
+
+
+class ConflictoTraslado(Exception):
+    """El origen cambio en cada intento y se agotaron los reintentos"""
+
+
+_stats_traslados_lock = threading.Lock()
+_stats_traslados = {'traslados': 0, 'intentos': 0, 'conflictos': 0, 'agotados': 0}
+
+
+def _contar_traslado(campo):
+    with _stats_traslados_lock:
+        _stats_traslados[campo] += 1
+
+
+def trasladar_stock(conn, id_producto, id_ubicacion_origen, id_ubicacion_destino, tipo_stock, cantidad):
+    """
+    Mueve `cantidad` pares entre ubicaciones sin bloquear la BD durante la
+    validacion: se lee el origen sin lock y se descuenta solo si su version
+    no cambio desde la lectura. Si otra operacion lo modifico en el medio (o
+    PostgreSQL aborta por deadlock) se revierte y se vuelve a intentar, hasta
+    TRASLADO_REINTENTOS veces. El destino se suma con un upsert, que no
+    depende de lo leido. Confirma su propia transaccion.
+    Lanza TrasladoRechazado si origen y destino coinciden, si la cantidad no
+    es positiva o si no hay stock, y ConflictoTraslado si se agotan los
+    reintentos. Origen y destino deben ser ids enteros (el orden de los
+    locks los compara).
+    """
+    if id_ubicacion_origen == id_ubicacion_destino:
+        raise TrasladoRechazado('El origen y el destino deben ser distintos')
+    if cantidad <= 0:
+        raise TrasladoRechazado(f'Cantidad inválida: {cantidad}')
+    cursor = conn.cursor()
+    for intento in range(config.TRASLADO_REINTENTOS + 1):
+        _contar_traslado('intentos')
+        try:
+            cursor.execute('''
+                SELECT id_inventario, cantidad_pares, version
+                FROM inventario
+                WHERE id_producto = ? AND id_ubicacion = ? AND tipo_stock = ?
+            ''', (id_producto, id_ubicacion_origen, tipo_stock))
+            origen = cursor.fetchone()
+
+            if not origen:
+                conn.rollback()
+                raise TrasladoRechazado('No existe inventario de este producto en la ubicación origen', 404)
+            if origen['cantidad_pares'] < cantidad:
+                conn.rollback()
+                raise TrasladoRechazado(f'Stock insuficiente en origen. Disponible: {origen["cantidad_pares"]} pares')
+
+            # Las dos filas se bloquean siempre en el mismo orden (menor
+            # ubicacion primero): dos traslados en sentidos opuestos no se
+            # esperan mutuamente (deadlock) en PostgreSQL
+            if id_ubicacion_destino < id_ubicacion_origen:
+                sumar_inventario(cursor, [(id_producto, id_ubicacion_destino, tipo_stock, cantidad)])
+            cursor.execute('''
+                UPDATE inventario
+                SET cantidad_pares = cantidad_pares - ?, version = version + 1
+                WHERE id_inventario = ? AND version = ?
+            ''', (cantidad, origen['id_inventario'], origen['version']))
+
+            if cursor.rowcount == 1:
+                if id_ubicacion_destino > id_ubicacion_origen:
+                    sumar_inventario(cursor, [(id_producto, id_ubicacion_destino, tipo_stock, cantidad)])
+                registrar_movimientos(cursor, [
+                    (id_producto, id_ubicacion_origen, tipo_stock, -cantidad, TRASLADO, None),
+                    (id_producto, id_ubicacion_destino, tipo_stock, cantidad, TRASLADO, None),
+                ])
+                conn.commit()
+                _contar_traslado('traslados')
+                return
+        except ERRORES_REINTENTABLES:
+            pass
+
+        # Otra operacion gano la carrera: esperar un poco (con variacion para
+        # no reintentar todos a la vez) y volver a leer
+        conn.rollback()
+        _contar_traslado('conflictos')
+        if intento < config.TRASLADO_REINTENTOS:
+            time.sleep(config.TRASLADO_ESPERA_MS * (2 ** intento) * random.uniform(0.5, 1.5) / 1000)
+
+    _contar_traslado('agotados')
+    raise ConflictoTraslado(f'El inventario origen cambió durante el traslado ({config.TRASLADO_REINTENTOS + 1} '
+                            'intentos). Vuelve a intentarlo.')
+
+
+def trasladar_lote(conn, id_ubicacion_origen, id_ubicacion_destino, lineas):
+    """
+    Traslada muchas lineas entre el mismo par de ubicaciones en una
+    transaccion y con sentencias por conjunto, sin importar la cantidad:
+    un UPDATE condicionado descuenta todas las lineas del origen, un solo
+    upsert (sumar_inventario) suma las que alcanzaron al destino y un
+    executemany escribe el historial.
+    `lineas` es {(id_producto, tipo_stock): pares}, ya acumulado.
+
+    Cada linea es independiente: las que no tienen stock suficiente en el
+    origen no se mueven y el resto si. Devuelve {(id_producto, tipo_stock):
+    None si se movio, o el disponible en origen (0 si no hay fila)}.
+    Confirma su propia transaccion; si PostgreSQL la aborta por deadlock con
+    otro traslado se reintenta entera (TRASLADO_REINTENTOS).
+    """
+    pedido = [(int(id_producto), tipo_stock, int(pares)) for (id_producto, tipo_stock), pares in lineas.items()]
+    if not pedido:
+        return {}
+
+    cursor = conn.cursor()
+    for intento in range(config.TRASLADO_REINTENTOS + 1):
+        _contar_traslado('intentos')
+        try:
+            if is_postgres() or SQLITE_RETURNING:
+                cursor.execute(f'''
+                    UPDATE inventario
+                    SET cantidad_pares = inventario.cantidad_pares - pedido.column3,
+                        version = inventario.version + 1
+                    FROM (VALUES {', '.join('(?, ?, ?)' for _ in pedido)}) AS pedido
+                    WHERE inventario.id_ubicacion = ?
+                      AND inventario.id_producto = pedido.column1
+                      AND inventario.tipo_stock = pedido.column2
+                      AND inventario.cantidad_pares >= pedido.column3
+                    RETURNING inventario.id_producto, inventario.tipo_stock
+                ''', [valor for fila in pedido for valor in fila] + [id_ubicacion_origen])
+                movidas = {(fila['id_producto'], fila['tipo_stock']) for fila in cursor.fetchall()}
+            else:
+                # SQLite < 3.35: una sentencia condicionada por linea
+                movidas = set()
+                for id_producto, tipo_stock, pares in pedido:
+                    cursor.execute('''
+                        UPDATE inventario
+                        SET cantidad_pares = cantidad_pares - ?, version = version + 1
+                        WHERE id_ubicacion = ? AND id_producto = ? AND tipo_stock = ? AND cantidad_pares >= ?
+                    ''', (pares, id_ubicacion_origen, id_producto, tipo_stock, pares))
+                    if cursor.rowcount:
+                        movidas.add((id_producto, tipo_stock))
+
+            destino = [(id_producto, tipo_stock, pares) for id_producto, tipo_stock, pares in pedido
+                       if (id_producto, tipo_stock) in movidas]
+            if destino:
+                sumar_inventario(cursor, [(id_producto, id_ubicacion_destino, tipo_stock, pares)
+                                          for id_producto, tipo_stock, pares in destino])
+                registrar_movimientos(cursor, [
+                    movimiento
+                    for id_producto, tipo_stock, pares in destino
+                    for movimiento in ((id_producto, id_ubicacion_origen, tipo_stock, -pares, TRASLADO, None),
+                                       (id_producto, id_ubicacion_destino, tipo_stock, pares, TRASLADO, None))
+                ])
+
+            # Disponible en origen de las lineas que no alcanzaron (una consulta
+            # por cada MAX_PARAMETROS - 1 productos)
+            sin_mover = sorted({fila[0] for fila in pedido if (fila[0], fila[1]) not in movidas})
+            disponibles = {}
+            for inicio in range(0, len(sin_mover), MAX_PARAMETROS - 1):
+                bloque = sin_mover[inicio:inicio + MAX_PARAMETROS - 1]
+                cursor.execute(f'''
+                    SELECT id_producto, tipo_stock, cantidad_pares FROM inventario
+                    WHERE id_ubicacion = ?
+                      AND id_producto IN ({', '.join('?' for _ in bloque)})
+                ''', [id_ubicacion_origen] + bloque)
+                disponibles.update({(fila['id_producto'], fila['tipo_stock']): fila['cantidad_pares']
+                                    for fila in cursor.fetchall()})
+
+            conn.commit()
+            _contar_traslado('traslados')
+            return {(id_producto, tipo_stock): (None if (id_producto, tipo_stock) in movidas
+                                                else disponibles.get((id_producto, tipo_stock), 0))
+                    for id_producto, tipo_stock, _ in pedido}
+        except ERRORES_REINTENTABLES:
+            conn.rollback()
+            _contar_traslado('conflictos')
+            if intento == config.TRASLADO_REINTENTOS:
+                _contar_traslado('agotados')
+                raise ConflictoTraslado('Otro traslado bloqueó el inventario durante el lote. Vuelve a intentarlo.')
+            time.sleep(config.TRASLADO_ESPERA_MS * (2 ** intento) * random.uniform(0.5, 1.5) / 1000)
+
+
+def estadisticas_traslados():
+    """
+    Traslados confirmados (un lote cuenta como uno), intentos, conflictos y
+    tasa de conflictos del worker actual
+    """
+    with _stats_traslados_lock:
+        stats = dict(_stats_traslados)
+    stats['tasa_conflictos'] = round(stats['conflictos'] / stats['intentos'], 4) if stats['intentos'] else 0.0
+    stats['reintentos_maximos'] = config.TRASLADO_REINTENTOS
+    return stats
+
+
+# ============================================================================
+# CORTES (saldo por producto/ubicacion/tipo a las 00:00 de un dia)
+# ============================================================================
+
+def _texto_fecha(valor):
+    return valor.strftime(FORMATO_FECHA)
+
+
+def _medianoche(valor):
+    return datetime.combine(valor.date(), datetime.min.time())
+
+
+def _hoy_bd(cursor):
+    """Fecha actual de la BD (la misma referencia que CURRENT_TIMESTAMP)"""
+    cursor.execute('SELECT CURRENT_DATE as hoy')
+    return datetime.strptime(str(cursor.fetchone()['hoy'])[:10], '%Y-%m-%d')
+
+
+def _buscar_corte(cursor, fecha_corte):
+    cursor.execute('SELECT id_corte FROM inventario_cortes WHERE fecha_corte = ?',
+                   (_texto_fecha(fecha_corte),))
+    fila = cursor.fetchone()
+    return fila['id_corte'] if fila else None
+
+
+def asegurar_corte(conn, fecha_corte):
+    """
+    Devuelve el id del corte de `fecha_corte` (una medianoche ya pasada) y lo
+    crea si no existe: corte anterior mas los movimientos entre ambos, o el
+    libro completo si es el primero. Confirma su propia transaccion, asi que
+    debe llamarse fuera de una operacion en curso.
+    """
+    cursor = conn.cursor()
+    id_corte = _buscar_corte(cursor, fecha_corte)
+    if id_corte is not None:
+        return id_corte
+
+    try:
+        # Un solo creador por vez y sin escrituras en curso sobre el libro:
+        # las transacciones abiertas antes de la medianoche terminan primero
+        if is_postgres():
+            cursor.execute('LOCK TABLE inventario_cortes IN SHARE ROW EXCLUSIVE MODE')
+            cursor.execute('LOCK TABLE movimientos_inventario IN SHARE MODE')
+        else:
+            cursor.execute('BEGIN IMMEDIATE')
+
+        id_corte = _buscar_corte(cursor, fecha_corte)
+        if id_corte is not None:
+            conn.commit()
+            return id_corte
+
+        cursor.execute('''
+            SELECT id_corte, fecha_corte FROM inventario_cortes
+            WHERE fecha_corte < ?
+            ORDER BY fecha_corte DESC
+            LIMIT 1
+        ''', (_texto_fecha(fecha_corte),))
+        anterior = cursor.fetchone()
+
+        cursor.execute('INSERT INTO inventario_cortes (fecha_corte) VALUES (?)', (_texto_fecha(fecha_corte),))
+        id_corte = cursor.lastrowid
+
+        if anterior:
+            cursor.execute('''
+                INSERT INTO inventario_snapshots (id_corte, id_producto, id_ubicacion, tipo_stock, cantidad_pares)
+                SELECT ?, id_producto, id_ubicacion, tipo_stock, SUM(cantidad)
+                FROM (
+                    SELECT id_producto, id_ubicacion, tipo_stock, cantidad_pares as cantidad
+                    FROM inventario_snapshots
+                    WHERE id_corte = ?
+                    UNION ALL
+                    SELECT id_producto, id_ubicacion, tipo_stock, cantidad
+                    FROM movimientos_inventario
+                    WHERE fecha >= ? AND fecha < ?
+                ) saldos
+                GROUP BY id_producto, id_ubicacion, tipo_stock
+                HAVING SUM(cantidad) <> 0
+            ''', (id_corte, anterior['id_corte'], anterior['fecha_corte'], _texto_fecha(fecha_corte)))
+        else:
+            cursor.execute('''
+                INSERT INTO inventario_snapshots (id_corte, id_producto, id_ubicacion, tipo_stock, cantidad_pares)
+                SELECT ?, id_producto, id_ubicacion, tipo_stock, SUM(cantidad)
+                FROM movimientos_inventario
+                WHERE fecha < ?
+                GROUP BY id_producto, id_ubicacion, tipo_stock
+                HAVING SUM(cantidad) <> 0
+            ''', (id_corte, _texto_fecha(fecha_corte)))
+
+        conn.commit()
+        return id_corte
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def stock_a_fecha(conn, hasta, id_ubicacion=None, id_producto=None):
+    """
+    Saldo por producto/ubicacion/tipo con los movimientos anteriores a `hasta`
+    (datetime; una fecha sola se toma hasta el final de ese dia).
+    Se lee el corte de las 00:00 de ese dia (se crea si falta) y se suman los
+    movimientos de a lo sumo un dia, sin importar el largo del historial.
+    Devuelve filas con id_producto, id_ubicacion, tipo_stock y cantidad_pares
+    (sin las que quedan en cero).
+    """
+    if not isinstance(hasta, datetime):
+        hasta = datetime.combine(hasta + timedelta(days=1), datetime.min.time())
+
+    cursor = conn.cursor()
+    fecha_corte = min(_medianoche(hasta), _hoy_bd(cursor))
+    id_corte = asegurar_corte(conn, fecha_corte)
+
+    filtros = ''
+    params_filtro = []
+    if id_ubicacion is not None:
+        filtros += ' AND id_ubicacion = ?'
+        params_filtro.append(id_ubicacion)
+    if id_producto is not None:
+        filtros += ' AND id_producto = ?'
+        params_filtro.append(id_producto)
+
+    cursor.execute(f'''
+        SELECT id_producto, id_ubicacion, tipo_stock, SUM(cantidad) as cantidad_pares
+        FROM (
+            SELECT id_producto, id_ubicacion, tipo_stock, cantidad_pares as cantidad
+            FROM inventario_snapshots
+            WHERE id_corte = ?{filtros}
+            UNION ALL
+            SELECT id_producto, id_ubicacion, tipo_stock, cantidad
+            FROM movimientos_inventario
+            WHERE fecha >= ? AND fecha < ?{filtros}
+        ) saldos
+        GROUP BY id_producto, id_ubicacion, tipo_stock
+        HAVING SUM(cantidad) <> 0
+        ORDER BY id_ubicacion, id_producto, tipo_stock
+    ''', (id_corte, *params_filtro, _texto_fecha(fecha_corte), _texto_fecha(hasta), *params_filtro))
+    return cursor.fetchall()
+
+
+# ============================================================================
+# AUDITORIA
+# ============================================================================
+
+def verificar_proyeccion(cursor):
+    """
+    Compara inventario.cantidad_pares con la suma del libro. Devuelve las
+    ternas que no coinciden (lista vacia si la proyeccion esta al dia).
+    """
+    cursor.execute('''
+        SELECT id_producto, id_ubicacion, tipo_stock,
+               SUM(inventario) as inventario, SUM(libro) as libro
+        FROM (
+            SELECT id_producto, id_ubicacion, tipo_stock, cantidad_pares as inventario, 0 as libro
+            FROM inventario
+            UNION ALL
+            SELECT id_producto, id_ubicacion, tipo_stock, 0, cantidad
+            FROM movimientos_inventario
+        ) saldos
+        GROUP BY id_producto, id_ubicacion, tipo_stock
+        HAVING SUM(inventario) <> SUM(libro)
+        ORDER BY id_producto, id_ubicacion, tipo_stock
+    ''')
+    return cursor.fetchall()
+
+
+def main():
+    if '--verificar' not in sys.argv and '--corte' not in sys.argv:
+        print(__doc__)
+        return
+
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        if '--corte' in sys.argv:
+            hoy = _hoy_bd(cursor)
+            conn.commit()
+            print(f"Corte {hoy:%Y-%m-%d}: id {asegurar_corte(conn, hoy)}")
+        if '--verificar' in sys.argv:
+            diferencias = verificar_proyeccion(cursor)
+            for fila in diferencias:
+                print(f"Producto {fila['id_producto']}, ubicacion {fila['id_ubicacion']}, "
+                      f"{fila['tipo_stock']}: inventario {fila['inventario']}, libro {fila['libro']}")
+            print(f"{len(diferencias)} diferencia(s) entre inventario y movimientos_inventario")
+            conn.rollback()
+            if diferencias:
+                sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
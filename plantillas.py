@@ -0,0 +1,121 @@
+"""
+Plantillas Excel de las cargas masivas (variantes base y produccion)
+
+El contenido de una plantilla es constante: se arma la primera vez que se
+pide en cada proceso y despues se sirven los mismos bytes desde memoria.
+Una plantilla es una sola hoja con texto y numeros, asi que el .xlsx se
+escribe directamente con zipfile en lugar de openpyxl: descargarla no carga
+openpyxl, lxml ni numpy (~23 MB por worker) en un worker que nunca recibe
+una carga masiva. Los archivos del .xlsx llevan fecha fija, los bytes son
+los mismos en todos los workers y reinicios, y el ETag es su hash: el
+navegador recibe 304 (Not Modified) mientras la plantilla no cambie.
+"""
+import hashlib
+import io
+import threading
+import zipfile
+from html import escape
+
+from importacion import COLUMNAS_PRODUCCION, COLUMNAS_VARIANTES
+
+# nombre -> (titulo de la hoja, columnas, filas de ejemplo)
+PLANTILLAS = {
+    'variantes': ('Variantes', COLUMNAS_VARIANTES, [
+        ['BOT-001', 'Botin', 'Clasica', 'Dama', 'Botin de cuero para dama'],
+        ['ZAP-002', 'Zapato', 'Sport', 'Caballero', 'Zapato deportivo'],
+        ['SAN-003', 'Sandalia', 'Casual', 'Dama', 'Sandalia casual'],
+    ]),
+    'produccion': ('Produccion', COLUMNAS_PRODUCCION, [
+        ['BOT-001', 'Cuero vacuno', 'Negro', 'Goma', 'Badana', 'Latex', '35-40', 45.5, 89.9, 120,
+         '2025-01-15', 'Lote de ejemplo'],
+    ]),
+}
+
+MIMETYPE_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Fecha fija de los archivos dentro del .xlsx (zipfile pone la actual por defecto)
+_FECHA_ZIP = (2025, 1, 1, 0, 0, 0)
+
+_XML = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_RELACIONES = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+# Partes fijas de un libro de una hoja (ECMA-376): tipos, relaciones y libro
+_PARTES = {
+    '[Content_Types].xml': (
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'),
+    '_rels/.rels': (
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        f'<Relationship Id="rId1" Type="{_RELACIONES}/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'),
+    'xl/_rels/workbook.xml.rels': (
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        f'<Relationship Id="rId1" Type="{_RELACIONES}/worksheet" Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'),
+}
+
+_generadas = {}
+_lock = threading.Lock()
+
+
+def _columna(indice):
+    """Letra de la columna `indice` (0 -> A, 26 -> AA)"""
+    letras = ''
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(ord('A') + resto) + letras
+    return letras
+
+
+def _celda(referencia, valor):
+    if isinstance(valor, (int, float)):
+        return f'<c r="{referencia}"><v>{valor}</v></c>'
+    return f'<c r="{referencia}" t="inlineStr"><is><t>{escape(str(valor), quote=False)}</t></is></c>'
+
+
+def _hoja(filas):
+    """XML de la hoja; incluye la dimension para que openpyxl read_only no recorra la hoja"""
+    xml = [f'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+           f'<dimension ref="A1:{_columna(len(filas[0]) - 1)}{len(filas)}"/><sheetData>']
+    for numero, fila in enumerate(filas, start=1):
+        celdas = ''.join(_celda(f'{_columna(i)}{numero}', valor) for i, valor in enumerate(fila))
+        xml.append(f'<row r="{numero}">{celdas}</row>')
+    xml.append('</sheetData></worksheet>')
+    return ''.join(xml)
+
+
+def _generar(nombre):
+    """(bytes del .xlsx, etag) de una plantilla"""
+    titulo, columnas, ejemplos = PLANTILLAS[nombre]
+    partes = dict(_PARTES)
+    partes['xl/workbook.xml'] = (
+        f'<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="{_RELACIONES}">'
+        f'<sheets><sheet name="{escape(titulo)}" sheetId="1" r:id="rId1"/></sheets></workbook>')
+    partes['xl/worksheets/sheet1.xml'] = _hoja([columnas] + ejemplos)
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as libro:
+        for ruta, contenido in partes.items():
+            info = zipfile.ZipInfo(ruta, date_time=_FECHA_ZIP)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            libro.writestr(info, _XML + contenido)
+    contenido = buffer.getvalue()
+    return contenido, hashlib.sha256(contenido).hexdigest()[:32]
+
+
+def obtener_plantilla(nombre):
+    """(bytes, etag) de la plantilla `nombre`; se genera una sola vez por proceso"""
+    plantilla = _generadas.get(nombre)
+    if plantilla is None:
+        with _lock:
+            plantilla = _generadas.get(nombre)
+            if plantilla is None:
+                plantilla = _generadas[nombre] = _generar(nombre)
+    return plantilla
@@ -0,0 +1,374 @@
+"""
+Trabajos en segundo plano: cargas masivas y exportaciones grandes
+Compatible con SQLite (desarrollo) y PostgreSQL (produccion/Render)
+
+Una carga masiva o una exportacion grande ocupaba un worker sync de gunicorn
+durante todo el proceso (y podia superar su --timeout). Ahora la vista solo
+guarda el archivo subido en TRABAJOS_DIR, registra el trabajo en la tabla
+`trabajos` (estado 'pendiente') y responde 202 con su id. El avance se
+consulta en GET /api/jobs/<id> y el archivo generado, si lo hay, en
+GET /api/jobs/<id>/archivo.
+
+Quien ejecuta los trabajos:
+- Cada worker de gunicorn arranca TRABAJOS_HILOS hilos (daemon) la primera
+  vez que encola o consulta un trabajo. Los hilos toman el pendiente mas
+  antiguo con un UPDATE condicionado al estado, asi que dos workers nunca
+  ejecutan el mismo trabajo.
+- `python trabajos.py` ejecuta la cola en primer plano, como proceso aparte
+  (con TRABAJOS_HILOS=0 en la web). Debe ver la misma BD y TRABAJOS_DIR.
+
+Un trabajo que queda 'en_proceso' sin avanzar durante TRABAJOS_ABANDONO
+segundos (el worker se reinicio a mitad) se marca como error. Los trabajos
+terminados se borran, con sus archivos, tras TRABAJOS_RETENCION_HORAS.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from cache import invalidar
+from config import get_config
+from database import get_db, is_postgres, liberar_conexiones, SQLITE_RETURNING
+from exportacion import exportar_archivo
+from importacion import importar_produccion, importar_variantes
+from listados import leer_filtros
+
+config = get_config()
+
+PENDIENTE = 'pendiente'
+EN_PROCESO = 'en_proceso'
+COMPLETADO = 'completado'
+ERROR = 'error'
+
+# Segundos minimos entre dos escrituras del avance de un trabajo
+INTERVALO_AVANCE = 1.0
+
+# Segundos entre dos busquedas de trabajos abandonados y vencidos
+INTERVALO_MANTENIMIENTO = 60.0
+
+# tipo -> funcion(parametros, archivo, al_avanzar) -> (resultado, archivo generado o None)
+TIPOS = {}
+
+_despertar = threading.Event()
+_hilos_lock = threading.Lock()
+_hilos_pid = None
+
+
+def tipo(nombre):
+    """Decorador que registra la funcion que ejecuta los trabajos de `nombre`"""
+    def registrar(funcion):
+        TIPOS[nombre] = funcion
+        return funcion
+    return registrar
+
+
+def _ahora(segundos=0):
+    """Fecha y hora local como texto; igual en SQLite y PostgreSQL para comparar"""
+    return (datetime.now() + timedelta(seconds=segundos)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def ruta_archivo(extension):
+    """Ruta nueva (nombre al azar) en TRABAJOS_DIR para un archivo de trabajo"""
+    os.makedirs(config.TRABAJOS_DIR, exist_ok=True)
+    return os.path.join(config.TRABAJOS_DIR, uuid.uuid4().hex + extension)
+
+
+def _borrar_archivo(ruta):
+    if ruta:
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+
+# ============================================================================
+# COLA
+# ============================================================================
+
+def encolar(tipo_trabajo, parametros=None, archivo=None):
+    """Registra un trabajo pendiente y despierta a los hilos; devuelve su id"""
+    if tipo_trabajo not in TIPOS:
+        raise ValueError(f'Tipo de trabajo desconocido: {tipo_trabajo}')
+    ahora = _ahora()
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO trabajos (tipo, estado, parametros, archivo, fecha_creacion, fecha_actualizacion)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (tipo_trabajo, PENDIENTE, json.dumps(parametros or {}), archivo, ahora, ahora))
+        id_trabajo = cursor.lastrowid
+        conn.commit()
+    finally:
+        conn.close()
+    iniciar()
+    _despertar.set()
+    return id_trabajo
+
+
+def obtener(id_trabajo):
+    """
+    Estado de un trabajo como dict (None si no existe). `archivo` es la ruta
+    en disco del archivo generado, solo para enviarlo: no se publica.
+    """
+    conn = get_db()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id_trabajo, tipo, estado, progreso, total, resultado, error, archivo,
+                   fecha_creacion, fecha_inicio, fecha_actualizacion, fecha_fin
+            FROM trabajos WHERE id_trabajo = ?
+        ''', (id_trabajo,))
+        fila = cursor.fetchone()
+    finally:
+        conn.close()
+    if fila is None:
+        return None
+
+    trabajo = dict(fila)
+    trabajo['resultado'] = json.loads(trabajo['resultado']) if trabajo['resultado'] else None
+    for clave in ('fecha_creacion', 'fecha_inicio', 'fecha_actualizacion', 'fecha_fin'):
+        if isinstance(trabajo[clave], datetime):
+            trabajo[clave] = trabajo[clave].isoformat()
+    if trabajo['estado'] != COMPLETADO:
+        # Mientras tanto `archivo` es el subido, que no se descarga
+        trabajo['archivo'] = None
+    return trabajo
+
+
+def tomar_pendiente(conn):
+    """
+    Marca como 'en_proceso' el pendiente mas antiguo y lo devuelve (o None).
+    El UPDATE vuelve a exigir estado 'pendiente': si otro hilo o worker lo
+    tomo primero no actualiza ninguna fila.
+    """
+    cursor = conn.cursor()
+    ahora = _ahora()
+    sql = '''
+        UPDATE trabajos SET estado = ?, fecha_inicio = ?, fecha_actualizacion = ?
+        WHERE id_trabajo = {id_trabajo} AND estado = ?
+    '''
+    if is_postgres() or SQLITE_RETURNING:
+        cursor.execute(sql.format(id_trabajo='(SELECT MIN(id_trabajo) FROM trabajos WHERE estado = ?)') +
+                       ' RETURNING id_trabajo, tipo, parametros, archivo',
+                       (EN_PROCESO, ahora, ahora, PENDIENTE, PENDIENTE))
+        trabajo = cursor.fetchone()
+    else:
+        # SQLite < 3.35: buscar y tomar en dos pasos
+        cursor.execute('SELECT MIN(id_trabajo) AS id_trabajo FROM trabajos WHERE estado = ?', (PENDIENTE,))
+        id_trabajo = cursor.fetchone()['id_trabajo']
+        trabajo = None
+        if id_trabajo is not None:
+            cursor.execute(sql.format(id_trabajo='?'), (EN_PROCESO, ahora, ahora, id_trabajo, PENDIENTE))
+            if cursor.rowcount:
+                cursor.execute('SELECT id_trabajo, tipo, parametros, archivo FROM trabajos WHERE id_trabajo = ?',
+                               (id_trabajo,))
+                trabajo = cursor.fetchone()
+    conn.commit()
+    return dict(trabajo) if trabajo else None
+
+
+class Avance:
+    """
+    al_avanzar(progreso, total) de un trabajo: guarda el avance en la BD como
+    maximo una vez por INTERVALO_AVANCE (tambien sirve de senal de vida).
+    Escribe con su propia conexion (get_db(nueva=True)): en SQLite la del hilo
+    es la misma que usa el trabajo y el commit confirmaria su transaccion a
+    medias. En SQLite esa escritura espera el lock si el trabajo tiene una
+    escritura abierta, asi que los trabajos avisan entre transacciones.
+    """
+
+    def __init__(self, id_trabajo):
+        self.id_trabajo = id_trabajo
+        self.progreso = 0
+        self.total = None
+        self._guardado = time.monotonic()
+
+    def __call__(self, progreso, total=None):
+        self.progreso, self.total = progreso, total
+        if time.monotonic() - self._guardado >= INTERVALO_AVANCE:
+            self.guardar()
+
+    def guardar(self):
+        conn = get_db(nueva=True)
+        try:
+            cursor = conn.cursor()
+            cursor.execute('UPDATE trabajos SET progreso = ?, total = ?, fecha_actualizacion = ? WHERE id_trabajo = ?',
+                           (self.progreso, self.total, _ahora(), self.id_trabajo))
+            conn.commit()
+        finally:
+            conn.close()
+        self._guardado = time.monotonic()
+
+
+def _terminar(id_trabajo, avance, estado, resultado=None, error=None, archivo=None):
+    ahora = _ahora()
+    conn = get_db(nueva=True)
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE trabajos
+            SET estado = ?, progreso = ?, total = ?, resultado = ?, error = ?, archivo = ?,
+                fecha_actualizacion = ?, fecha_fin = ?
+            WHERE id_trabajo = ?
+        ''', (estado, avance.progreso, avance.total, json.dumps(resultado) if resultado is not None else None,
+              error, archivo, ahora, ahora, id_trabajo))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def ejecutar(trabajo):
+    """Ejecuta un trabajo ya tomado y guarda su resultado o su error"""
+    id_trabajo = trabajo['id_trabajo']
+    entrada = trabajo['archivo']
+    salida = None
+    avance = Avance(id_trabajo)
+    try:
+        funcion = TIPOS.get(trabajo['tipo'])
+        if funcion is None:
+            raise ValueError(f"Tipo de trabajo desconocido: {trabajo['tipo']}")
+        resultado, salida = funcion(json.loads(trabajo['parametros'] or '{}'), entrada, avance)
+        _terminar(id_trabajo, avance, COMPLETADO, resultado=resultado, archivo=salida)
+    except Exception as e:
+        print(f'Error en el trabajo {id_trabajo} ({trabajo["tipo"]}): {e}')
+        # Descartar lo que el trabajo haya dejado sin confirmar antes de escribir el error
+        liberar_conexiones()
+        try:
+            _terminar(id_trabajo, avance, ERROR, error=str(e))
+        except Exception as e:
+            print(f'No se pudo guardar el error del trabajo {id_trabajo}: {e}')
+    finally:
+        # El archivo subido ya no hace falta; el generado queda para descargarlo
+        if entrada != salida:
+            _borrar_archivo(entrada)
+        liberar_conexiones()
+
+
+def mantenimiento(conn):
+    """Marca como error los trabajos abandonados y borra los terminados vencidos"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        UPDATE trabajos SET estado = ?, error = ?, fecha_fin = ?
+        WHERE estado = ? AND fecha_actualizacion < ?
+    ''', (ERROR, 'Interrumpido: el proceso que lo ejecutaba se detuvo. Puedes volver a enviarlo.',
+          _ahora(), EN_PROCESO, _ahora(-config.TRABAJOS_ABANDONO)))
+
+    limite = _ahora(-config.TRABAJOS_RETENCION_HORAS * 3600)
+    cursor.execute('SELECT id_trabajo, archivo FROM trabajos WHERE estado IN (?, ?) AND fecha_creacion < ?',
+                   (COMPLETADO, ERROR, limite))
+    vencidos = cursor.fetchall()
+    for fila in vencidos:
+        _borrar_archivo(fila['archivo'])
+    if vencidos:
+        cursor.execute(f"DELETE FROM trabajos WHERE id_trabajo IN ({', '.join('?' for _ in vencidos)})",
+                       [fila['id_trabajo'] for fila in vencidos])
+    conn.commit()
+
+
+def bucle(detener=None):
+    """Toma y ejecuta trabajos hasta que se active `detener` (o para siempre)"""
+    ultimo_mantenimiento = 0.0
+    while detener is None or not detener.is_set():
+        trabajo = None
+        conn = get_db()
+        try:
+            if time.monotonic() - ultimo_mantenimiento >= INTERVALO_MANTENIMIENTO:
+                mantenimiento(conn)
+                ultimo_mantenimiento = time.monotonic()
+            trabajo = tomar_pendiente(conn)
+        except Exception as e:
+            # BD caida o esquema sin migrar: se reintenta en la proxima vuelta
+            print(f'Advertencia en la cola de trabajos: {e}')
+        finally:
+            conn.close()
+            liberar_conexiones()
+
+        if trabajo:
+            ejecutar(trabajo)
+            continue
+        _despertar.wait(config.TRABAJOS_ESPERA)
+        _despertar.clear()
+
+
+def iniciar():
+    """
+    Arranca los hilos de este proceso (una vez; de nuevo tras un fork, porque
+    los hilos no pasan al proceso hijo)
+    """
+    global _hilos_pid
+    if config.TRABAJOS_HILOS <= 0 or _hilos_pid == os.getpid():
+        return
+    with _hilos_lock:
+        if _hilos_pid == os.getpid():
+            return
+        _hilos_pid = os.getpid()
+        for numero in range(config.TRABAJOS_HILOS):
+            threading.Thread(target=bucle, name=f'trabajos-{numero + 1}', daemon=True).start()
+
+
+# ============================================================================
+# TIPOS DE TRABAJO
+# ============================================================================
+
+@tipo('importar_variantes')
+def _importar_variantes(parametros, archivo, al_avanzar):
+    """Carga masiva de variantes base desde el archivo guardado (ver importacion.py)"""
+    conn = get_db()
+    try:
+        with open(archivo, 'rb') as entrada:
+            resultado = importar_variantes(conn, entrada, parametros['nombre_archivo'], al_avanzar)
+    finally:
+        conn.close()
+        # Los lotes confirmados quedan aunque la carga falle a mitad
+        invalidar('variantes_base')
+    resultado['message'] = f"Carga completada: {resultado['insertados']} variantes creadas"
+    return resultado, None
+
+
+@tipo('importar_produccion')
+def _importar_produccion(parametros, archivo, al_avanzar):
+    """Carga masiva de lotes de produccion, con ingreso opcional a una ubicacion (ver importacion.py)"""
+    conn = get_db()
+    try:
+        with open(archivo, 'rb') as entrada:
+            resultado = importar_produccion(conn, entrada, parametros['nombre_archivo'],
+                                            parametros.get('id_ubicacion'), al_avanzar)
+    finally:
+        conn.close()
+    invalidar('productos_producidos', 'inventario', 'metricas_diarias', 'metricas_globales')
+    if resultado['total_errores']:
+        resultado['message'] = ('No se cargo ningun lote: corrige los errores y vuelve a subir el archivo '
+                                '(la carga de produccion es todo o nada)')
+    else:
+        resultado['message'] = f"Carga completada: {resultado['insertados']} lotes de produccion creados"
+        if resultado['pares_ingresados']:
+            resultado['message'] += f" y {resultado['pares_ingresados']} pares ingresados al inventario"
+    return resultado, None
+
+
+@tipo('exportar_ventas')
+def _exportar_ventas(parametros, archivo, al_avanzar):
+    """Exportacion de ventas a un archivo para descargar (ver exportacion.py)"""
+    formato = parametros['formato']
+    salida = ruta_archivo('.' + formato)
+    conn = get_db()
+    try:
+        lineas = exportar_archivo(conn, leer_filtros(parametros['filtros']), formato, salida, al_avanzar)
+    except Exception:
+        _borrar_archivo(salida)
+        raise
+    finally:
+        conn.close()
+    return {'lineas': lineas, 'descarga': parametros['descarga']}, salida
+
+
+if __name__ == '__main__':
+    print(f"Ejecutando la cola de trabajos ({'PostgreSQL' if is_postgres() else 'SQLite'}, "
+          f'archivos en {config.TRABAJOS_DIR}). Ctrl+C para salir.')
+    try:
+        bucle()
+    except KeyboardInterrupt:
+        pass